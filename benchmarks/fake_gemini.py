@@ -0,0 +1,280 @@
+"""
+A local stand-in for the Gemini API, for benchmarks that must not hit Vertex AI.
+
+It speaks the Gemini API protocol (`generateContent`, `streamGenerateContent`
+and `cachedContents`) and answers every request with a response valid for the
+request's `responseSchema`: canned profiles (from the golden cases) for the
+profile schemas (or the fields of the canned profile a schema asks for),
+and values generated from the schema otherwise. Latency is drawn from a
+log-normal distribution, optionally plus a decoding time per output token,
+and errors and 429 quota errors can be injected at a given rate.
+
+Point the app at it with `GENAI_BASE_URL` (or `clients.configure(base_url=...)`).
+
+Usage:
+    python benchmarks/fake_gemini.py --port 8089 --latency-ms 800 --rate-429 0.05
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+GOLDEN_CASES = os.path.join(os.path.dirname(__file__), "..", "evaluation", "golden_cases.jsonl")
+
+_ID_PATTERN = re.compile(r"Character Description \(id: ([^)]*)\):")
+
+
+def _load_canned_profile() -> dict:
+    with open(GOLDEN_CASES, 'r', encoding='utf-8') as f_in:
+        return json.loads(f_in.readline())["golden_profile"]
+
+
+def sample_value(schema: dict):
+    """Builds the smallest value valid for a (Gemini API style) response schema."""
+    kind = (schema.get("type") or "OBJECT").upper()
+    if schema.get("enum"):
+        return schema["enum"][0]
+    if kind == "OBJECT":
+        properties = schema.get("properties", {})
+        return {name: sample_value(prop) for name, prop in properties.items()}
+    if kind == "ARRAY":
+        return [sample_value(schema.get("items", {}))]
+    if kind == "INTEGER":
+        return 4
+    if kind == "NUMBER":
+        return 0.5
+    if kind == "BOOLEAN":
+        return True
+    return "Texte de test."
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """
+    The fake backend. Its behavior is set by the constructor arguments.
+
+    Args:
+        latency_ms: Median response latency.
+        latency_sigma: Sigma of the log-normal latency distribution (0 for a fixed latency).
+        error_rate: Fraction of requests answered with a 500 error.
+        rate_429: Fraction of requests answered with a 429 quota error.
+        stream_chunks: Number of chunks a streamed response is split into.
+        ms_per_output_token: Decoding time added per output token, so that
+            longer responses take longer.
+        seed: Seed of the random draws, for reproducible runs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency_ms: float = 0.0, latency_sigma: float = 0.0,
+                 error_rate: float = 0.0, rate_429: float = 0.0, stream_chunks: int = 8,
+                 ms_per_output_token: float = 0.0, seed: Optional[int] = None):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.stream_chunks = stream_chunks
+        self.ms_per_output_token = ms_per_output_token
+        self.canned_profile = _load_canned_profile()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "streams": 0, "cached_contents": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def draw(self) -> tuple[float, Optional[int]]:
+        """Returns the latency (seconds) and injected error status (or None) of a request."""
+        with self._lock:
+            latency = self.latency_ms / 1000
+            if latency > 0 and self.latency_sigma > 0:
+                latency *= math.exp(self._random.gauss(0, self.latency_sigma))
+            roll = self._random.random()
+        if roll < self.rate_429:
+            return latency, 429
+        if roll < self.rate_429 + self.error_rate:
+            return latency, 500
+        return latency, None
+
+    def response_payload(self, request: dict):
+        """Builds a response valid for the schema of `request`."""
+        schema = request.get("generationConfig", {}).get("responseSchema") or {}
+        prompt = "".join(
+            part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", [])
+        )
+        items = schema.get("items", {})
+        if schema.get("type", "").upper() == "ARRAY" and "character_name" in items.get("properties", {}):
+            profiles = []
+            for item_id in _ID_PATTERN.findall(prompt):
+                profile = copy.deepcopy(self.canned_profile)
+                profile["character_id"] = item_id
+                profiles.append(profile)
+            return profiles
+        properties = schema.get("properties", {})
+        if "character_name" in properties:
+            return {name: value for name, value in self.canned_profile.items() if name in properties}
+        holland = self.canned_profile.get("holland_code_assessment") or {}
+        if properties and set(properties) <= set(holland):
+            return holland
+        return sample_value(schema)
+
+
+def _usage(request_text: str, response_text: str) -> dict:
+    prompt_tokens = max(len(request_text) // 4, 1)
+    output_tokens = max(len(response_text) // 4, 1)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens,
+    }
+
+
+def _candidate(text: str, finished: bool = True) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return candidate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeGeminiServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs add ~40ms per response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int):
+        statuses = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 404: "NOT_FOUND"}
+        self._send_json(status, {"error": {"code": status, "message": "Injected by the fake backend.",
+                                           "status": statuses.get(status, "UNKNOWN")}})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server._lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_error(404)
+
+    def do_PATCH(self):
+        self._read_request()
+        self._send_json(200, {"name": self.path.split("/v1beta/", 1)[-1].split("?")[0]})
+
+    def do_POST(self):
+        request_text, request = self._read_request()
+        path = self.path.split("?")[0]
+        if path.endswith("/cachedContents"):
+            self.server.count("cached_contents")
+            self._send_json(200, {"name": f"cachedContents/fake-{self.server.stats['cached_contents']}",
+                                  "model": request.get("model")})
+            return
+        if not (path.endswith(":generateContent") or path.endswith(":streamGenerateContent")):
+            self._send_error(404)
+            return
+
+        self.server.count("requests")
+        latency, error = self.server.draw()
+        time.sleep(latency)
+        if error == 429:
+            self.server.count("rate_limited")
+            self._send_error(429)
+            return
+        if error is not None:
+            self.server.count("errors")
+            self._send_error(error)
+            return
+
+        text = json.dumps(self.server.response_payload(request), ensure_ascii=False)
+        usage = _usage(request_text, text)
+        time.sleep(usage["candidatesTokenCount"] * self.server.ms_per_output_token / 1000)
+        if path.endswith(":streamGenerateContent"):
+            self.server.count("streams")
+            self._stream(text, usage)
+        else:
+            self._send_json(200, {"candidates": [_candidate(text)], "usageMetadata": usage})
+
+    def _read_request(self) -> tuple[str, dict]:
+        length = int(self.headers.get("Content-Length") or 0)
+        request_text = self.rfile.read(length).decode("utf-8") if length else ""
+        return request_text, json.loads(request_text) if request_text else {}
+
+    def _stream(self, text: str, usage: dict):
+        chunk_size = max(math.ceil(len(text) / self.server.stream_chunks), 1)
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for position, chunk in enumerate(chunks):
+            last = position == len(chunks) - 1
+            event = {"candidates": [_candidate(chunk, finished=last)]}
+            if last:
+                event["usageMetadata"] = usage
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **options) -> FakeGeminiServer:
+    """Starts a fake backend in a background thread; `server.shutdown()` stops it."""
+    server = FakeGeminiServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Median response latency in milliseconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Sigma of the log-normal latency distribution.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with a 500 error.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests failing with a 429 quota error.")
+    parser.add_argument("--ms-per-output-token", type=float, default=0.0, help="Decoding time added per output token, in milliseconds.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the latency and error draws.")
+
+
+def server_options(args: argparse.Namespace) -> dict:
+    return {
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "error_rate": args.error_rate,
+        "rate_429": args.rate_429,
+        "ms_per_output_token": args.ms_per_output_token,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini backend.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on (0 picks a free port).")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer((args.host, args.port), **server_options(args))
+    print(f"Fake Gemini backend listening on {server.url} (GENAI_BASE_URL={server.url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,195 @@
+"""
+Benchmarks of the services, the batch mode and the evaluation runner against
+the local fake Gemini backend (see fake_gemini.py), so no request reaches
+Vertex AI.
+
+The backend runs in a separate process so its work does not compete with the
+measured client for the GIL. Results are written as JSON (with the git commit)
+so runs can be compared across commits.
+
+Usage:
+    poetry run python benchmarks/run_benchmarks.py --output benchmark_results.json
+    poetry run python benchmarks/run_benchmarks.py --latency-ms 800 --latency-sigma 0.4 --rate-429 0.02
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from app import clients, services
+from app.batch import batch_process
+from app.cache import LRUCache, ResponseCache, set_response_cache
+from app.evaluation import DEFAULT_DATASET, evaluate_dataset
+from app.scoring import UNCERTAIN_BAND
+
+from fake_gemini import add_arguments, server_options
+
+DESCRIPTION = "A 30-year-old software engineer who is meticulous and preoccupied with rules and details."
+
+
+class FakeBackend:
+    """Runs fake_gemini.py in a subprocess for the duration of a `with` block."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def __enter__(self) -> "FakeBackend":
+        command = [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_gemini.py"), "--port", "0"]
+        for name, value in self.options.items():
+            if value is not None:
+                command += [f"--{name.replace('_', '-')}", str(value)]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        self.url = line.split("GENAI_BASE_URL=")[1].rstrip(")\n")
+        self.previous_settings = clients.get_settings()
+        clients.configure(base_url=self.url)
+        return self
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/stats") as response:
+            return json.load(response)
+
+    def __exit__(self, *exc_info):
+        clients.configure(**self.previous_settings)
+        self.process.terminate()
+        self.process.wait()
+
+
+def _milliseconds(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 3),
+    }
+
+
+def bench_single_call(calls: int, model_id: str) -> dict:
+    """Client-side overhead of one profile call: the backend answers instantly."""
+    with FakeBackend(seed=0):
+        services.generate_character_profile(DESCRIPTION, model_id, use_cache=False)
+        durations = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            services.generate_character_profile(DESCRIPTION, model_id, use_cache=False)
+            durations.append(time.perf_counter() - start)
+    return {"calls": calls, **_milliseconds(durations)}
+
+
+def bench_strategies(calls: int, model_id: str, options: dict) -> list[dict]:
+    """
+    Wall time of one profile generated by a single request and by the split
+    strategy. Decoding time is what the split saves, so the backend charges
+    1ms per output token unless `--ms-per-output-token` is set.
+    """
+    options = {**options, "ms_per_output_token": options.get("ms_per_output_token") or 1.0}
+    strategies = {
+        "single": services.generate_character_profile,
+        "split": services.generate_character_profile_split,
+    }
+    results = []
+    with FakeBackend(**options):
+        for strategy, generate in strategies.items():
+            durations = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                generate(DESCRIPTION, model_id, use_cache=False)
+                durations.append(time.perf_counter() - start)
+            results.append({"strategy": strategy, "calls": calls, **_milliseconds(durations)})
+    return results
+
+
+def bench_batch(records: int, concurrency_levels: list[int], model_id: str, options: dict) -> list[dict]:
+    """Batch throughput at each concurrency level."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = os.path.join(tmp_dir, "input.txt")
+        with open(input_file, 'w', encoding='utf-8') as f_in:
+            for i in range(records):
+                f_in.write(f"{DESCRIPTION} Case {i}.\n")
+        for concurrency in concurrency_levels:
+            with FakeBackend(**options) as backend:
+                stats = batch_process(input_file, os.path.join(tmp_dir, f"output-{concurrency}.jsonl"),
+                                      model_id, concurrency=concurrency)
+                results.append({"concurrency": concurrency, **stats, "backend": backend.stats()})
+    return results
+
+
+def bench_evaluation(cases: int, concurrency: int, model_id: str, options: dict) -> list[dict]:
+    """Evaluation throughput, judging every case and with the local pre-filter."""
+    with open(DEFAULT_DATASET, 'r', encoding='utf-8') as f_in:
+        golden = json.loads(f_in.readline())
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = os.path.join(tmp_dir, "cases.jsonl")
+        with open(dataset, 'w', encoding='utf-8') as f_out:
+            for i in range(cases):
+                f_out.write(json.dumps({**golden, "id": f"case-{i}", "description": f"{golden['description']} ({i})"}) + "\n")
+        for mode, band in (("judge_all", None), ("prefilter", UNCERTAIN_BAND)):
+            with FakeBackend(**options) as backend:
+                summary = evaluate_dataset(dataset, os.path.join(tmp_dir, mode), model_id, model_id, concurrency, band)
+                results.append({"mode": mode, **summary, "backend": backend.stats()})
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app against a local fake Gemini backend.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to.")
+    parser.add_argument("--model_id", default="gemini-2.5-pro", help="Model id sent to the fake backend.")
+    parser.add_argument("--calls", type=int, default=50, help="Number of calls of the single-call benchmark.")
+    parser.add_argument("--records", type=int, default=64, help="Number of records of the batch benchmark.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16], help="Batch concurrency levels.")
+    parser.add_argument("--cases", type=int, default=32, help="Number of cases of the evaluation benchmark.")
+    parser.add_argument("--strategy-calls", type=int, default=10, help="Number of profiles of each strategy of the strategies benchmark.")
+    parser.add_argument("--only", choices=["single_call", "strategies", "batch", "evaluation"], nargs="+",
+                        default=["single_call", "strategies", "batch", "evaluation"], help="Benchmarks to run.")
+    add_arguments(parser)
+    parser.set_defaults(latency_ms=200.0, latency_sigma=0.3, seed=0)
+    args = parser.parse_args()
+
+    # Every request must reach the backend.
+    set_response_cache(ResponseCache(LRUCache(1), enabled=False))
+    options = server_options(args)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "backend": options,
+        "benchmarks": {},
+    }
+    if "single_call" in args.only:
+        results["benchmarks"]["single_call"] = bench_single_call(args.calls, args.model_id)
+    if "strategies" in args.only:
+        results["benchmarks"]["strategies"] = bench_strategies(args.strategy_calls, args.model_id, options)
+    if "batch" in args.only:
+        results["benchmarks"]["batch"] = bench_batch(args.records, args.concurrency, args.model_id, options)
+    if "evaluation" in args.only:
+        results["benchmarks"]["evaluation"] = bench_evaluation(args.cases, max(args.concurrency), args.model_id, options)
+
+    with open(args.output, 'w', encoding='utf-8') as f_out:
+        json.dump(results, f_out, indent=2)
+    print(json.dumps(results["benchmarks"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
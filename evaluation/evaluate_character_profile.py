@@ -7,6 +7,7 @@ To run this script, you might need to install the evaluation library:
 pip install "google-cloud-aiplatform[evaluation]"
 """
 
+import argparse
 import os
 import sys
 import pandas as pd
@@ -15,18 +16,20 @@ from vertexai import Client
 
 from vertexai.generative_models._evaluations import EvaluationDataset
 
-# Add project root to the Python path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Add the source directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
-from src.app.services import generate_character_profile
-from src.app.models import CharacterProfile
+from app.evaluation import generate_cases
 
 # Load environment variables from .env file
 load_dotenv()
 
-def main():
+def main(concurrency: int = 4):
     """
     Main function to run the evaluation.
+
+    Args:
+        concurrency: Maximum number of profiles generated at once.
     """
     # @title ### Set Google Cloud project information
     PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
@@ -51,16 +54,14 @@ def main():
     # We are generating the responses from our custom function
     model_id = "gemini-2.5-flash" # Using a recent model
     responses = []
-    print("Generating responses...")
-    for i, prompt in enumerate(eval_df["prompt"]):
-        print(f"Processing prompt {i+1}/{len(eval_df['prompt'])}")
-        try:
-            profile: CharacterProfile = generate_character_profile(description=prompt, model_id=model_id)
-            responses.append(profile.model_dump_json(indent=2))
-        except Exception as e:
-            error_message = f"Error generating profile for prompt: {prompt}\n{e}"
-            print(error_message)
-            responses.append(f"Error: {e}") # Append error message to see it in the results
+    print(f"Generating responses ({concurrency} at a time)...")
+    cases = [{"id": str(i + 1), "description": prompt} for i, prompt in enumerate(eval_df["prompt"])]
+    for case, result in zip(cases, generate_cases(cases, model_id, concurrency)):
+        if "error" in result:
+            print(f"Error generating profile for prompt: {case['description']}\n{result['error']}")
+            responses.append(f"Error: {result['error']}") # Append error message to see it in the results
+        else:
+            responses.append(result["generated_profile"].model_dump_json(indent=2))
 
     eval_df["response"] = responses
 
@@ -84,4 +85,7 @@ def main():
     print("-------------------------")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Evaluate the generated profiles with the Gen AI Evaluation Service.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of profiles generated at once.")
+    args = parser.parse_args()
+    main(args.concurrency)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the concurrent evaluation of 'generate_character_profile' against the
+golden cases of golden_cases.jsonl, judged by 'evaluate_profile_with_llm'.
+
+Usage:
+    poetry run python evaluation/run_evaluation.py --concurrency 8 --output_dir evaluation_results
+"""
+
+import os
+import sys
+
+# Add the source directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from app.evaluation import main
+
+if __name__ == "__main__":
+    main()
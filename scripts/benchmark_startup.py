@@ -0,0 +1,84 @@
+"""
+Measures the cold-start cost of the app, each sample in a fresh interpreter:
+the import time of the app modules and the time to the first profile request.
+
+Usage:
+    poetry run python scripts/benchmark_startup.py --runs 5
+    poetry run python scripts/benchmark_startup.py --request "A short description."
+
+Without --request, the first request is only built (prompt, generation config
+and cache key); with it, the request is also sent to the configured backend.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+MODULES = ["app.services", "app.batch", "app.dashboard", "app.visualizations"]
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_s": time.perf_counter() - start}}))
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from app import services
+from app.cache import make_key
+from app.models import CharacterProfile
+imported = time.perf_counter()
+prompt, config = services._profile_request({description!r})
+make_key({model_id!r}, prompt, config, CharacterProfile)
+built = time.perf_counter()
+result = {{"import_s": imported - start, "build_s": built - imported}}
+if {send!r}:
+    services.generate_character_profile({description!r}, {model_id!r}, use_cache=False)
+    result["request_s"] = time.perf_counter() - built
+result["total_s"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def run_snippet(code: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_of(samples: list[dict]) -> dict:
+    return {key: round(statistics.median(s[key] for s in samples), 4) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the app.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters per measurement.")
+    parser.add_argument("--request", default=None, help="Description to send as the first request (omitted: build only).")
+    parser.add_argument("--model_id", default="gemini-2.5-pro", help="The model to use for the first request.")
+    args = parser.parse_args()
+
+    results = {"runs": args.runs, "imports": {}}
+    for module in MODULES:
+        samples = [run_snippet(IMPORT_SNIPPET.format(module=module)) for _ in range(args.runs)]
+        results["imports"][module] = median_of(samples)["import_s"]
+
+    snippet = FIRST_REQUEST_SNIPPET.format(
+        description=args.request or "A short description.",
+        model_id=args.model_id,
+        send=args.request is not None,
+    )
+    results["first_request"] = median_of([run_snippet(snippet) for _ in range(args.runs)])
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
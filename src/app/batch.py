@@ -1,37 +1,744 @@
 import argparse
-import os
+import contextlib
+import functools
+import hashlib
 import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional
 from dotenv import load_dotenv
 
-from google import genai
-from app.services import generate_character_profile
+from app.export import ParquetExporter, recover_parts
+from app.metrics import percentile
 from app.models import CharacterProfile
+from app.services import (
+    FAST_MODEL_ID,
+    SPLIT_SUMMARIES,
+    count_profile_tokens,
+    estimate_profile_output_tokens,
+    generate_character_profile,
+    generate_character_profile_cascade,
+    generate_character_profile_split,
+    generate_packed_profiles,
+    generate_tcc_program,
+    get_last_cascade,
+    get_last_usage,
+    pack_descriptions,
+)
+from app.usage import add_usage, estimate_cost, usage_report
+
+logger = logging.getLogger(__name__)
+
 
-def batch_process(input_file: str, output_file: str, model_id: str):
+def read_records(input_file: str) -> Iterator[dict]:
     """
-    Processes character descriptions from an input file and writes the generated
-    profiles to an output file.
+    Yields one record per non-empty line of the input file.
+
+    Plain text files contain one description per line. JSONL files (`.jsonl`)
+    contain one JSON object per line with a `description` field and an
+    optional `id` field.
+    """
+    is_jsonl = input_file.endswith(".jsonl")
+    with open(input_file, 'r', encoding='utf-8') as f_in:
+        for line_number, line in enumerate(f_in, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if is_jsonl:
+                record = json.loads(line)
+                yield {
+                    "id": str(record.get("id", line_number)),
+                    "description": record["description"],
+                }
+            else:
+                yield {"id": str(line_number), "description": line}
+
+
+class PreflightError(ValueError):
+    """Raised when a record's request exceeds the input token budget."""
+
+
+def _truncate_description(description: str, max_chars: int) -> str:
+    """Cuts a description to at most `max_chars` characters, at a word boundary when possible."""
+    if len(description) <= max_chars:
+        return description
+    cut = description[:max_chars]
+    boundary = cut.rfind(" ")
+    return (cut[:boundary] if boundary > max_chars // 2 else cut).rstrip()
+
+
+def preflight_record(record: dict, model_id: str, max_input_tokens: Optional[int] = None,
+                     on_oversize: str = "reject", verify: bool = False) -> tuple[dict, dict]:
+    """
+    Counts the input tokens of a record's profile request and enforces the budget.
+
+    Args:
+        record: The input record.
+        model_id: The model the request is for.
+        max_input_tokens: The input token budget of one request (None for no budget).
+        on_oversize: "reject" to fail records above the budget, "truncate" to
+            cut their description until the request fits.
+        verify: Count with the count-tokens API instead of the local estimate.
+
+    Returns:
+        The record to send (a truncated copy when it was cut) and its preflight
+        report: `input_tokens`, plus `truncated_from` for a truncated record.
+
+    Raises:
+        PreflightError: The request is above the budget and cannot be sent.
+    """
+    tokens = count_profile_tokens(record["description"], model_id, verify)
+    if max_input_tokens is None or tokens <= max_input_tokens:
+        return record, {"input_tokens": tokens}
+    if on_oversize == "reject":
+        raise PreflightError(f"The request has {tokens} input tokens, above the budget of {max_input_tokens}.")
+
+    overhead = count_profile_tokens("", model_id, verify)
+    if overhead >= max_input_tokens:
+        raise PreflightError(f"The prompt alone has {overhead} input tokens, above the budget of {max_input_tokens}.")
+    description = record["description"]
+    original_tokens = tokens
+    # Token counts are roughly proportional to the length; shrink until the request fits.
+    while tokens > max_input_tokens and description:
+        ratio = (max_input_tokens - overhead) / max(tokens - overhead, 1)
+        max_chars = min(int(len(description) * ratio), int(len(description) * 0.9))
+        description = _truncate_description(description, max_chars)
+        tokens = count_profile_tokens(description, model_id, verify)
+    return {**record, "description": description}, {"input_tokens": tokens, "truncated_from": original_tokens}
+
+
+def process_record(index: int, record: dict, model_id: str, preflight: Optional[dict] = None,
+                   fast_model_id: Optional[str] = None, split: Optional[str] = None) -> dict:
+    """
+    Generates the profile for a single record and returns its output line.
+
+    With `preflight` (the keyword arguments of `preflight_record`), the
+    request is checked against the input token budget before it is sent.
+
+    With a `fast_model_id`, the profile is generated in cascade mode (see
+    `generate_character_profile_cascade`), `model_id` being the strong
+    model; the model used and the escalation go in a `cascade` field.
+
+    With `split` ("local" or "model", the summary option), the profile is
+    generated by the split strategy (see `generate_character_profile_split`).
+
+    Failures are captured as an `error` field instead of being raised, so one
+    bad record never aborts the rest of the batch.
+    """
+    start = time.perf_counter()
+    result = {"index": index, "id": record["id"]}
+    cascading = False
+    try:
+        if preflight is not None:
+            record, result["preflight"] = preflight_record(record, model_id, **preflight)
+        if split is not None:
+            profile = generate_character_profile_split(record["description"], model_id, summary=split)
+            result["usage"] = get_last_usage()
+        elif fast_model_id is None:
+            profile = generate_character_profile(record["description"], model_id)
+            result["usage"] = get_last_usage()
+        else:
+            cascading = True
+            profile = generate_character_profile_cascade(record["description"], fast_model_id, model_id)
+        if profile is None:
+            raise ValueError("The model returned no parsable profile.")
+        result["profile"] = profile.model_dump()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if cascading:
+        # Also recorded when the strong model failed, so its escalation is counted.
+        result["cascade"] = get_last_cascade()
+    result["latency_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def process_pack(pack: list[tuple[int, dict]], model_id: str, preflight: Optional[dict] = None) -> list[dict]:
+    """
+    Generates the profiles of several records in one packed request.
+
+    Records the packed request did not return a well-formed profile for are
+    re-submitted individually with `process_record`. The usage of the packed
+    request is reported on the first record it returned.
+    """
+    start = time.perf_counter()
+    results = []
+    reports = {}
+    if preflight is not None:
+        checked = []
+        for index, record in pack:
+            try:
+                record, reports[index] = preflight_record(record, model_id, **preflight)
+                checked.append((index, record))
+            except Exception as e:
+                results.append({"index": index, "id": record["id"], "error": f"{type(e).__name__}: {e}",
+                                "latency_s": round(time.perf_counter() - start, 3)})
+        pack = checked
+
+    # Records are identified by their index in the packed request, since
+    # input ids are not guaranteed to be unique.
+    usage = None
+    try:
+        profiles = generate_packed_profiles(
+            [(str(index), record["description"]) for index, record in pack], model_id) if pack else {}
+        usage = get_last_usage()
+    except Exception as e:
+        logger.warning("Packed request of %d records failed, retrying them individually: %s: %s",
+                       len(pack), type(e).__name__, e)
+        profiles = {}
+    latency_s = round(time.perf_counter() - start, 3)
+
+    for index, record in pack:
+        profile = profiles.get(str(index))
+        if profile is None:
+            result = process_record(index, record, model_id)
+        else:
+            profile.character_id = None
+            result = {"index": index, "id": record["id"], "profile": profile.model_dump(), "latency_s": latency_s}
+            result["usage"], usage = usage, None
+        if index in reports:
+            result["preflight"] = reports[index]
+        results.append(result)
+    return results
+
+
+def process_tcc(result: dict, model_id: str) -> dict:
+    """
+    Generates the TCC program for a successfully profiled record.
+
+    A failure keeps the profile in the record and adds an `error` field, so
+    the record is retried on resume.
+    """
+    start = time.perf_counter()
+    try:
+        profile = CharacterProfile.model_validate(result["profile"])
+        program = generate_tcc_program(profile, model_id)
+        result["tcc_usage"] = get_last_usage()
+        if program is None:
+            raise ValueError("The model returned no parsable TCC program.")
+        result["tcc_program"] = program.model_dump()
+    except Exception as e:
+        result["error"] = f"TCC generation failed: {type(e).__name__}: {e}"
+    result["tcc_latency_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _run_concurrently(items: Iterator[tuple[int, dict]], model_id: str, concurrency: int,
+                      with_tcc: bool = False, pack_size: int = 1,
+                      preflight: Optional[dict] = None,
+                      fast_model_id: Optional[str] = None,
+                      split: Optional[str] = None) -> Iterator[tuple[int, dict]]:
+    """
+    Yields (position, result) pairs in completion order, keeping at most
+    `concurrency` profile requests in flight.
+
+    With `with_tcc`, each finished profile is handed to a second pool that
+    generates its TCC program, so the profile of record N+1 is generated
+    while the TCC program of record N is in flight.
+
+    With a `pack_size` above 1, consecutive records are packed into a single
+    profile request (see `process_pack`).
+
+    With `preflight`, each request is checked against the input token budget
+    in its worker thread (see `preflight_record`).
+
+    With a `fast_model_id`, profiles are generated in cascade mode, and with
+    `split` by the split strategy (see `process_record`); neither can be
+    combined with packing.
+    """
+    positions = {}
+
+    def numbered():
+        for position, (index, record) in enumerate(items):
+            positions[index] = position
+            yield index, record
+
+    if pack_size > 1:
+        records = {}
+
+        def descriptions():
+            for index, record in numbered():
+                records[index] = record
+                yield str(index), record["description"]
+
+        jobs = (
+            (process_pack, [(int(index), records.pop(int(index))) for index, _ in pack])
+            for pack in pack_descriptions(descriptions(), max_pack_size=pack_size)
+        )
+    else:
+        process = functools.partial(process_record, fast_model_id=fast_model_id, split=split)
+        jobs = ((process, index, record) for index, record in numbered())
+
+    with ThreadPoolExecutor(max_workers=concurrency) as profile_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as tcc_pool:
+        pending = {}
+        profiles_in_flight = 0
+
+        def collect():
+            nonlocal profiles_in_flight
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = pending.pop(future)
+                results = future.result()
+                if stage == "tcc":
+                    yield positions.pop(results["index"]), results
+                    continue
+                profiles_in_flight -= 1
+                for result in results if isinstance(results, list) else [results]:
+                    if with_tcc and "profile" in result:
+                        pending[tcc_pool.submit(process_tcc, result, model_id)] = "tcc"
+                    else:
+                        yield positions.pop(result["index"]), result
+
+        for function, *args in jobs:
+            pending[profile_pool.submit(function, *args, model_id, preflight)] = "profile"
+            profiles_in_flight += 1
+            # TCC requests are bounded too, so a slow second stage cannot queue up the whole input.
+            while profiles_in_flight >= concurrency or len(pending) >= 2 * concurrency:
+                yield from collect()
+        while pending:
+            yield from collect()
+
+
+def _in_input_order(results: Iterator[tuple[int, dict]]) -> Iterator[tuple[int, dict]]:
+    """Re-orders completion-ordered results by their submission position."""
+    buffered = {}
+    next_position = 0
+    for position, result in results:
+        buffered[position] = result
+        while next_position in buffered:
+            yield next_position, buffered.pop(next_position)
+            next_position += 1
+
+
+def input_hash(record: dict, model_id: str) -> str:
+    """Identifies a record in the progress journal."""
+    payload = json.dumps([model_id, record["id"], record["description"]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def journal_path(output_file: str) -> str:
+    """Returns the path of the progress journal kept next to `output_file`."""
+    return output_file + ".journal"
+
+
+def read_journal(path: str) -> set[str]:
+    """Returns the input hashes recorded as completed in the journal."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f_journal:
+        return {line.strip() for line in f_journal if line.strip()}
+
+
+def _truncate_partial_line(path: str):
+    """Drops a trailing line left incomplete by a crash in the middle of a write."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk backwards to the last complete line.
+        position = size - 1
+        while position > 0:
+            f.seek(position - 1)
+            if f.read(1) == b"\n":
+                break
+            position -= 1
+        f.truncate(position)
+
+
+def _compact_output(path: str, finished: set[int]):
+    """
+    Rewrites an output file with the last result of each finished record only.
+
+    The failed results of the records about to be retried are dropped, so a
+    resumed run leaves one line per record.
+    """
+    if not os.path.exists(path):
+        return
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f_in:
+        for line in f_in:
+            if line.strip():
+                result = json.loads(line)
+                if result["index"] in finished:
+                    results[result["index"]] = line
+    compacted = path + ".tmp"
+    with open(compacted, 'w', encoding='utf-8') as f_out:
+        f_out.writelines(results.values())
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(compacted, path)
+
+
+def _read_results(path: str) -> Iterator[dict]:
+    """Yields the results of an output file (none if it does not exist)."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f_in:
+        for line in f_in:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _index_missing(index, output_file: str):
+    """
+    Adds the finished results of an output file that are missing from a
+    similar-profile index, e.g. journaled by a run killed before it flushed
+    the index. Results are matched to the indexed profiles by id.
+    """
+    from app.similarity import riasec_vector
+
+    seen = {}
+    for result in _read_results(output_file):
+        if "error" in result:
+            continue
+        profile = CharacterProfile.model_validate(result["profile"])
+        if riasec_vector(profile) is None:
+            continue
+        seen[result["id"]] = seen.get(result["id"], 0) + 1
+        if seen[result["id"]] > index.count(result["id"]):
+            index.add(result["id"], profile)
+    index.flush()
+
+
+def _append_durably(f, line: str):
+    f.write(line + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _preflight_options(max_input_tokens: Optional[int], on_oversize: str, verify_tokens: bool) -> dict:
+    if on_oversize not in ("reject", "truncate"):
+        raise ValueError("on_oversize must be 'reject' or 'truncate'")
+    if max_input_tokens is not None and max_input_tokens < 1:
+        raise ValueError("max_input_tokens must be at least 1")
+    return {"max_input_tokens": max_input_tokens, "on_oversize": on_oversize, "verify": verify_tokens}
+
+
+def preflight_batch(input_file: str, model_id: str, max_input_tokens: Optional[int] = None,
+                    on_oversize: str = "reject", verify_tokens: bool = False, concurrency: int = 4) -> dict:
     """
+    Counts the tokens of every request of a batch without generating anything,
+    to size the concurrency and quota of a run before launching it.
 
-    with open(input_file, 'r') as f_in, open(output_file, 'w') as f_out:
-        description = ". ".join(f_in.readlines()).strip()
+    Returns:
+        The number of records accepted, truncated and rejected, their input
+        tokens, their estimated output tokens and the estimated cost of the run.
+    """
+    preflight = _preflight_options(max_input_tokens, on_oversize, verify_tokens)
 
-        print(f"Processing description: {description[:50]}...")
+    def check(record: dict) -> Optional[tuple[dict, dict]]:
         try:
-            profile = generate_character_profile(description, model_id)
-            f_out.write(profile.model_dump_json(indent=2))
-            # f_out.write('\n---\n')
-        except Exception as e:
-            print(f"Error processing description: {description[:50]}... Error: {e}")
+            return preflight_record(record, model_id, **preflight)
+        except PreflightError:
+            return None
+
+    report = {"records": 0, "accepted": 0, "truncated": 0, "rejected": 0,
+              "input_tokens": 0, "estimated_output_tokens": 0, "max_input_tokens": 0}
+    with ThreadPoolExecutor(max_workers=concurrency if verify_tokens else 1) as pool:
+        for checked in pool.map(check, read_records(input_file)):
+            report["records"] += 1
+            if checked is None:
+                report["rejected"] += 1
+                continue
+            record, tokens = checked
+            report["accepted"] += 1
+            report["truncated"] += "truncated_from" in tokens
+            report["input_tokens"] += tokens["input_tokens"]
+            report["max_input_tokens"] = max(report["max_input_tokens"], tokens["input_tokens"])
+            report["estimated_output_tokens"] += estimate_profile_output_tokens(record["description"])
+    cost = estimate_cost(model_id, {"prompt_tokens": report["input_tokens"],
+                                    "output_tokens": report["estimated_output_tokens"]})
+    report["estimated_cost_usd"] = round(cost, 4) if cost is not None else None
+    print(
+        f"Preflight of {report['records']} records: {report['accepted']} accepted ({report['truncated']} truncated), "
+        f"{report['rejected']} rejected; {report['input_tokens']} input tokens, "
+        f"~{report['estimated_output_tokens']} output tokens, estimated cost {report['estimated_cost_usd']} USD"
+    )
+    return report
+
+
+def batch_process(input_file: str, output_file: str, model_id: str,
+                  concurrency: int = 4, order: str = "input", resume: bool = False,
+                  with_tcc: bool = False, pack_size: int = 1,
+                  max_input_tokens: Optional[int] = None, on_oversize: str = "reject",
+                  verify_tokens: bool = False, parquet_dir: Optional[str] = None,
+                  index_dir: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                  fast_model_id: Optional[str] = None, split: Optional[str] = None) -> dict:
+    """
+    Processes character descriptions from an input file and writes the generated
+    profiles to an output file, one JSON line per input.
+
+    Every line is flushed to disk as soon as it is written, and the hash of
+    each successful input is appended to a journal (`<output_file>.journal`),
+    so an interrupted run can be resumed without redoing finished records.
+
+    Args:
+        input_file: Text file with one description per line, or a JSONL file.
+        output_file: JSONL file receiving one result (or error) record per input.
+        model_id: The model to use for generation.
+        concurrency: Maximum number of requests in flight at once.
+        order: "input" to write results in input order, "completion" to write
+            them as soon as they finish.
+        resume: Skip the records recorded as completed in the progress journal
+            next to `output_file` and append to the existing output instead of
+            overwriting it. The failed results of the retried records are
+            dropped from the output first, so each record keeps one line.
+        with_tcc: Also generate a TCC program for every profile, pipelined
+            with the profile generation of the following records.
+        pack_size: Maximum number of descriptions sent in one profile request.
+            Packs are also bounded by the estimated output tokens of their
+            profiles; records a packed request fails on are retried one by one.
+        max_input_tokens: Input token budget of one profile request, checked
+            before the request is sent (None for no budget).
+        on_oversize: "reject" to fail the records above the budget without
+            sending them, "truncate" to cut their description to fit.
+        verify_tokens: Count the input tokens with the count-tokens API
+            instead of the local estimate.
+        parquet_dir: Also write the profiles to Parquet tables in this
+            directory as the run progresses (see `app.export`). On resume,
+            the finished records missing from the tables are exported again.
+        index_dir: Also add the profiles to the similar-profile index in this
+            directory as the run progresses (see `app.similarity`). On
+            resume, the finished records missing from the index are added.
+        dedup_threshold: Group near-duplicate descriptions (estimated
+            Jaccard similarity of their shingles at least this high, see
+            `app.dedup`) and only send the first of each group to the model.
+            The other members get a copy of its result, marked with
+            `duplicate_of` and written right after it.
+        fast_model_id: Generate the profiles in cascade mode: with this fast
+            model first, escalating to `model_id` only the profiles that fail
+            the local validity checks (see `app.validation`). Not available
+            with packed requests.
+        split: Generate each profile with two concurrent requests, one for
+            the diagnoses and one for the Holland Code assessment (see
+            `services.generate_character_profile_split`); "local" joins
+            their summaries as the overall summary, "model" has it written by
+            a short third request. Not available with packed requests or the
+            cascade mode.
+
+    Returns:
+        A dictionary of run statistics (counts, throughput and latencies),
+        with the token usage and estimated cost of the run by model, and the
+        escalation rate in cascade mode.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if order not in ("input", "completion"):
+        raise ValueError("order must be 'input' or 'completion'")
+    if pack_size < 1:
+        raise ValueError("pack_size must be at least 1")
+    if fast_model_id is not None and pack_size > 1:
+        raise ValueError("cascade mode cannot be combined with packed requests")
+    if split is not None:
+        if split not in SPLIT_SUMMARIES:
+            raise ValueError(f"split must be one of {', '.join(SPLIT_SUMMARIES)}")
+        if pack_size > 1 or fast_model_id is not None:
+            raise ValueError("the split strategy cannot be combined with packed requests or the cascade mode")
+    preflight = _preflight_options(max_input_tokens, on_oversize, verify_tokens)
+    if max_input_tokens is None and not verify_tokens:
+        preflight = None
+
+    journal_file = journal_path(output_file)
+    if resume:
+        _truncate_partial_line(journal_file)
+        _truncate_partial_line(output_file)
+        completed = read_journal(journal_file)
+        _compact_output(output_file, {index for index, record in enumerate(read_records(input_file))
+                                      if input_hash(record, model_id) in completed})
+    else:
+        completed = set()
+
+    start = time.perf_counter()
+    latencies = []
+    failed = 0
+    skipped = 0
+    rejected = 0
+    truncated = 0
+    usage_totals = {}
+    cascaded = 0
+    escalated = 0
+    hashes = {}
+
+    # Representative position -> (position, id, input hash) of the duplicates
+    # that receive a copy of its result.
+    duplicates: dict[int, list[tuple[int, str, str]]] = {}
+    dedup_stats = None
+    if dedup_threshold is not None:
+        # NumPy is only loaded when the run deduplicates its input.
+        from app.dedup import dedup_report, find_near_duplicates
+
+        records = list(read_records(input_file))
+        representatives = find_near_duplicates([record["description"] for record in records], dedup_threshold)
+        dedup_stats = dedup_report(representatives)
+        for index, representative in enumerate(representatives.tolist()):
+            if representative == index:
+                continue
+            record_hash = input_hash(records[index], model_id)
+            # A duplicate of a record finished by an earlier run is processed on its own.
+            if input_hash(records[representative], model_id) not in completed and record_hash not in completed:
+                duplicates.setdefault(representative, []).append((index, records[index]["id"], record_hash))
+        del records
+    fanned_out = {index for members in duplicates.values() for index, _, _ in members}
+
+    def remaining():
+        nonlocal skipped
+        for index, record in enumerate(read_records(input_file)):
+            record_hash = input_hash(record, model_id)
+            if record_hash in completed:
+                skipped += 1
+                continue
+            if index in fanned_out:
+                continue
+            hashes[index] = record_hash
+            yield index, record
+
+    results = _run_concurrently(remaining(), model_id, concurrency, with_tcc, pack_size, preflight, fast_model_id, split)
+    if order == "input":
+        results = _in_input_order(results)
+
+    mode = 'a' if resume else 'w'
+    exporter = ParquetExporter(parquet_dir) if parquet_dir else contextlib.nullcontext()
+    index = None
+    if index_dir:
+        # NumPy is only loaded when the run builds an index.
+        from app.similarity import RiasecIndex
+
+        index = RiasecIndex(index_dir)
+        if resume:
+            _index_missing(index, output_file)
+    total = 0
+    # The index is flushed on exit even when the run is interrupted.
+    with open(output_file, mode, encoding='utf-8') as f_out, open(journal_file, mode, encoding='utf-8') as f_journal, \
+            exporter, index if index is not None else contextlib.nullcontext():
+        if resume and parquet_dir:
+            # The finished records an interrupted run still held in its buffer
+            # never reached a Parquet part: export them again from the output.
+            exported = recover_parts(parquet_dir)
+            for result in _read_results(output_file):
+                if "error" not in result and result["index"] not in exported:
+                    exporter.add(result)
+
+        def write(result: dict, record_hash: str):
+            nonlocal total, failed
+            total += 1
+            if "error" in result:
+                failed += 1
+                print(f"Error processing record {result['id']}: {result['error']}")
+            _append_durably(f_out, json.dumps(result, ensure_ascii=False))
+            # Only successes are journaled, so failed records are retried on resume.
+            if "error" not in result:
+                _append_durably(f_journal, record_hash)
+            # Like the index, the Parquet tables only get finished records, which are not retried.
+            if parquet_dir and "error" not in result:
+                exporter.add(result)
+            if index is not None and "error" not in result:
+                index.add(result["id"], CharacterProfile.model_validate(result["profile"]))
+                # Written in step with the journal, which will not retry the record.
+                index.flush()
+
+        for _, result in results:
+            latencies.append(result["latency_s"])
+            if "error" in result:
+                rejected += result["error"].startswith(PreflightError.__name__)
+            truncated += "truncated_from" in result.get("preflight", {})
+            add_usage(usage_totals.setdefault(model_id, {}), result.get("usage"))
+            add_usage(usage_totals.setdefault(model_id, {}), result.get("tcc_usage"))
+            if "cascade" in result:
+                cascaded += 1
+                escalated += result["cascade"]["escalated"]
+                for usage_model, usage in result["cascade"]["usage"].items():
+                    add_usage(usage_totals.setdefault(usage_model, {}), usage)
+            write(result, hashes.pop(result["index"]))
+            for member_index, member_id, member_hash in duplicates.pop(result["index"], []):
+                copy = {key: value for key, value in result.items()
+                        if key not in ("usage", "tcc_usage", "preflight", "cascade")}
+                write({**copy, "index": member_index, "id": member_id, "duplicate_of": result["id"], "latency_s": 0.0},
+                      member_hash)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "total": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(total / elapsed, 3) if elapsed > 0 else 0.0,
+        "p50_latency_s": percentile(latencies, 50),
+        "p95_latency_s": percentile(latencies, 95),
+        "rejected": rejected,
+        "truncated": truncated,
+        "usage": usage_report(usage_totals, elapsed),
+    }
+    if dedup_stats is not None:
+        stats["dedup"] = {**dedup_stats, "calls_saved": total - len(latencies)}
+    if fast_model_id is not None:
+        stats["cascade"] = {
+            "fast_model_id": fast_model_id,
+            "strong_model_id": model_id,
+            "profiles": cascaded,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / cascaded, 4) if cascaded else 0.0,
+        }
+    print(
+        f"Processed {stats['total']} records ({stats['failed']} failed, {stats['skipped']} already done) in {stats['elapsed_s']}s: "
+        f"{stats['throughput_per_s']} records/s, p50 {stats['p50_latency_s']}s, p95 {stats['p95_latency_s']}s"
+    )
+    if dedup_stats is not None:
+        print(
+            f"Deduplication: {dedup_stats['records']} records in {dedup_stats['clusters']} clusters, "
+            f"{stats['dedup']['calls_saved']} profile requests saved"
+        )
+    if fast_model_id is not None:
+        print(
+            f"Cascade: {escalated} of {cascaded} profiles escalated from {fast_model_id} to {model_id} "
+            f"({stats['cascade']['escalation_rate']:.1%})"
+        )
+    if preflight is not None:
+        print(f"Preflight: {rejected} records rejected, {truncated} truncated to {max_input_tokens} input tokens")
+    for usage_model, usage in stats["usage"].items():
+        print(
+            f"{usage_model}: {usage['requests']} requests, {usage['prompt_tokens']} input tokens "
+            f"({usage['cached_tokens']} cached), {usage['output_tokens']} output tokens, "
+            f"{usage['thinking_tokens']} thinking tokens, {usage['tokens_per_s']} tokens/s, "
+            f"estimated cost {usage['estimated_cost_usd']} USD"
+        )
+    return stats
 
 if __name__ == "__main__":
-    
+
 
     load_dotenv()
     parser = argparse.ArgumentParser(description="Batch process character descriptions.")
-    parser.add_argument("input_file", help="Path to the input file containing character descriptions (one per line).")
-    parser.add_argument("output_file", help="Path to the output file to store the generated profiles.")
+    parser.add_argument("input_file", help="Path to the input file containing character descriptions (one per line, or a .jsonl file).")
+    parser.add_argument("output_file", help="Path to the JSONL output file to store the generated profiles.")
     parser.add_argument("--model_id", default="gemini-2.5-pro", help="The model to use for generation.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of requests in flight at once.")
+    parser.add_argument("--resume", action="store_true", help="Skip inputs already completed according to the progress journal.")
+    parser.add_argument("--with-tcc", action="store_true", help="Also generate a TCC program for every profile, pipelined with the profile generation.")
+    parser.add_argument("--order", choices=["input", "completion"], default="input", help="Write results in input order or completion order.")
+    parser.add_argument("--pack", type=int, default=1, help="Maximum number of descriptions per profile request (packed mode when above 1).")
+    parser.add_argument("--max-input-tokens", type=int, default=None, help="Input token budget of one profile request.")
+    parser.add_argument("--on-oversize", choices=["reject", "truncate"], default="reject", help="Reject the records above the budget, or truncate their description to fit.")
+    parser.add_argument("--verify-tokens", action="store_true", help="Count the input tokens with the count-tokens API instead of the local estimate.")
+    parser.add_argument("--parquet-dir", default=None, help="Also write the profiles, diagnoses and specifiers as Parquet tables to this directory.")
+    parser.add_argument("--index-dir", default=None, help="Also add the profiles to the similar-profile index in this directory.")
+    parser.add_argument("--dedup", type=float, default=None, metavar="THRESHOLD", help="Send one description per group of near-duplicates (similarity at least THRESHOLD, e.g. 0.9) and copy its result to the others.")
+    parser.add_argument("--cascade", nargs="?", const=FAST_MODEL_ID, default=None, metavar="FAST_MODEL_ID", help=f"Generate with a fast model first (default {FAST_MODEL_ID}) and escalate to --model_id only the profiles failing the local validity checks.")
+    parser.add_argument("--split", nargs="?", const="local", choices=SPLIT_SUMMARIES, default=None, metavar="SUMMARY", help="Generate the diagnoses and the Holland Code assessment with two concurrent requests; the overall summary is joined locally (local, the default) or written by a third request (model).")
+    parser.add_argument("--preflight-only", action="store_true", help="Only count the tokens and estimate the cost of the batch, without generating anything.")
     args = parser.parse_args()
 
-    batch_process(args.input_file, args.output_file, args.model_id)
+    if args.preflight_only:
+        preflight_batch(args.input_file, args.model_id, args.max_input_tokens, args.on_oversize, args.verify_tokens, args.concurrency)
+    else:
+        batch_process(args.input_file, args.output_file, args.model_id, args.concurrency, args.order, args.resume,
+                      args.with_tcc, args.pack, args.max_input_tokens, args.on_oversize, args.verify_tokens,
+                      args.parquet_dir, args.index_dir, args.dedup, args.cascade, args.split)
@@ -0,0 +1,267 @@
+"""
+Content-addressed cache for model responses.
+
+Responses are keyed on a hash of (model id, prompt, generation config, response
+schema), so identical requests are answered locally. The cache has two tiers:
+a bounded in-process LRU and an optional SQLite file shared across processes,
+with a time-to-live and a size bound.
+"""
+
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+from pydantic import BaseModel
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes unicode and whitespace so trivially different inputs share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+@functools.cache
+def schema_version(response_model: type[BaseModel]) -> str:
+    """Returns a short hash of the JSON schema of `response_model`."""
+    schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(model_id: str, prompt: str, generation_config: Any, response_model: type[BaseModel]) -> str:
+    """
+    Builds the cache key of a request.
+
+    Args:
+        model_id: The model the request is sent to.
+        prompt: The full prompt text.
+        generation_config: The `GenerateContentConfig` of the request.
+        response_model: The pydantic model the response is parsed into.
+    """
+    if isinstance(generation_config, BaseModel):
+        config = generation_config.model_dump(mode="json", exclude={"response_schema"}, exclude_none=True)
+    else:
+        config = generation_config
+    payload = json.dumps(
+        {
+            "model": model_id,
+            "prompt": prompt,
+            "config": config,
+            "schema": schema_version(response_model),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """A thread-safe, size-bounded, least-recently-used mapping."""
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    A SQLite-backed string cache with a time-to-live and a total size bound.
+
+    When the stored values exceed `max_bytes`, the least recently accessed
+    entries are evicted first.
+    """
+
+    def __init__(self, path: str, ttl_s: float = 7 * 24 * 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection for one transaction, committed on success and always closed."""
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl_s:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-process LRU in front of an optional disk tier.
+
+    Counters are exposed through `stats()`.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[DiskCache] = None, enabled: bool = True):
+        self.memory = memory
+        self.disk = disk
+        self.enabled = enabled
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and the current tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        stats["memory_entries"] = len(self.memory)
+        stats["disk_entries"] = len(self.disk) if self.disk is not None else 0
+        return stats
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process-wide response cache, configured from the environment.
+
+    `PSY_DSM_CACHE_SIZE` bounds the in-memory tier, `PSY_DSM_CACHE_PATH` enables
+    the SQLite tier, `PSY_DSM_CACHE_TTL_S` and `PSY_DSM_CACHE_MAX_MB` bound it,
+    and `PSY_DSM_CACHE_DISABLED=1` turns the cache off entirely.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                disk = None
+                path = os.getenv("PSY_DSM_CACHE_PATH")
+                if path:
+                    disk = DiskCache(
+                        path,
+                        ttl_s=float(os.getenv("PSY_DSM_CACHE_TTL_S", 7 * 24 * 3600)),
+                        max_bytes=int(float(os.getenv("PSY_DSM_CACHE_MAX_MB", 256)) * 1024 * 1024),
+                    )
+                _response_cache = ResponseCache(
+                    LRUCache(int(os.getenv("PSY_DSM_CACHE_SIZE", 256))),
+                    disk,
+                    enabled=os.getenv("PSY_DSM_CACHE_DISABLED", "0") != "1",
+                )
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """Replaces the process-wide response cache (None rebuilds it from the environment)."""
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = cache
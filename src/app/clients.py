@@ -0,0 +1,137 @@
+"""
+Process-wide manager for the Gemini clients.
+
+A `genai.Client` owns an HTTP connection pool, so building one per request
+pays for auth setup and new TLS handshakes every time. This module keeps one
+client per (project, location) and hands the same instance to every caller.
+
+With a base URL configured (`GENAI_BASE_URL`), the clients talk to that
+endpoint with the Gemini API protocol instead of Vertex AI, e.g. to run the
+benchmarks against the local fake backend of `benchmarks/fake_gemini.py`.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+DEFAULT_MAX_CONNECTIONS = 20
+
+_lock = threading.Lock()
+_clients: dict[tuple[Optional[str], Optional[str]], genai.Client] = {}
+_settings = {
+    "max_connections": int(os.getenv("GENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+    "timeout_s": float(os.getenv("GENAI_TIMEOUT_S")) if os.getenv("GENAI_TIMEOUT_S") else None,
+    "base_url": os.getenv("GENAI_BASE_URL") or None,
+}
+
+
+# Default of the `configure` arguments that leave a setting unchanged.
+_UNSET: Any = object()
+
+
+def configure(max_connections: int = _UNSET, timeout_s: Optional[float] = _UNSET,
+              base_url: Optional[str] = _UNSET):
+    """
+    Updates the connection pool size, request timeout and endpoint of the shared clients.
+
+    Omitted arguments leave their setting unchanged. Existing clients are
+    dropped so the next call builds them with the new settings.
+
+    Args:
+        max_connections: Maximum number of pooled HTTP connections per client.
+        timeout_s: Per-request timeout in seconds, or None for the SDK default.
+        base_url: Endpoint speaking the Gemini API protocol, or None for Vertex AI.
+    """
+    with _lock:
+        if max_connections is not _UNSET:
+            if max_connections is None or max_connections < 1:
+                raise ValueError("max_connections must be at least 1")
+            _settings["max_connections"] = max_connections
+        if timeout_s is not _UNSET:
+            _settings["timeout_s"] = timeout_s
+        if base_url is not _UNSET:
+            _settings["base_url"] = base_url
+        _clients.clear()
+
+
+def get_settings() -> dict:
+    """Returns a copy of the current client settings."""
+    with _lock:
+        return dict(_settings)
+
+
+def _build_http_options() -> types.HttpOptions:
+    import httpx
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=_settings["max_connections"],
+        max_keepalive_connections=_settings["max_connections"],
+    )
+    timeout_s = _settings["timeout_s"]
+    return types.HttpOptions(
+        base_url=_settings["base_url"],
+        timeout=int(timeout_s * 1000) if timeout_s is not None else None,
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+
+
+def get_client(project: Optional[str] = None, location: Optional[str] = None) -> genai.Client:
+    """
+    Returns the shared client for the given project and location.
+
+    Defaults to the `GOOGLE_CLOUD_PROJECT` and `GOOGLE_CLOUD_LOCATION` environment
+    variables. The client is created on first use and reused afterwards.
+    """
+    key = (
+        project or os.getenv("GOOGLE_CLOUD_PROJECT"),
+        location or os.getenv("GOOGLE_CLOUD_LOCATION"),
+    )
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    # Imported here rather than at module level to keep the cold start fast.
+    from google import genai
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            if _settings["base_url"]:
+                # The API key is only checked by a real Gemini API endpoint.
+                client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY") or "unused",
+                    http_options=_build_http_options(),
+                )
+            else:
+                client = genai.Client(
+                    vertexai=True,
+                    project=key[0],
+                    location=key[1],
+                    http_options=_build_http_options(),
+                )
+            _clients[key] = client
+        return client
+
+
+def reset_clients():
+    """Drops every shared client; the next call to `get_client` builds a new one."""
+    with _lock:
+        _clients.clear()
+
+
+def _reset_after_fork():
+    # Connection pools and locks must not be shared with a forked child.
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
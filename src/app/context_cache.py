@@ -0,0 +1,186 @@
+"""
+Explicit Gemini context caching for the static prompt prefixes.
+
+The profile prompt starts with a large, fixed block of instructions and a
+worked example. With context caching enabled, that prefix is registered once
+per model as a cached content, and requests only send the part after it, so
+the prefix is neither re-sent nor billed as fresh input tokens. Cached
+contents are extended before their TTL runs out. Prefixes estimated under the
+model's minimum cached-content size are never submitted; when caching is
+otherwise unavailable (unsupported model, missing permissions) the requests
+fall back to the full prompt.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from .ratelimit import estimate_tokens
+
+if TYPE_CHECKING:
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+# Minimum size of an explicit cached content by model prefix, in tokens. Other
+# models get the largest minimum. The profile system prompt (about 1,040
+# tokens) is only cached for the Flash models.
+MIN_CACHED_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+DEFAULT_MIN_CACHED_TOKENS = 4096
+
+
+def min_cached_tokens(model_id: str) -> int:
+    """Returns the minimum number of tokens of a cached content for `model_id`."""
+    for prefix in sorted(MIN_CACHED_TOKENS, key=len, reverse=True):
+        if model_id.startswith(prefix):
+            return MIN_CACHED_TOKENS[prefix]
+    return DEFAULT_MIN_CACHED_TOKENS
+
+
+class ContextCacheManager:
+    """
+    Keeps one cached content per (model, prompt prefix) and hands out its name.
+
+    Args:
+        enabled: Whether prefixes are cached at all.
+        ttl_s: Lifetime requested for each cached content.
+        refresh_margin_s: A cached content is extended once it expires within this margin.
+        retry_after_s: After a failed creation, the prefix is sent in full for this long
+            before caching is tried again.
+        min_tokens: Minimum estimated size of a cached prefix, in tokens; None
+            for the minimum of each model (see `MIN_CACHED_TOKENS`).
+    """
+
+    def __init__(self, enabled: bool = False, ttl_s: float = 3600, refresh_margin_s: float = 300,
+                 retry_after_s: float = 600, min_tokens: Optional[int] = None):
+        if refresh_margin_s >= ttl_s:
+            raise ValueError("refresh_margin_s must be shorter than ttl_s")
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.ttl_s = ttl_s
+        self.refresh_margin_s = refresh_margin_s
+        self.retry_after_s = retry_after_s
+        # (model, prefix hash) -> (cached content name or None if unavailable, expiry time)
+        self._entries: dict[tuple[str, str], tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_id: str, prefix: str) -> tuple[str, str]:
+        return model_id, hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def cacheable(self, model_id: str, prefix: str) -> bool:
+        """Whether caching is enabled and `prefix` is large enough to be cached for `model_id`."""
+        min_tokens = self.min_tokens if self.min_tokens is not None else min_cached_tokens(model_id)
+        return self.enabled and estimate_tokens(prefix) >= min_tokens
+
+    def lookup(self, client: genai.Client, model_id: str, prefix: str) -> Optional[str]:
+        """
+        Returns the name of the cached content holding `prefix` for `model_id`.
+
+        The cached content is created on first use and extended when it is about
+        to expire. Returns None when caching is disabled or unavailable, or
+        when the prefix is too small to be cached.
+        """
+        if not self.cacheable(model_id, prefix):
+            return None
+        key = self._key(model_id, prefix)
+        now = time.time()
+        entry = self._entries.get(key)
+        if self._is_current(entry, now):
+            return entry[0]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._is_current(entry, now):
+                return entry[0]
+            try:
+                name = self._refresh(client, model_id, prefix, entry[0] if entry else None)
+            except Exception as e:
+                logger.warning("Context caching unavailable for %s, sending the full prompt: %s", model_id, e)
+                self._entries[key] = (None, now + self.retry_after_s)
+                return None
+            self._entries[key] = (name, now + self.ttl_s)
+            return name
+
+    def _is_current(self, entry: Optional[tuple[Optional[str], float]], now: float) -> bool:
+        if entry is None:
+            return False
+        name, expires = entry
+        if name is None:
+            return now < expires
+        return now < expires - self.refresh_margin_s
+
+    async def alookup(self, client: genai.Client, model_id: str, prefix: str) -> Optional[str]:
+        """Async counterpart of `lookup`; creating the cache does not block the event loop."""
+        if not self.cacheable(model_id, prefix):
+            return None
+        return await asyncio.to_thread(self.lookup, client, model_id, prefix)
+
+    def _refresh(self, client: genai.Client, model_id: str, prefix: str, name: Optional[str]) -> str:
+        from google.genai import types
+
+        ttl = f"{int(self.ttl_s)}s"
+        if name is not None:
+            # Extending the TTL keeps the already processed prefix; a new cache is
+            # only created when the old one is gone.
+            try:
+                client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=ttl))
+                return name
+            except Exception:
+                pass
+        cached = client.caches.create(
+            model=model_id,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix],
+                ttl=ttl,
+                display_name=f"psy-dsm-{self._key(model_id, prefix)[1][:16]}",
+            ),
+        )
+        return cached.name
+
+    def invalidate(self, model_id: str, prefix: str):
+        """Forgets the cached content of a prefix, e.g. after a request rejected it."""
+        with self._lock:
+            self._entries.pop(self._key(model_id, prefix), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_context_cache: Optional[ContextCacheManager] = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache() -> ContextCacheManager:
+    """
+    Returns the process-wide context cache manager, configured from the environment.
+
+    `PSY_DSM_CONTEXT_CACHE=1` turns context caching on and
+    `PSY_DSM_CONTEXT_CACHE_TTL_S` sets the lifetime of the cached contents.
+    """
+    global _context_cache
+    if _context_cache is None:
+        with _context_cache_lock:
+            if _context_cache is None:
+                _context_cache = ContextCacheManager(
+                    enabled=os.getenv("PSY_DSM_CONTEXT_CACHE", "0") == "1",
+                    ttl_s=float(os.getenv("PSY_DSM_CONTEXT_CACHE_TTL_S", 3600)),
+                )
+    return _context_cache
+
+
+def set_context_cache(manager: Optional[ContextCacheManager]):
+    """Replaces the process-wide context cache manager (None rebuilds it from the environment)."""
+    global _context_cache
+    with _context_cache_lock:
+        _context_cache = manager
@@ -1,5 +1,6 @@
 import streamlit as st
-from app.models import CharacterProfile
+from typing import Iterable, Optional
+from app.models import CharacterProfile, TCCProgram
 from app.visualizations import get_riasec_figures
 
 def display_profile(profile: CharacterProfile):
@@ -75,4 +76,63 @@ def display_profile(profile: CharacterProfile):
                     st.write(note)
         st.markdown("---")
         with st.expander("Full diagnoses JSON"):
-            st.json(diagnoses)
\ No newline at end of file
+            st.json(diagnoses)
+
+
+def display_profile_stream(profiles: Iterable[CharacterProfile], placeholder=None) -> Optional[CharacterProfile]:
+    """
+    Renders a stream of partially populated profiles, section by section.
+
+    Each profile replaces the previous rendering in `placeholder` (a new
+    `st.empty()` by default), so sections appear as soon as they arrive.
+
+    Returns:
+        The last profile of the stream, or None if the stream was empty.
+    """
+    if placeholder is None:
+        placeholder = st.empty()
+    profile = None
+    for profile in profiles:
+        with placeholder.container():
+            display_profile(profile)
+    return profile
+
+
+def display_similar_profiles(profile: CharacterProfile, index, k: int = 5):
+    """
+    Renders the `k` indexed profiles whose RIASEC scores are the most similar
+    to those of `profile` (see `app.similarity.RiasecIndex`), optionally
+    restricted to one of its diagnosis codes.
+    """
+    st.subheader("Similar Cases")
+    codes = [code for code in index.profile_codes(profile) if not code.startswith("name:")]
+    code = st.selectbox("Sharing the diagnosis", ["Any diagnosis", *codes], key="similar_cases_code")
+    similar = index.query(profile, k=k, code=None if code == "Any diagnosis" else code)
+    if not similar:
+        st.info("No similar case in the index.")
+        return
+    st.dataframe(
+        [{"Id": case["id"], "Character": case["character_name"], "Similarity": case["similarity"],
+          "Diagnosis codes": ", ".join(case["codes"])} for case in similar],
+        hide_index=True,
+    )
+
+
+def display_tcc_program(tcc_program: TCCProgram):
+    """Renders the TCC program in the UI."""
+    st.header("Generated TCC Program")
+
+    st.subheader(tcc_program.title)
+    st.write(f"**Global Objective:** {tcc_program.global_objective}")
+
+    for i, module in enumerate(tcc_program.modules):
+        st.markdown(f"### Module {i+1}: {module.title}")
+        st.write(f"**Objective:** {module.objective}")
+        st.write(f"**Session Range:** {module.session_range}")
+
+        st.markdown("#### Activities:")
+        for activity in module.activities:
+            st.markdown(f"**- {activity.title}**")
+            for detail in activity.details:
+                st.markdown(f"  - {detail}")
+        st.markdown("---")
@@ -0,0 +1,181 @@
+"""
+Near-duplicate detection of character descriptions with MinHash and LSH.
+
+Descriptions are normalized (case, accents, punctuation, whitespace) and cut
+into character shingles; each is summarized by a MinHash signature, whose
+agreement rate with another signature estimates the Jaccard similarity of
+their shingle sets. Locality-sensitive hashing buckets the signatures band by
+band, so only descriptions sharing a bucket are ever compared: the cost grows
+linearly with the number of descriptions, without pairwise comparisons.
+
+Each cluster of near-duplicates is represented by its first description; the
+other members are kept in the cluster only if their own similarity to the
+representative reaches the threshold, so a chain of small edits never merges
+two different descriptions.
+
+Signatures take `4 * num_perm` bytes per description (256 bytes by default).
+
+Usage:
+    python -m app.dedup characters.txt --threshold 0.9 --output clusters.jsonl
+"""
+
+import argparse
+import json
+import re
+import unicodedata
+from typing import Iterable, Sequence
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_NUM_PERM = 64
+SHINGLE_SIZE = 5
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SHIFT = np.uint64(32)
+
+
+def normalize_description(text: str) -> str:
+    """Lowercases a description and strips its accents, punctuation and extra whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_PUNCTUATION.sub(" ", without_accents).split())
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Returns the distinct 64-bit hashes of the `size`-byte shingles of a normalized text."""
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < size:
+        data = np.concatenate([data, np.zeros(size - len(data), dtype=np.uint64)])
+    windows = np.lib.stride_tricks.sliding_window_view(data, size)
+    powers = np.uint64(257) ** np.arange(size, dtype=np.uint64)
+    return np.unique(windows @ powers)
+
+
+def _permutations(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return multipliers, increments
+
+
+def minhash_signatures(texts: Iterable[str], num_perm: int = DEFAULT_NUM_PERM, seed: int = 0) -> np.ndarray:
+    """
+    Returns the (n, num_perm) uint32 MinHash signatures of the texts (after
+    normalization), using multiply-shift hashes as the permutations.
+    """
+    multipliers, increments = _permutations(num_perm, seed)
+    signatures = []
+    for text in texts:
+        shingles = shingle_hashes(normalize_description(text))
+        hashed = (shingles[:, None] * multipliers + increments) >> _SHIFT
+        signatures.append(hashed.min(axis=0).astype(np.uint32))
+    if not signatures:
+        return np.empty((0, num_perm), dtype=np.uint32)
+    return np.stack(signatures)
+
+
+def lsh_parameters(threshold: float, num_perm: int, recall: float = 0.95) -> tuple[int, int]:
+    """
+    Returns the (bands, rows) split of the signatures with the most rows per
+    band (the fewest spurious candidates) that still makes descriptions at
+    the threshold candidates with probability `recall`: candidates are
+    verified afterwards, so missing a pair costs more than comparing one more.
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+def _connected_components(edges: list[tuple[np.ndarray, np.ndarray]], n: int) -> np.ndarray:
+    """Labels each node with the smallest node of its component."""
+    labels = np.arange(n)
+    if not edges:
+        return labels
+    sources = np.concatenate([source for source, _ in edges])
+    targets = np.concatenate([target for _, target in edges])
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, sources, labels[targets])
+        np.minimum.at(labels, targets, labels[sources])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def cluster_signatures(signatures: np.ndarray, threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """
+    Groups near-duplicate signatures.
+
+    Returns:
+        For each signature, the position of its cluster's representative (the
+        first member of the cluster; itself for a unique description).
+    """
+    n, num_perm = signatures.shape
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    bands, rows = lsh_parameters(threshold, num_perm)
+    positions = np.arange(n)
+    edges = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, buckets = np.unique(keys, return_inverse=True)
+        first = np.full(buckets.max() + 1, n)
+        np.minimum.at(first, buckets, positions)
+        heads = first[buckets]
+        linked = heads != positions
+        edges.append((positions[linked], heads[linked]))
+    representatives = _connected_components(edges, n)
+
+    # Members too far from their representative are left on their own.
+    similarity = (signatures == signatures[representatives]).mean(axis=1)
+    return np.where(similarity >= threshold, representatives, positions)
+
+
+def find_near_duplicates(texts: Sequence[str], threshold: float = DEFAULT_THRESHOLD,
+                         num_perm: int = DEFAULT_NUM_PERM, seed: int = 0) -> np.ndarray:
+    """
+    Returns, for each text, the position of the representative of its cluster
+    of near-duplicates (estimated Jaccard similarity of at least `threshold`).
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be in (0, 1]")
+    return cluster_signatures(minhash_signatures(texts, num_perm, seed), threshold)
+
+
+def dedup_report(representatives: np.ndarray) -> dict:
+    """Counts the clusters and the model calls saved by sending one description per cluster."""
+    clusters = int((representatives == np.arange(len(representatives))).sum())
+    return {
+        "records": len(representatives),
+        "clusters": clusters,
+        "duplicates": len(representatives) - clusters,
+        "calls_saved_pct": round(100 * (len(representatives) - clusters) / len(representatives), 2)
+        if len(representatives) else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from app.batch import read_records
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate descriptions in a batch input file.")
+    parser.add_argument("input_file", help="Path to the input file (one description per line, or a .jsonl file).")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Minimum estimated Jaccard similarity of near-duplicates.")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="Number of MinHash permutations.")
+    parser.add_argument("--output", default=None, help="JSONL file to write the clusters of more than one record to.")
+    args = parser.parse_args()
+
+    records = list(read_records(args.input_file))
+    representatives = find_near_duplicates([r["description"] for r in records], args.threshold, args.num_perm)
+    if args.output:
+        clusters = {}
+        for position, representative in enumerate(representatives):
+            clusters.setdefault(int(representative), []).append(records[position]["id"])
+        with open(args.output, 'w', encoding='utf-8') as f_out:
+            for members in clusters.values():
+                if len(members) > 1:
+                    f_out.write(json.dumps({"representative": members[0], "members": members}, ensure_ascii=False) + "\n")
+    print(json.dumps(dedup_report(representatives), indent=2))
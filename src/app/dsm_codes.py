@@ -0,0 +1,296 @@
+"""
+Offline index of DSM-5 diagnosis codes, for validating and normalizing the
+`dsm_code` of generated diagnoses without another model call.
+
+The bundled table (`data/dsm5_codes.csv`) lists each diagnosis with its
+DSM-5 (ICD-9-CM) and ICD-10-CM codes, its English and French names, its
+category and common aliases. Codes are looked up exactly, then by their
+closest parent or family ("F50.810" finds F50.81, "F60" every F60 code);
+disorder names exactly (accents, case and punctuation folded), by prefix
+(whole words only), then fuzzily; categories by their words, ignoring
+stopwords.
+
+`check_diagnosis` flags the diagnoses whose code is missing, malformed or
+unknown, whose ICD-9 and ICD-10 codes designate different disorders, or
+whose code or category does not match the disorder name.
+
+Usage:
+    python -m app.dsm_codes profiles.jsonl --output code_checks.jsonl
+"""
+
+import argparse
+import bisect
+import csv
+import difflib
+import functools
+import json
+import os
+import time
+from typing import Optional
+
+from .dedup import normalize_description
+from .models import CharacterProfile, DiagnosisEntry
+from .validation import dsm_code_is_well_formed, split_dsm_codes
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "dsm5_codes.csv")
+FIELDS = ("dsm_code", "icd10_code", "name_en", "name_fr", "category_en", "category_fr")
+FLAGS = ("missing_code", "malformed_code", "unknown_code", "inconsistent_codes",
+         "name_mismatch", "unknown_name", "category_mismatch")
+
+# Minimum difflib ratio of a fuzzy name match.
+FUZZY_CUTOFF = 0.8
+
+# Words left out when comparing categories, e.g. "Troubles liés aux traumatismes et au stress".
+_CATEGORY_STOPWORDS = frozenset(
+    "a au aux d de des du en et l la le les ou and of or the to".split())
+
+
+def _category_words(category: str) -> list[str]:
+    return [word for word in normalize_description(category).split() if word not in _CATEGORY_STOPWORDS]
+
+
+def _same_word(word: str, other: str) -> bool:
+    """Whether two words are equal or one is the stem of the other, e.g. "stress" and "stressor"."""
+    shorter, longer = sorted((word, other), key=len)
+    return longer.startswith(shorter) and (len(shorter) >= 4 or shorter == longer)
+
+
+class DsmCodeIndex:
+    """
+    An in-memory index of the code table.
+
+    Entries are kept as tuples of `FIELDS`; codes and folded names map to
+    the positions of their entries.
+    """
+
+    def __init__(self, rows: list[dict]):
+        self._entries: list[tuple[str, ...]] = []
+        self._by_code: dict[str, set[int]] = {}
+        self._by_name: dict[str, set[int]] = {}
+        for position, row in enumerate(rows):
+            self._entries.append(tuple(row[field] for field in FIELDS))
+            for code in (row["dsm_code"], row["icd10_code"]):
+                self._by_code.setdefault(code.upper(), set()).add(position)
+            names = [row["name_en"], row["name_fr"], *filter(None, (row.get("aliases") or "").split("|"))]
+            for name in names:
+                self._by_name.setdefault(normalize_description(name), set()).add(position)
+        self._codes = sorted(self._by_code)
+        self._names = sorted(self._by_name)
+        self.match_name = functools.lru_cache(maxsize=4096)(self._match_name)
+
+    @classmethod
+    def from_csv(cls, path: str = DATA_FILE) -> "DsmCodeIndex":
+        with open(path, 'r', encoding='utf-8', newline='') as f_in:
+            return cls(list(csv.DictReader(f_in)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entry(self, position: int) -> dict:
+        """Returns an entry of the table as a dict of `FIELDS`."""
+        return dict(zip(FIELDS, self._entries[position]))
+
+    def format_code(self, position: int) -> str:
+        """Returns the canonical `dsm_code` of an entry, e.g. "301.83 (F60.3)"."""
+        dsm_code, icd10_code = self._entries[position][:2]
+        return f"{dsm_code} ({icd10_code})"
+
+    def match_code(self, code: str) -> tuple[Optional[str], frozenset[int]]:
+        """
+        Looks a single code up.
+
+        A code missing from the table is shortened one character at a time,
+        down to its category (the part before the dot), until it is a known
+        code or the prefix of known codes: "F50.810" finds its parent F50.81,
+        "296.23" (a severity the table does not list) its siblings 296.2x,
+        and "F60" every F60 code.
+
+        Returns:
+            How it matched ("exact", "parent", "family", or None) and the
+            positions of the matching entries.
+        """
+        code = code.strip().upper().rstrip(".")
+        if code in self._by_code:
+            return "exact", frozenset(self._by_code[code])
+        category_length = len(code.split(".")[0])
+        for end in range(len(code), category_length - 1, -1):
+            prefix = code[:end].rstrip(".")
+            if end < len(code) and prefix in self._by_code:
+                return "parent", frozenset(self._by_code[prefix])
+            family = set()
+            for known in self._codes[bisect.bisect_left(self._codes, prefix):]:
+                if not known.startswith(prefix):
+                    break
+                if "." in prefix or known[len(prefix)] == ".":
+                    family |= self._by_code[known]
+            if family:
+                return "family", frozenset(family)
+        return None, frozenset()
+
+    def _match_name(self, name: str) -> tuple[Optional[str], frozenset[int]]:
+        """
+        Looks a disorder name (French or English) up.
+
+        Returns:
+            How it matched ("exact", "prefix" when one name starts with the
+            other, "fuzzy", or None) and the positions of the matching entries.
+        """
+        key = normalize_description(name)
+        if not key:
+            return None, frozenset()
+        if key in self._by_name:
+            return "exact", frozenset(self._by_name[key])
+        # Every known name the given one is the start of, e.g. without the subtype.
+        matches = set()
+        for known in self._names[bisect.bisect_left(self._names, key):]:
+            if not known.startswith(key):
+                break
+            if known == key or known[len(key)] == " ":
+                matches |= self._by_name[known]
+        if matches:
+            return "prefix", frozenset(matches)
+        # Or the longest known name the given one specifies further, e.g. with an episode.
+        specified = [known for known in self._names if key.startswith(known + " ")]
+        if specified:
+            return "prefix", frozenset(self._by_name[max(specified, key=len)])
+        close = difflib.get_close_matches(key, self._names, n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            return "fuzzy", frozenset(self._by_name[close[0]])
+        return None, frozenset()
+
+    def _category_matches(self, category: str, positions: frozenset[int]) -> bool:
+        """
+        Whether a category names the category of one of the entries.
+
+        Either contains the other, or every word of the shorter one (but
+        stopwords) is a word or stem of the longer one, so "Troubles liés aux
+        traumatismes et au stress" matches "Troubles liés à des traumatismes
+        ou à des facteurs de stress".
+        """
+        key = normalize_description(category)
+        words = _category_words(category)
+        for position in positions:
+            for expected in self._entries[position][4:6]:
+                folded = normalize_description(expected)
+                if key in folded or folded in key:
+                    return True
+                shorter, longer = sorted((words, _category_words(expected)), key=len)
+                if shorter and all(any(_same_word(word, other) for other in longer) for word in shorter):
+                    return True
+        return False
+
+    def check_diagnosis(self, diagnosis: DiagnosisEntry) -> dict:
+        """
+        Validates and normalizes the code of a diagnosis against its name and category.
+
+        Returns:
+            The diagnosis name and code, the canonical code of the disorder
+            it resolves to (`normalized_code`, None when it is unknown or
+            ambiguous), the canonical code of its name alone (`name_code`),
+            and its `flags` (see `FLAGS`).
+        """
+        flags = []
+        code_positions = None
+        tokens = split_dsm_codes(diagnosis.dsm_code or "")
+        if not tokens:
+            flags.append("missing_code")
+        elif not dsm_code_is_well_formed(diagnosis.dsm_code):
+            flags.append("malformed_code")
+        token_matches = []
+        for token in tokens:
+            how, positions = self.match_code(token)
+            if how is None:
+                if not {"malformed_code", "unknown_code"} & set(flags):
+                    flags.append("unknown_code")
+                continue
+            token_matches.append(positions)
+        if token_matches:
+            code_positions = frozenset.intersection(*token_matches)
+            if not code_positions:
+                flags.append("inconsistent_codes")
+                code_positions = frozenset.union(*token_matches)
+
+        _, name_positions = self.match_name(diagnosis.disorder_name)
+        if not name_positions:
+            flags.append("unknown_name")
+        elif code_positions and not code_positions & name_positions:
+            flags.append("name_mismatch")
+
+        if code_positions and name_positions:
+            resolved = (code_positions & name_positions) or code_positions
+        else:
+            resolved = code_positions or name_positions
+        if resolved and diagnosis.dsm_category.strip() and not self._category_matches(diagnosis.dsm_category, resolved):
+            flags.append("category_mismatch")
+
+        return {
+            "disorder_name": diagnosis.disorder_name,
+            "dsm_code": diagnosis.dsm_code,
+            "normalized_code": self._single_code(resolved),
+            "name_code": self._single_code(name_positions),
+            "flags": flags,
+        }
+
+    def _single_code(self, positions: frozenset[int]) -> Optional[str]:
+        codes = {self.format_code(position) for position in positions}
+        return codes.pop() if len(codes) == 1 else None
+
+    def check_profile(self, profile: CharacterProfile) -> list[dict]:
+        """Checks every diagnosis of a profile (see `check_diagnosis`)."""
+        return [self.check_diagnosis(diagnosis) for diagnosis in profile.diagnoses]
+
+
+@functools.cache
+def get_code_index() -> DsmCodeIndex:
+    """The index of the bundled code table, loaded once at first use."""
+    return DsmCodeIndex.from_csv()
+
+
+def check_batch_output(input_file: str, output_file: Optional[str] = None,
+                       index: Optional[DsmCodeIndex] = None) -> dict:
+    """
+    Checks the diagnosis codes of every profile of a batch output file (JSONL).
+
+    With `output_file`, the checks of each profile are written to it as one
+    JSON line (`index`, `id`, `diagnoses`).
+
+    Returns:
+        The number of profiles, diagnoses and flagged diagnoses, and the
+        count of each flag.
+    """
+    index = index or get_code_index()
+    report = {"profiles": 0, "diagnoses": 0, "flagged": 0, "flags": dict.fromkeys(FLAGS, 0)}
+    start = time.perf_counter()
+    f_out = open(output_file, 'w', encoding='utf-8') if output_file else None
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f_in:
+            for line in f_in:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                if result.get("profile") is None:
+                    continue
+                checks = index.check_profile(CharacterProfile.model_validate(result["profile"]))
+                report["profiles"] += 1
+                report["diagnoses"] += len(checks)
+                for check in checks:
+                    report["flagged"] += bool(check["flags"])
+                    for flag in check["flags"]:
+                        report["flags"][flag] += 1
+                if f_out is not None:
+                    f_out.write(json.dumps({"index": result.get("index"), "id": result.get("id"),
+                                            "diagnoses": checks}, ensure_ascii=False) + "\n")
+    finally:
+        if f_out is not None:
+            f_out.close()
+    report["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the diagnosis codes of a batch output file against the bundled DSM-5 code table.")
+    parser.add_argument("input_file", help="Path to the JSONL batch output file.")
+    parser.add_argument("--output", default=None, help="JSONL file to write the checks of each profile to.")
+    args = parser.parse_args()
+
+    print(json.dumps(check_batch_output(args.input_file, args.output), indent=2))
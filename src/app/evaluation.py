@@ -0,0 +1,312 @@
+"""
+Concurrent, pipelined evaluation of the profile generation against golden cases.
+
+Profiles are generated in a thread pool, and each finished profile is handed
+straight to the LLM judge while the other generations are still in flight.
+Results are written as a per-case table (CSV and JSONL) with aggregate
+statistics.
+
+Each generated profile is first scored with the deterministic local metrics
+of `app.scoring`; only the cases whose local score is in the uncertain band
+are sent to the judge, the others get a score estimated from the metrics.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.metrics import percentile
+from app.models import CharacterProfile
+from app.scoring import UNCERTAIN_BAND, estimated_score, needs_judge, score_profiles
+from app.services import evaluate_profile_with_llm, generate_character_profile, get_last_usage
+
+DEFAULT_DATASET = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "evaluation", "golden_cases.jsonl"))
+
+METRIC_COLUMNS = [
+    "local_score", "riasec_cosine", "riasec_l2", "riasec_spearman", "top_theme_overlap",
+    "dsm_precision", "dsm_recall", "criteria_delta",
+]
+
+TABLE_COLUMNS = [
+    "id", "score", "score_source", "rationale", "error", *METRIC_COLUMNS,
+    "generation_latency_s", "judge_latency_s",
+    "generation_prompt_tokens", "generation_output_tokens", "generation_total_tokens",
+    "judge_prompt_tokens", "judge_output_tokens", "judge_total_tokens",
+]
+
+
+def load_cases(dataset_file: str) -> list[dict]:
+    """
+    Loads the golden cases of a JSONL dataset.
+
+    Each line holds a `description`, its `golden_profile` (a CharacterProfile
+    object) and an optional `id` (defaults to the line number).
+    """
+    cases = []
+    with open(dataset_file, 'r', encoding='utf-8') as f_in:
+        for line_number, line in enumerate(f_in, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            cases.append({
+                "id": str(record.get("id", line_number)),
+                "description": record["description"],
+                "golden_profile": CharacterProfile.model_validate(record["golden_profile"]),
+            })
+    return cases
+
+
+def _tokens(prefix: str) -> dict:
+    usage = get_last_usage() or {}
+    return {
+        f"{prefix}_prompt_tokens": usage.get("prompt_tokens"),
+        f"{prefix}_output_tokens": usage.get("output_tokens"),
+        f"{prefix}_total_tokens": usage.get("total_tokens"),
+    }
+
+
+def generate_case(case: dict, model_id: str) -> dict:
+    """Generates the profile of a case; failures are captured as an `error` field."""
+    start = time.perf_counter()
+    result = {"id": case["id"]}
+    try:
+        profile = generate_character_profile(case["description"], model_id)
+        if profile is None:
+            raise ValueError("The model returned no parsable profile.")
+        result["generated_profile"] = profile
+        result.update(_tokens("generation"))
+    except Exception as e:
+        result["error"] = f"Generation failed: {type(e).__name__}: {e}"
+    result["generation_latency_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def generate_cases(cases: list[dict], model_id: str, concurrency: int = 4) -> list[dict]:
+    """
+    Generates the profiles of cases (`id` and `description`) without judging
+    them, at most `concurrency` at once.
+
+    Returns:
+        The results of `generate_case`, in the order of `cases`.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(generate_case, cases, [model_id] * len(cases)))
+
+
+def score_cases(results: list[dict], cases: list[dict]) -> np.ndarray:
+    """
+    Adds the local metrics of generated profiles to their results, scoring
+    them all in one vectorized call.
+
+    Returns:
+        The local scores, in the order of `results`.
+    """
+    metrics = score_profiles([result["generated_profile"] for result in results],
+                             [case["golden_profile"] for case in cases])
+    for row, result in enumerate(results):
+        for name in METRIC_COLUMNS:
+            value = float(metrics[name][row])
+            result[name] = None if math.isnan(value) else round(value, 4)
+    return metrics["local_score"]
+
+
+def judge_case(result: dict, case: dict, judge_model_id: str) -> dict:
+    """Scores a generated profile against the golden one with the LLM judge."""
+    start = time.perf_counter()
+    try:
+        evaluation = evaluate_profile_with_llm(
+            case["description"], result["generated_profile"], case["golden_profile"], judge_model_id
+        )
+        if evaluation is None:
+            raise ValueError("The judge returned no parsable evaluation.")
+        result["score"] = evaluation.score
+        result["score_source"] = "judge"
+        result["rationale"] = evaluation.rationale
+        result.update(_tokens("judge"))
+    except Exception as e:
+        result["error"] = f"Judge failed: {type(e).__name__}: {e}"
+    result["judge_latency_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_evaluation(cases: list[dict], model_id: str, judge_model_id: str,
+                   concurrency: int = 4,
+                   band: Optional[tuple[float, float]] = UNCERTAIN_BAND) -> Iterator[dict]:
+    """
+    Evaluates the cases, yielding each result as soon as it is scored.
+
+    At most `concurrency` generations and `concurrency` judge calls are in
+    flight at once. The profiles generated since the last check are scored
+    together as soon as they are done, rather than the whole dataset once
+    every generation finished, so that judging overlaps with generation.
+
+    Args:
+        band: The (low, high) local scores between which a case is escalated
+            to the judge. None sends every case to the judge.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    by_id = {case["id"]: case for case in cases}
+    if len(by_id) != len(cases):
+        raise ValueError("case ids must be unique")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as generation_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as judge_pool:
+        pending = {}
+        generations_in_flight = 0
+
+        def collect():
+            nonlocal generations_in_flight
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            generated = []
+            for future in done:
+                stage = pending.pop(future)
+                result = future.result()
+                if stage == "generation":
+                    generations_in_flight -= 1
+                    if "error" not in result:
+                        generated.append(result)
+                        continue
+                yield result
+            if not generated:
+                return
+            cases_generated = [by_id[result["id"]] for result in generated]
+            local_scores = score_cases(generated, cases_generated)
+            escalated = np.ones(len(generated), dtype=bool) if band is None else needs_judge(local_scores, band)
+            for result, case, escalate, score in zip(generated, cases_generated, escalated, estimated_score(local_scores)):
+                if escalate:
+                    pending[judge_pool.submit(judge_case, result, case, judge_model_id)] = "judge"
+                    continue
+                result["score"] = int(score)
+                result["score_source"] = "local"
+                yield result
+
+        for case in cases:
+            pending[generation_pool.submit(generate_case, case, model_id)] = "generation"
+            generations_in_flight += 1
+            while generations_in_flight >= concurrency or len(pending) >= 2 * concurrency:
+                yield from collect()
+        while pending:
+            yield from collect()
+
+
+def _score_statistics(scores: list[int], source: str) -> dict:
+    return {
+        f"mean_{source}_score": round(statistics.mean(scores), 3) if scores else None,
+        f"median_{source}_score": statistics.median(scores) if scores else None,
+        f"{source}_score_distribution": {str(score): scores.count(score) for score in range(1, 6)},
+    }
+
+
+def summarize(results: list[dict], elapsed_s: Optional[float] = None) -> dict:
+    """
+    Aggregates the per-case results: score statistics, latencies and token totals.
+
+    The scores given by the judge and the ones estimated from the local
+    metrics are counted and summarized separately.
+    """
+    judge_scores = [r["score"] for r in results if r.get("score_source") == "judge"]
+    local_scores = [r["score"] for r in results if r.get("score_source") == "local"]
+    generation_latencies = [r["generation_latency_s"] for r in results if "generated_profile" in r]
+    judge_latencies = [r["judge_latency_s"] for r in results if "judge_latency_s" in r]
+    summary = {
+        "cases": len(results),
+        "judged": len(judge_scores),
+        "locally_scored": len(local_scores),
+        "failed": sum(1 for r in results if "error" in r),
+        "judge_calls": sum(1 for r in results if "judge_latency_s" in r),
+        **_score_statistics(judge_scores, "judge"),
+        **_score_statistics(local_scores, "local"),
+        "p50_generation_latency_s": percentile(generation_latencies, 50),
+        "p95_generation_latency_s": percentile(generation_latencies, 95),
+        "p50_judge_latency_s": percentile(judge_latencies, 50),
+        "p95_judge_latency_s": percentile(judge_latencies, 95),
+    }
+    for column in TABLE_COLUMNS:
+        if column.endswith("_tokens"):
+            summary[column] = sum(r.get(column) or 0 for r in results)
+    if elapsed_s is not None:
+        summary["elapsed_s"] = round(elapsed_s, 3)
+        summary["cases_per_s"] = round(len(results) / elapsed_s, 3) if elapsed_s > 0 else 0.0
+    return summary
+
+
+def write_results(results: list[dict], summary: dict, output_dir: str):
+    """
+    Writes `results.csv` (the per-case table), `results.jsonl` (the table plus
+    the generated profiles) and `summary.json` to `output_dir`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "results.csv"), 'w', encoding='utf-8', newline='') as f_csv:
+        writer = csv.DictWriter(f_csv, fieldnames=TABLE_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    with open(os.path.join(output_dir, "results.jsonl"), 'w', encoding='utf-8') as f_jsonl:
+        for result in results:
+            record = {column: result.get(column) for column in TABLE_COLUMNS}
+            profile = result.get("generated_profile")
+            record["generated_profile"] = profile.model_dump() if profile is not None else None
+            f_jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with open(os.path.join(output_dir, "summary.json"), 'w', encoding='utf-8') as f_summary:
+        json.dump(summary, f_summary, indent=2)
+
+
+def evaluate_dataset(dataset_file: str, output_dir: str, model_id: str, judge_model_id: str,
+                     concurrency: int = 4,
+                     band: Optional[tuple[float, float]] = UNCERTAIN_BAND) -> dict:
+    """
+    Evaluates every golden case of a dataset and writes the results table.
+
+    Cases whose local score is outside `band` are not sent to the judge
+    (None judges every case).
+
+    Returns:
+        The aggregate statistics, also written to `summary.json`.
+    """
+    cases = load_cases(dataset_file)
+    order = {case["id"]: position for position, case in enumerate(cases)}
+    start = time.perf_counter()
+    results = []
+    for result in run_evaluation(cases, model_id, judge_model_id, concurrency, band):
+        status = f"score {result['score']} ({result['score_source']})" if "score" in result else result["error"]
+        print(f"[{len(results) + 1}/{len(cases)}] case {result['id']}: {status}")
+        results.append(result)
+    results.sort(key=lambda r: order[r["id"]])
+
+    summary = summarize(results, time.perf_counter() - start)
+    write_results(results, summary, output_dir)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Evaluate the generated profiles against golden cases.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="JSONL file of golden cases.")
+    parser.add_argument("--output_dir", default="evaluation_results", help="Directory to write the results table and summary to.")
+    parser.add_argument("--model_id", default="gemini-2.5-flash", help="The model generating the profiles.")
+    parser.add_argument("--judge_model_id", default="gemini-2.5-pro", help="The model judging the profiles.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of generations (and of judge calls) in flight at once.")
+    parser.add_argument("--band", type=float, nargs=2, default=list(UNCERTAIN_BAND), metavar=("LOW", "HIGH"),
+                        help="Local scores between LOW and HIGH are escalated to the judge.")
+    parser.add_argument("--judge-all", action="store_true", help="Send every case to the judge, whatever its local score.")
+    args = parser.parse_args()
+
+    band = None if args.judge_all else tuple(args.band)
+    evaluate_dataset(args.dataset, args.output_dir, args.model_id, args.judge_model_id, args.concurrency, band)
+
+
+if __name__ == "__main__":
+    main()
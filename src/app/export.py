@@ -0,0 +1,256 @@
+"""
+Columnar export of batch results to Parquet, for analytics over large runs.
+
+Each profile is flattened into three tables:
+- `profiles`: one row per profile, with the six RIASEC scores as numeric columns;
+- `diagnoses`: one row per `DiagnosisEntry`;
+- `specifiers`: one row per `DiagnosisSpecifier`.
+The child tables reference their profile by `record_index` (and their
+diagnosis by `diagnosis_index`).
+
+Every row group is written as a new part file of each table directory
+(`<dir>/profiles/part-00000.parquet`, ...), finalized as soon as it is
+written, so a resumed batch adds to the tables of the previous runs and an
+interrupted one only loses its buffered rows. The directories can be read as
+datasets, e.g. `pandas.read_parquet("<dir>/profiles")`. pyarrow is only
+imported once an export starts.
+
+Usage:
+    python -m app.export profiles.jsonl parquet/
+"""
+
+import argparse
+import functools
+import json
+import os
+
+TABLES = ("profiles", "diagnoses", "specifiers")
+
+RIASEC_COLUMNS = (
+    "riasec_realistic", "riasec_investigative", "riasec_artistic",
+    "riasec_social", "riasec_enterprising", "riasec_conventional",
+)
+
+DEFAULT_ROW_GROUP_SIZE = 10_000
+
+
+@functools.cache
+def table_schemas() -> dict:
+    """The Arrow schema of each table, built once at first use."""
+    import pyarrow as pa
+
+    record = [("record_index", pa.int64()), ("record_id", pa.string())]
+    return {
+        "profiles": pa.schema([
+            *record,
+            ("character_name", pa.string()),
+            ("profile_date", pa.string()),
+            ("overall_assessment_summary", pa.string()),
+            *[(column, pa.int32()) for column in RIASEC_COLUMNS],
+            ("top_themes", pa.list_(pa.string())),
+            ("holland_summary", pa.string()),
+            ("diagnosis_count", pa.int32()),
+        ]),
+        "diagnoses": pa.schema([
+            *record,
+            ("diagnosis_index", pa.int32()),
+            ("disorder_name", pa.string()),
+            ("dsm_category", pa.string()),
+            ("dsm_code", pa.string()),
+            ("criteria_met", pa.list_(pa.string())),
+            ("criteria_count", pa.int32()),
+            ("functional_impairment", pa.string()),
+            ("diagnostic_note", pa.string()),
+        ]),
+        "specifiers": pa.schema([
+            *record,
+            ("diagnosis_index", pa.int32()),
+            ("specifier_type", pa.string()),
+            ("value", pa.string()),
+        ]),
+    }
+
+
+def flatten_profile(record_index: int, record_id: str, profile: dict) -> dict[str, list[dict]]:
+    """
+    Flattens a profile (as dumped by `CharacterProfile.model_dump`) into the
+    rows of each table.
+    """
+    from app.scoring import theme_index
+
+    key = {"record_index": record_index, "record_id": record_id}
+    assessment = profile.get("holland_code_assessment") or {}
+    scores = dict.fromkeys(RIASEC_COLUMNS)
+    for score in assessment.get("riasec_scores", []):
+        index = theme_index(score["theme"])
+        if index is not None:
+            scores[RIASEC_COLUMNS[index]] = score["score"]
+
+    diagnoses = profile.get("diagnoses", [])
+    rows = {
+        "profiles": [{
+            **key,
+            "character_name": profile["character_name"],
+            "profile_date": profile["profile_date"],
+            "overall_assessment_summary": profile.get("overall_assessment_summary"),
+            **scores,
+            "top_themes": assessment.get("top_themes"),
+            "holland_summary": assessment.get("summary"),
+            "diagnosis_count": len(diagnoses),
+        }],
+        "diagnoses": [],
+        "specifiers": [],
+    }
+    for diagnosis_index, diagnosis in enumerate(diagnoses):
+        rows["diagnoses"].append({
+            **key,
+            "diagnosis_index": diagnosis_index,
+            "disorder_name": diagnosis["disorder_name"],
+            "dsm_category": diagnosis["dsm_category"],
+            "dsm_code": diagnosis.get("dsm_code"),
+            "criteria_met": diagnosis.get("criteria_met", []),
+            "criteria_count": len(diagnosis.get("criteria_met", [])),
+            "functional_impairment": diagnosis.get("functional_impairment"),
+            "diagnostic_note": diagnosis.get("diagnostic_note"),
+        })
+        for specifier in diagnosis.get("specifiers", []):
+            rows["specifiers"].append({**key, "diagnosis_index": diagnosis_index, **specifier})
+    return rows
+
+
+# The child tables are finalized before `profiles`, so a part of `profiles`
+# implies the parts of the same number of the other tables.
+_WRITE_ORDER = ("specifiers", "diagnoses", "profiles")
+
+
+def _parts(table_dir: str, suffix: str = ".parquet") -> dict[int, str]:
+    """Returns the paths of the part files of a table directory, by part number."""
+    if not os.path.isdir(table_dir):
+        return {}
+    return {int(name[len("part-"):-len(suffix)]): os.path.join(table_dir, name)
+            for name in os.listdir(table_dir) if name.startswith("part-") and name.endswith(suffix)}
+
+
+def _next_part(output_dir: str) -> int:
+    """Returns the first part number free in every table, temporary parts included."""
+    numbers = [number for table in TABLES for suffix in (".parquet", ".parquet.tmp")
+               for number in _parts(os.path.join(output_dir, table), suffix)]
+    return max(numbers, default=-1) + 1
+
+
+def recover_parts(output_dir: str) -> set[int]:
+    """
+    Cleans up the part files of an interrupted export and returns the
+    `record_index` of every profile already exported.
+
+    Temporary part files are removed, and so are the parts of the child
+    tables whose `profiles` part was never finalized, so that their records
+    can be exported again without duplicate rows.
+    """
+    import pyarrow.parquet as pq
+
+    profile_parts = _parts(os.path.join(output_dir, "profiles"))
+    for table in TABLES:
+        table_dir = os.path.join(output_dir, table)
+        for path in _parts(table_dir, ".parquet.tmp").values():
+            os.remove(path)
+        for number, path in _parts(table_dir).items():
+            if number not in profile_parts:
+                os.remove(path)
+    exported = set()
+    for path in profile_parts.values():
+        exported.update(pq.read_table(path, columns=["record_index"]).column("record_index").to_pylist())
+    return exported
+
+
+class ParquetExporter:
+    """
+    Writes batch results to the Parquet tables incrementally.
+
+    Rows are buffered and written every `row_group_size` profiles as one
+    part file of each table, holding a single row group. Each part is written
+    under a temporary name and renamed once complete, so a reader never sees
+    a file without its footer. The rows buffered when a run crashes are lost;
+    `recover_parts` tells which records the tables already hold, so that
+    the others can be exported again from the JSONL output.
+    """
+
+    def __init__(self, output_dir: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 compression: str = "zstd"):
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be at least 1")
+        self.output_dir = output_dir
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows_written = dict.fromkeys(TABLES, 0)
+        self._buffers: dict[str, list[dict]] = {table: [] for table in TABLES}
+        self._buffered_profiles = 0
+        self.parts_written = 0
+
+    def add(self, result: dict):
+        """Adds a batch result; results without a profile (errors) are skipped."""
+        profile = result.get("profile")
+        if profile is None:
+            return
+        for table, rows in flatten_profile(result["index"], result["id"], profile).items():
+            self._buffers[table].extend(rows)
+        self._buffered_profiles += 1
+        if self._buffered_profiles >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows as a new part file of each table."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schemas = table_schemas()
+        part = _next_part(self.output_dir)
+        for table in _WRITE_ORDER:
+            rows = self._buffers[table]
+            table_dir = os.path.join(self.output_dir, table)
+            os.makedirs(table_dir, exist_ok=True)
+            path = os.path.join(table_dir, f"part-{part:05d}.parquet")
+            pq.write_table(pa.Table.from_pylist(rows, schema=schemas[table]), path + ".tmp",
+                           compression=self.compression)
+            os.replace(path + ".tmp", path)
+            self.rows_written[table] += len(rows)
+            rows.clear()
+        self._buffered_profiles = 0
+        self.parts_written += 1
+
+    def close(self):
+        """Writes the remaining rows; an export without any profile still writes empty tables."""
+        if self._buffered_profiles or not self.parts_written:
+            self.flush()
+
+    def __enter__(self) -> "ParquetExporter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_jsonl(input_file: str, output_dir: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> dict:
+    """
+    Exports the profiles of a batch output file (JSONL) to the Parquet tables.
+
+    Returns:
+        The number of rows written to each table.
+    """
+    with ParquetExporter(output_dir, row_group_size) as exporter, \
+            open(input_file, 'r', encoding='utf-8') as f_in:
+        for line in f_in:
+            if line.strip():
+                exporter.add(json.loads(line))
+    return exporter.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the profiles of a batch output file to Parquet tables.")
+    parser.add_argument("input_file", help="Path to the JSONL batch output file.")
+    parser.add_argument("output_dir", help="Directory to write the profiles, diagnoses and specifiers tables to.")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help="Number of profiles per row group.")
+    args = parser.parse_args()
+
+    rows = export_jsonl(args.input_file, args.output_dir, args.row_group_size)
+    print(", ".join(f"{count} {table} rows" for table, count in rows.items()))
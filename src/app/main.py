@@ -1,51 +1,143 @@
 import streamlit as st
 import os
-from google import genai
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from app.cache import LRUCache, normalize_text
 from app.models import CharacterProfile
-from app.services import generate_character_profile, generate_tcc_program
-from app.dashboard import display_profile
+from app.repair import IncompleteProfileError
+from app.services import generate_character_profile_stream, generate_tcc_program
+from app.dashboard import display_profile, display_profile_stream, display_similar_profiles, display_tcc_program
 
 from dotenv import load_dotenv
 
 load_dotenv()
 st.set_page_config(layout="wide")
 
+MODEL_ID = "gemini-2.5-pro"
+
+
+@st.cache_resource
+def get_background_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by all sessions for background model calls."""
+    return ThreadPoolExecutor(max_workers=8)
+
+
+@st.cache_resource
+def get_result_cache() -> LRUCache:
+    """Bounded cache of profiles and TCC programs shared by all sessions."""
+    return LRUCache(maxsize=int(os.getenv("PSY_DSM_RESULT_CACHE_SIZE", 128)))
+
+
+@st.cache_resource(ttl=300)
+def get_similarity_index():
+    """
+    The similar-profile index of `PSY_DSM_INDEX_DIR` (built by the batch
+    mode), reloaded every five minutes, or None when it is not configured.
+    """
+    index_dir = os.getenv("PSY_DSM_INDEX_DIR")
+    if not index_dir or not os.path.isdir(index_dir):
+        return None
+    from app.similarity import RiasecIndex
+
+    return RiasecIndex(index_dir, read_only=True)
+
+
+def result_key(description: str, model_id: str) -> str:
+    """Cache key of a description: identical up to whitespace means identical results."""
+    payload = f"{model_id}\n{normalize_text(description)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def generate_and_cache_tcc_program(profile: CharacterProfile, key: str, use_cache: bool = True):
+    """Generates the TCC program and stores it next to its profile in the shared cache."""
+    tcc_program = generate_tcc_program(profile, MODEL_ID, use_cache=use_cache)
+    entry = get_result_cache().get(key)
+    if tcc_program is not None and entry is not None and entry["profile"] == profile:
+        get_result_cache().set(key, {**entry, "tcc_program": tcc_program})
+    return tcc_program
+
+
 st.title("DSM-5 Character Profile Generator")
 
 description = st.text_area("Character Description", height=200, placeholder="Enter a detailed description of the character you want to analyze.")
+col_generate, col_refresh = st.columns([1, 5])
+with col_generate:
+    generate = st.button("Generate Profile", type="primary")
+with col_refresh:
+    force_refresh = st.button("Force refresh", help="Ignore cached results and call the model again.")
+cache_notice = st.empty()
+profile_area = st.empty()
 
-if st.button("Generate Profile", type="primary"):
+if generate or force_refresh:
     if not description:
         st.error("Please enter a character description.")
     else:
-        with st.spinner("Generating profile... This may take a moment."):
-            # try:
-                profile = generate_character_profile(description, "gemini-2.5-pro")
+        key = result_key(description, MODEL_ID)
+        entry = None if force_refresh else get_result_cache().get(key)
+        st.session_state['result_key'] = key
+        st.session_state['tcc_error'] = None
+        st.session_state['tcc_future'] = None
+        if entry is not None:
+            st.session_state['profile'] = entry["profile"]
+            st.session_state['tcc_program'] = entry.get("tcc_program")
+            st.session_state['from_cache'] = True
+        else:
+            with st.spinner("Generating profile... This may take a moment."):
+                try:
+                    profile = display_profile_stream(
+                        generate_character_profile_stream(description, MODEL_ID, use_cache=not force_refresh),
+                        profile_area,
+                    )
+                except IncompleteProfileError:
+                    # The partial profile shown while streaming is not kept.
+                    profile_area.empty()
+                    profile = None
+            st.session_state['from_cache'] = False
+            if profile is None:
+                st.session_state.pop('profile', None)
+                st.error("The model returned no profile. Please try again.")
+            else:
+                get_result_cache().set(key, {"profile": profile})
                 st.session_state['profile'] = profile
                 st.session_state['tcc_program'] = None
+        if st.session_state.get('profile') is not None and st.session_state.get('tcc_program') is None:
+            # The TCC program is generated in the background while the profile is shown.
+            st.session_state['tcc_future'] = get_background_executor().submit(
+                generate_and_cache_tcc_program, st.session_state['profile'], key, not force_refresh
+            )
 
 
 
 if 'profile' in st.session_state:
-    display_profile(st.session_state['profile'])
-    if st.session_state['tcc_program'] == None:
-        st.session_state['tcc_program'] = generate_tcc_program(st.session_state['profile'], "gemini-2.5-pro")
-
-if 'tcc_program' in st.session_state:
-    st.header("Generated TCC Program")
-    tcc_program = st.session_state['tcc_program']
-    
-    st.subheader(tcc_program.title)
-    st.write(f"**Global Objective:** {tcc_program.global_objective}")
-    
-    for i, module in enumerate(tcc_program.modules):
-        st.markdown(f"### Module {i+1}: {module.title}")
-        st.write(f"**Objective:** {module.objective}")
-        st.write(f"**Session Range:** {module.session_range}")
-
-        st.markdown("#### Activities:")
-        for activity in module.activities:
-            st.markdown(f"**- {activity.title}**")
-            for detail in activity.details:
-                st.markdown(f"  - {detail}")
-        st.markdown("---")
\ No newline at end of file
+    if st.session_state.get('from_cache'):
+        cache_notice.info("Served from cache. Use \"Force refresh\" to generate a new profile.")
+    with profile_area.container():
+        display_profile(st.session_state['profile'])
+    similarity_index = get_similarity_index()
+    if similarity_index is not None and len(similarity_index):
+        display_similar_profiles(st.session_state['profile'], similarity_index)
+
+
+def tcc_program_section():
+    """Renders the TCC program once its background generation has finished."""
+    future = st.session_state.get('tcc_future')
+    if st.session_state.get('tcc_program') is None and future is not None:
+        if not future.done():
+            st.info("Generating TCC program in the background...")
+            return
+        st.session_state['tcc_future'] = None
+        try:
+            st.session_state['tcc_program'] = future.result()
+        except Exception as e:
+            st.session_state['tcc_error'] = f"TCC program generation failed: {e}"
+        # A full rerun stops the polling below now that the generation has finished.
+        st.rerun()
+
+    if st.session_state.get('tcc_error'):
+        st.error(st.session_state['tcc_error'])
+    elif st.session_state.get('tcc_program') is not None:
+        display_tcc_program(st.session_state['tcc_program'])
+
+
+tcc_pending = st.session_state.get('tcc_future') is not None
+st.fragment(run_every=2 if tcc_pending else None)(tcc_program_section)()
@@ -0,0 +1,259 @@
+"""
+Latency and token-usage metrics of the model calls, exported in the
+Prometheus text format.
+
+Every call of `services.py` records its total duration and outcome, timing
+spans of its stages (request build, cache lookup, rate-limit wait, model
+call, response parsing) and the token counts of `usage_metadata`, labeled by
+function and model, as well as the outcome of the cascade generations
+(accepted from the fast model or escalated). Metrics are off by default:
+`PSY_DSM_METRICS=1` turns them on, and `PSY_DSM_METRICS_PORT` also serves
+them over HTTP at `/metrics`.
+When disabled, every recording function is a no-op.
+"""
+
+import bisect
+import contextlib
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+# Seconds; spans go from sub-millisecond parsing to minutes-long thinking calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple[str, ...], amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: tuple[str, ...]) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Bucketed observations (with their sum and count) per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...],
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        with self._lock:
+            entry = self._values.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, labels: tuple[str, ...]) -> int:
+        with self._lock:
+            entry = self._values.get(labels)
+            return entry[2] if entry else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """The metrics of the model calls. A disabled registry records nothing."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.calls = Counter(
+            "psy_dsm_calls_total", "Model calls by outcome (ok, cache_hit, error).",
+            ("function", "model", "outcome"))
+        self.call_seconds = Histogram(
+            "psy_dsm_call_seconds", "Total duration of the model calls, retries included.",
+            ("function", "model", "outcome"))
+        self.span_seconds = Histogram(
+            "psy_dsm_span_seconds", "Duration of the stages of the model calls.",
+            ("function", "model", "span"))
+        self.tokens = Counter(
+            "psy_dsm_tokens_total", "Tokens reported in usage_metadata, by kind.",
+            ("function", "model", "kind"))
+        self.cascade = Counter(
+            "psy_dsm_cascade_total", "Cascade generations, accepted from the fast model or escalated.",
+            ("fast_model", "strong_model", "outcome"))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.calls, self.call_seconds, self.span_seconds, self.tokens, self.cascade):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _Call:
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextlib.contextmanager
+def call(function: str, model: str) -> Iterator[_Call]:
+    """
+    Records the duration and outcome of a model call.
+
+    The outcome is "ok" unless the block sets `outcome` (e.g. "cache_hit")
+    or raises ("error").
+    """
+    registry = get_registry()
+    if not registry.enabled:
+        yield _Call()
+        return
+    current = _Call()
+    start = time.perf_counter()
+    try:
+        yield current
+    except GeneratorExit:
+        # A streaming call whose consumer stopped early did not fail.
+        raise
+    except BaseException:
+        current.outcome = "error"
+        raise
+    finally:
+        labels = (function, model, current.outcome)
+        registry.calls.inc(labels)
+        registry.call_seconds.observe(labels, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def span(name: str, function: str, model: str) -> Iterator[None]:
+    """Records the duration of one stage of a model call."""
+    registry = get_registry()
+    if not registry.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.span_seconds.observe((function, model, name), time.perf_counter() - start)
+
+
+def record_tokens(function: str, model: str, counts: dict):
+    """Adds the token counts of a response (e.g. {"prompt_tokens": 1200}) to the totals."""
+    registry = get_registry()
+    if not registry.enabled:
+        return
+    for kind, count in counts.items():
+        registry.tokens.inc((function, model, kind.removesuffix("_tokens")), count)
+
+
+def record_cascade(fast_model: str, strong_model: str, escalated: bool):
+    """Counts a cascade generation, as accepted from the fast model or escalated to the strong one."""
+    registry = get_registry()
+    if registry.enabled:
+        registry.cascade.inc((fast_model, strong_model, "escalated" if escalated else "accepted"))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`, or 0.0 for an empty list (used by the run summaries)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_registry().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves the metrics at `http://<host>:<port>/metrics` from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    """
+    Returns the process-wide registry, configured from the environment.
+
+    The metrics server is started along with the registry when
+    `PSY_DSM_METRICS_PORT` is set.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                enabled = os.getenv("PSY_DSM_METRICS", "0") == "1"
+                port = os.getenv("PSY_DSM_METRICS_PORT")
+                if enabled and port:
+                    start_metrics_server(int(port))
+                _registry = Registry(enabled)
+    return _registry
+
+
+def set_registry(registry: Optional[Registry]):
+    """Replaces the process-wide registry (None rebuilds it from the environment)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
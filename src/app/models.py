@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, RootModel
 
 class DiagnosisSpecifier(BaseModel):
     specifier_type: str
@@ -33,6 +33,22 @@ class CharacterProfile(BaseModel):
     character_id: Optional[str] = None
     diagnoses: List[DiagnosisEntry] = Field(default_factory=list)
 
+class CharacterProfileList(RootModel[List[CharacterProfile]]):
+    """The profiles of a packed request, one per description, identified by `character_id`."""
+
+class DiagnosisEntryList(RootModel[List[DiagnosisEntry]]):
+    """The diagnoses re-requested for a profile whose diagnoses were cut off."""
+
+class DiagnosticAssessment(BaseModel):
+    """The diagnostic part of a profile, generated on its own by the split strategy."""
+    character_name: str
+    clinical_summary: Optional[str] = Field(None, description="A brief summary of the clinical assessment")
+    diagnoses: List[DiagnosisEntry] = Field(default_factory=list)
+
+class AssessmentSummary(BaseModel):
+    """The overall summary of a profile generated by the split strategy."""
+    overall_assessment_summary: str = Field(description="A brief summary of the clinical and Holland Code assessments")
+
 
 
 class Activity(BaseModel):
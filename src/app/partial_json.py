@@ -0,0 +1,91 @@
+"""
+Parsing of incomplete JSON documents.
+
+Streamed and truncated model outputs stop in the middle of a JSON document.
+`parse_partial_json` cuts such a prefix back to the last complete value and
+closes the open objects and arrays, so the complete part can be used.
+"""
+
+import json
+from typing import Any, Optional
+
+
+def _strip_code_fence(text: str) -> str:
+    text = text.lstrip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    stripped = text.rstrip()
+    if stripped.endswith("```"):
+        text = stripped[:-3]
+    return text
+
+
+def _scan(text: str) -> tuple[list[str], list[tuple[int, tuple[str, ...]]]]:
+    """
+    Returns the closers of the containers still open at the end of `text`, and
+    the positions where the text can be cut after a complete value, each with
+    the closers needed at that point.
+    """
+    stack: list[str] = []
+    cuts: list[tuple[int, tuple[str, ...]]] = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cuts.append((i + 1, tuple(stack)))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((i + 1, tuple(stack)))
+        elif ch == ",":
+            cuts.append((i, tuple(stack)))
+    return stack, cuts
+
+
+def missing_closers(text: str) -> str:
+    """
+    Returns the brackets closing the objects and arrays still open at the end
+    of `text`, e.g. "]}" for a document cut right after its last value.
+    """
+    stack, _ = _scan(_strip_code_fence(text))
+    return "".join(reversed(stack))
+
+
+def parse_partial_json(text: str) -> tuple[Optional[Any], bool]:
+    """
+    Parses the complete part of a possibly truncated JSON document.
+
+    Strings, numbers and literals are only kept once they are complete; the
+    last object or array of the result may however still be missing members.
+
+    Returns:
+        A tuple of the parsed value (None if nothing could be parsed) and a
+        flag telling whether the whole document was complete.
+    """
+    text = _strip_code_fence(text)
+    try:
+        return json.loads(text), True
+    except json.JSONDecodeError:
+        pass
+
+    _, cuts = _scan(text)
+    for position, closers in reversed(cuts):
+        candidate = text[:position].rstrip()
+        if candidate.endswith(":"):
+            continue
+        try:
+            return json.loads(candidate + "".join(reversed(closers))), False
+        except json.JSONDecodeError:
+            continue
+    return None, False
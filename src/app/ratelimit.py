@@ -0,0 +1,224 @@
+"""
+Quota-aware rate limiting and retries for the Gemini calls.
+
+Every process on a host shares one token bucket per model, stored in a small
+SQLite file, so batch workers and the Streamlit app together stay under the
+requests-per-minute and tokens-per-minute quotas instead of bursting into
+429 errors. Calls that still hit 429/503 are retried with jittered
+exponential backoff.
+"""
+
+import asyncio
+import contextlib
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+RETRYABLE_STATUS_CODES = (429, 503)
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (about four characters per token)."""
+    return max(len(text) // 4, 1)
+
+
+class RateLimiter:
+    """
+    A cross-process token bucket limiting requests and tokens per minute.
+
+    Each bucket holds at most `burst_s` seconds worth of quota, which keeps the
+    sending rate smooth rather than spending a whole minute of quota at once.
+    A limit of None disables that dimension.
+    """
+
+    def __init__(self, path: str, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, burst_s: float = 10.0):
+        self.path = path
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.burst_s = burst_s
+        if not self.enabled:
+            return
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in self.limits.values())
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs a write transaction, committed on success and rolled back on error.
+
+        The rollback only runs once `BEGIN IMMEDIATE` succeeded, so a failure
+        to start the transaction (e.g. "database is locked") is raised as is.
+        """
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _capacity(self, kind: str) -> float:
+        per_second = self.limits[kind] / 60
+        # A single request larger than the burst must still be able to pass.
+        return max(per_second * self.burst_s, 1.0)
+
+    def _refill(self, conn: sqlite3.Connection, name: str, kind: str, now: float) -> float:
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        capacity = self._capacity(kind)
+        if row is None:
+            return capacity
+        level, updated = row
+        return min(capacity, level + (now - updated) * self.limits[kind] / 60)
+
+    def _store(self, conn: sqlite3.Connection, name: str, level: float, now: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+            (name, level, now),
+        )
+
+    def acquire(self, model_id: str, tokens: int = 0):
+        """Blocks until one request of `tokens` tokens may be sent to `model_id`."""
+        if not self.enabled:
+            return
+        while True:
+            wait_s = self._try_acquire(model_id, tokens)
+            if wait_s <= 0:
+                return
+            time.sleep(wait_s)
+
+    async def aacquire(self, model_id: str, tokens: int = 0):
+        """Async counterpart of `acquire`; waits without blocking the event loop."""
+        if not self.enabled:
+            return
+        while True:
+            # The SQLite transaction may wait on other processes, so it runs in a thread.
+            wait_s = await asyncio.to_thread(self._try_acquire, model_id, tokens)
+            if wait_s <= 0:
+                return
+            await asyncio.sleep(wait_s)
+
+    def _try_acquire(self, model_id: str, tokens: int) -> float:
+        """Takes the quota and returns 0, or returns the seconds to wait before retrying."""
+        costs = {"requests": 1, "tokens": min(tokens, self._capacity("tokens")) if self.limits["tokens"] else 0}
+        now = time.time()
+        with self._transaction() as conn:
+            levels = {}
+            wait_s = 0.0
+            for kind, limit in self.limits.items():
+                if limit is None:
+                    continue
+                levels[kind] = self._refill(conn, f"{model_id}:{kind}", kind, now)
+                missing = costs[kind] - levels[kind]
+                if missing > 0:
+                    wait_s = max(wait_s, missing * 60 / limit)
+            if wait_s == 0:
+                for kind, level in levels.items():
+                    self._store(conn, f"{model_id}:{kind}", level - costs[kind], now)
+        return wait_s
+
+    def record_usage(self, model_id: str, extra_tokens: int):
+        """
+        Adjusts the token bucket once the real token count of a request is known.
+
+        A positive `extra_tokens` (the request used more than estimated) puts the
+        bucket into debt, a negative one gives the over-estimate back.
+        """
+        if self.limits["tokens"] is None or extra_tokens == 0:
+            return
+        now = time.time()
+        name = f"{model_id}:tokens"
+        with self._transaction() as conn:
+            level = self._refill(conn, name, "tokens", now)
+            self._store(conn, name, min(level - extra_tokens, self._capacity("tokens")), now)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether `error` is a quota or overload error worth retrying."""
+    from google.genai import errors
+
+    return isinstance(error, errors.APIError) and error.code in RETRYABLE_STATUS_CODES
+
+
+def _backoff_delay(attempt: int, base_delay_s: float, max_delay_s: float) -> float:
+    """Full-jitter exponential backoff delay before retry number `attempt + 1`."""
+    return random.uniform(0, min(max_delay_s, base_delay_s * 2 ** attempt))
+
+
+def call_with_retry(call: Callable[[], T], max_attempts: int = 6,
+                    base_delay_s: float = 1.0, max_delay_s: float = 60.0) -> T:
+    """
+    Runs `call`, retrying 429/503 errors with full-jitter exponential backoff.
+
+    Any other error, or the last retryable one, is raised to the caller.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                raise
+            time.sleep(_backoff_delay(attempt, base_delay_s, max_delay_s))
+    raise RuntimeError("unreachable")
+
+
+async def acall_with_retry(call: Callable[[], Awaitable[T]], max_attempts: int = 6,
+                           base_delay_s: float = 1.0, max_delay_s: float = 60.0) -> T:
+    """Async counterpart of `call_with_retry`; `call` returns a new awaitable per attempt."""
+    for attempt in range(max_attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                raise
+            await asyncio.sleep(_backoff_delay(attempt, base_delay_s, max_delay_s))
+    raise RuntimeError("unreachable")
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide rate limiter, configured from the environment.
+
+    `GEMINI_RPM` and `GEMINI_TPM` set the per-model quotas (unset means
+    unlimited) and `GEMINI_RATE_LIMIT_DB` the SQLite file shared by the
+    processes of the host.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                rpm = os.getenv("GEMINI_RPM")
+                tpm = os.getenv("GEMINI_TPM")
+                _rate_limiter = RateLimiter(
+                    os.getenv("GEMINI_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "psy-dsm-ratelimit.sqlite")),
+                    requests_per_minute=float(rpm) if rpm else None,
+                    tokens_per_minute=float(tpm) if tpm else None,
+                )
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """Replaces the process-wide rate limiter (None rebuilds it from the environment)."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = limiter
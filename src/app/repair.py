@@ -0,0 +1,141 @@
+"""
+Local repair of truncated or malformed profile responses.
+
+When a response does not match the `CharacterProfile` schema (cut off by the
+output token cap, a stray trailing comma, text around the JSON), the SDK
+leaves `response.parsed` to None. `repair_profile` recovers the well-formed
+sections of the raw text instead: the JSON is cleaned up and closed with
+`parse_partial_json`, and each section is validated on its own. The sections
+that are missing or broken are returned by name, so that a caller can
+re-request just those (see `services.generate_character_profile`) and merge
+them back with `merge_section`.
+
+Section names:
+- `holland_code_assessment`: the Holland Code assessment;
+- `diagnoses[i]`: diagnosis `i`, malformed in a complete response;
+- `diagnoses[i:]`: the diagnoses from `i` on, lost to a truncation;
+- `overall_assessment_summary`: the summary, lost to a truncation.
+
+A truncation before the diagnoses loses every section after the cut at once
+(`truncated_before_diagnoses`): such a response is regenerated whole rather
+than repaired section by section.
+"""
+
+import re
+from datetime import date
+from typing import Any, Optional
+
+from .models import CharacterProfile, DiagnosisEntry, HollandCodeAssessment
+from .partial_json import missing_closers, parse_partial_json
+
+HOLLAND_SECTION = "holland_code_assessment"
+SUMMARY_SECTION = "overall_assessment_summary"
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class IncompleteProfileError(ValueError):
+    """The model's answer is not a complete profile and could not be repaired."""
+
+
+def _clean(text: str) -> str:
+    """Drops the text around the JSON object and the trailing commas models sometimes leave."""
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+
+def repair_profile(text: str) -> tuple[Optional[CharacterProfile], dict[str, Any]]:
+    """
+    Recovers the well-formed sections of a raw profile response.
+
+    Returns:
+        The profile made of the valid sections (None when even the character
+        name is missing), and the missing or broken sections by name, each
+        with its malformed data (None when it is missing altogether).
+    """
+    text = _clean(text)
+    data, complete = parse_partial_json(text)
+    if not complete:
+        # Only the closing brackets missing: nothing was lost.
+        closed, complete = parse_partial_json(text.rstrip() + missing_closers(text))
+        if complete:
+            data = closed
+    if not isinstance(data, dict) or not isinstance(data.get("character_name"), str):
+        return None, {}
+    last_key = None if complete else list(data)[-1]
+    broken = {}
+
+    holland = None
+    raw_holland = data.get(HOLLAND_SECTION)
+    if last_key != HOLLAND_SECTION and isinstance(raw_holland, dict):
+        try:
+            holland = HollandCodeAssessment.model_validate(raw_holland)
+        except ValueError:
+            pass
+    if holland is None:
+        # What a truncation left of the assessment is of no use to its repair.
+        broken[HOLLAND_SECTION] = raw_holland if last_key != HOLLAND_SECTION else None
+
+    diagnoses = []
+    raw_diagnoses = data.get("diagnoses")
+    if not isinstance(raw_diagnoses, list):
+        raw_diagnoses = []
+        if not complete:
+            broken["diagnoses[0:]"] = None
+    elif last_key == "diagnoses":
+        # The last diagnosis of a cut-off response may be missing members.
+        raw_diagnoses, cut = raw_diagnoses[:-1], len(raw_diagnoses) - 1
+        broken[f"diagnoses[{max(cut, 0)}:]"] = None
+    for index, entry in enumerate(raw_diagnoses):
+        try:
+            diagnoses.append(DiagnosisEntry.model_validate(entry))
+        except ValueError:
+            broken[f"diagnoses[{index}]"] = entry
+
+    summary = data.get(SUMMARY_SECTION)
+    if last_key == SUMMARY_SECTION or not (complete or isinstance(summary, str)):
+        # Cut off: the summary is written last, once the other sections are back.
+        summary = None
+        broken[SUMMARY_SECTION] = None
+    profile_date = data.get("profile_date")
+    profile = CharacterProfile(
+        character_name=data["character_name"],
+        profile_date=profile_date if isinstance(profile_date, str) else date.today().isoformat(),
+        overall_assessment_summary=summary if isinstance(summary, str) else None,
+        holland_code_assessment=holland,
+        diagnoses=diagnoses,
+    )
+    return profile, broken
+
+
+def truncated_before_diagnoses(broken: dict[str, Any]) -> bool:
+    """
+    Whether a truncation cut the response before its diagnoses: the
+    diagnoses array is lost along with the Holland Code assessment (and the
+    summary, when the cut came before it).
+    """
+    return "diagnoses[0:]" in broken and HOLLAND_SECTION in broken and broken[HOLLAND_SECTION] is None
+
+
+def merge_section(profile: CharacterProfile, section: str, value: Any) -> CharacterProfile:
+    """
+    Returns a copy of `profile` with a re-requested section merged in: a
+    `HollandCodeAssessment`, an `AssessmentSummary`, the `DiagnosisEntry` of
+    `diagnoses[i]`, or the list of `DiagnosisEntry` of `diagnoses[i:]`.
+    """
+    if section == HOLLAND_SECTION:
+        return profile.model_copy(update={"holland_code_assessment": value})
+    if section == SUMMARY_SECTION:
+        return profile.model_copy(update={SUMMARY_SECTION: value.overall_assessment_summary})
+    match = re.fullmatch(r"diagnoses\[(\d+)(:?)\]", section)
+    if match is None:
+        raise ValueError(f"unknown profile section {section!r}")
+    index = int(match.group(1))
+    diagnoses = list(profile.diagnoses)
+    if match.group(2):
+        diagnoses = diagnoses[:index] + list(value)
+    else:
+        diagnoses.insert(index, value)
+    return profile.model_copy(update={"diagnoses": diagnoses})
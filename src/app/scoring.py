@@ -0,0 +1,223 @@
+"""
+Deterministic local metrics comparing generated profiles to golden ones.
+
+Every metric is computed with NumPy over whole lists of profile pairs at once.
+The metrics are combined into a local score in [0, 1]; only the cases whose
+local score falls in an uncertain band need the (slow and costly) LLM judge,
+the others get a score estimated from the local one.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .dedup import normalize_description
+from .models import CharacterProfile, DiagnosisEntry
+from .validation import find_dsm_codes
+
+RIASEC_THEMES = "RIASEC"
+
+# The French and English names of each theme, normalized, plus its letter.
+THEME_NAMES = {
+    "R": ("realiste", "realistic"),
+    "I": ("investigateur", "investigatif", "investigative"),
+    "A": ("artistique", "artistic"),
+    "S": ("social", "sociale"),
+    "E": ("entreprenant", "enterprising"),
+    "C": ("conventionnel", "conventional"),
+}
+_THEME_BY_NAME = {name: RIASEC_THEMES.index(letter)
+                  for letter, names in THEME_NAMES.items() for name in (letter.lower(), *names)}
+
+# Local scores below the band are clearly poor, above it clearly good.
+UNCERTAIN_BAND = (0.4, 0.85)
+
+# Weights of the metrics in the local score; metrics that are undefined for a
+# case (e.g. no RIASEC scores on either side) are left out of its average.
+SCORE_WEIGHTS = {
+    "dsm_f1": 0.4,
+    "riasec_rank_similarity": 0.2,
+    "top_theme_overlap": 0.2,
+    "criteria_similarity": 0.2,
+}
+
+
+def theme_index(theme: str) -> Optional[int]:
+    """
+    Returns the position of a RIASEC theme in `RIASEC_THEMES`, or None for an unknown theme.
+
+    A theme is given by its French or English name or its letter, in any
+    case and with or without accents ("Réaliste", "Realistic", "R"); both
+    may be combined, as in "Réaliste (R)".
+    """
+    indexes = {_THEME_BY_NAME.get(word) for word in normalize_description(theme).split()}
+    if len(indexes) != 1:
+        return None
+    return indexes.pop()
+
+
+def riasec_matrix(profiles: Sequence[CharacterProfile]) -> np.ndarray:
+    """Returns the (n, 6) RIASEC score matrix of the profiles, NaN where a score is missing."""
+    matrix = np.full((len(profiles), len(RIASEC_THEMES)), np.nan)
+    for row, profile in enumerate(profiles):
+        assessment = profile.holland_code_assessment
+        if assessment is None:
+            continue
+        for score in assessment.riasec_scores:
+            index = theme_index(score.theme)
+            if index is not None:
+                matrix[row, index] = score.score
+    return matrix
+
+
+def top_theme_matrix(profiles: Sequence[CharacterProfile]) -> np.ndarray:
+    """Returns the (n, 6) boolean matrix of the top themes of the profiles."""
+    matrix = np.zeros((len(profiles), len(RIASEC_THEMES)), dtype=bool)
+    for row, profile in enumerate(profiles):
+        assessment = profile.holland_code_assessment
+        for theme in assessment.top_themes if assessment is not None else []:
+            index = theme_index(theme)
+            if index is not None:
+                matrix[row, index] = True
+    return matrix
+
+
+def _average_ranks(matrix: np.ndarray) -> np.ndarray:
+    """Row-wise ranks (1-based, ties get their average rank)."""
+    greater = (matrix[:, :, None] > matrix[:, None, :]).sum(axis=2)
+    equal = (matrix[:, :, None] == matrix[:, None, :]).sum(axis=2)
+    return greater + (equal - 1) / 2 + 1
+
+
+def riasec_metrics(generated: np.ndarray, golden: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Compares two (n, 6) RIASEC score matrices row by row.
+
+    Returns:
+        The cosine similarity, the L2 distance and the Spearman rank
+        correlation of each row pair; NaN where either row is incomplete.
+    """
+    valid = ~(np.isnan(generated).any(axis=1) | np.isnan(golden).any(axis=1))
+    gen = np.where(valid[:, None], generated, 0.0)
+    gold = np.where(valid[:, None], golden, 0.0)
+
+    norms = np.linalg.norm(gen, axis=1) * np.linalg.norm(gold, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = np.where(norms > 0, (gen * gold).sum(axis=1) / norms, np.nan)
+
+        gen_ranks = _average_ranks(gen)
+        gold_ranks = _average_ranks(gold)
+        gen_centered = gen_ranks - gen_ranks.mean(axis=1, keepdims=True)
+        gold_centered = gold_ranks - gold_ranks.mean(axis=1, keepdims=True)
+        spread = np.sqrt((gen_centered ** 2).sum(axis=1) * (gold_centered ** 2).sum(axis=1))
+        spearman = np.where(spread > 0, (gen_centered * gold_centered).sum(axis=1) / spread, np.nan)
+
+    return {
+        "riasec_cosine": np.where(valid, cosine, np.nan),
+        "riasec_l2": np.where(valid, np.linalg.norm(gen - gold, axis=1), np.nan),
+        "riasec_spearman": np.where(valid, spearman, np.nan),
+    }
+
+
+def diagnosis_codes(entry: DiagnosisEntry) -> set[str]:
+    """
+    Returns the codes of a diagnosis, or its normalized name when it has none.
+    """
+    codes = set(find_dsm_codes(entry.dsm_code or ""))
+    if codes:
+        return codes
+    return {"name:" + " ".join(entry.disorder_name.casefold().split())}
+
+
+def _code_matrices(generated: Sequence[CharacterProfile],
+                   golden: Sequence[CharacterProfile]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes the diagnoses of both sides as (n, vocabulary) boolean matrices.
+
+    Codes that appear together in one diagnosis (e.g. "301.83 (F60.3)") are
+    merged into one disorder, so a profile giving either code matches.
+    """
+    parent: dict[str, str] = {}
+
+    def find(code: str) -> str:
+        parent.setdefault(code, code)
+        while parent[code] != code:
+            parent[code] = parent[parent[code]]
+            code = parent[code]
+        return code
+
+    entries = [[diagnosis_codes(d) for d in profile.diagnoses] for profile in [*generated, *golden]]
+    for profile_codes in entries:
+        for codes in profile_codes:
+            first, *others = sorted(codes)
+            for code in others:
+                parent[find(code)] = find(first)
+
+    vocabulary: dict[str, int] = {}
+    rows = []
+    for profile_codes in entries:
+        rows.append({vocabulary.setdefault(find(min(codes)), len(vocabulary)) for codes in profile_codes})
+    matrix = np.zeros((len(rows), max(len(vocabulary), 1)), dtype=bool)
+    for row, columns in enumerate(rows):
+        matrix[row, list(columns)] = True
+    return matrix[:len(generated)], matrix[len(generated):]
+
+
+def dsm_metrics(generated: Sequence[CharacterProfile], golden: Sequence[CharacterProfile]) -> dict[str, np.ndarray]:
+    """
+    Returns the precision, recall and F1 of the diagnosed disorders of each pair.
+
+    Two profiles without any diagnosis agree perfectly.
+    """
+    gen, gold = _code_matrices(generated, golden)
+    true_positives = (gen & gold).sum(axis=1)
+    predicted = gen.sum(axis=1)
+    expected = gold.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(predicted > 0, true_positives / predicted, (expected == 0).astype(float))
+        recall = np.where(expected > 0, true_positives / expected, (predicted == 0).astype(float))
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {"dsm_precision": precision, "dsm_recall": recall, "dsm_f1": f1}
+
+
+def score_profiles(generated: Sequence[CharacterProfile], golden: Sequence[CharacterProfile]) -> dict[str, np.ndarray]:
+    """
+    Computes every local metric for each (generated, golden) pair.
+
+    Returns:
+        One array of length n per metric, plus the combined `local_score`.
+    """
+    if len(generated) != len(golden):
+        raise ValueError("generated and golden must have the same length")
+
+    metrics = riasec_metrics(riasec_matrix(generated), riasec_matrix(golden))
+    metrics.update(dsm_metrics(generated, golden))
+
+    gen_top, gold_top = top_theme_matrix(generated), top_theme_matrix(golden)
+    union = (gen_top | gold_top).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        metrics["top_theme_overlap"] = np.where(union > 0, (gen_top & gold_top).sum(axis=1) / union, np.nan)
+
+    gen_criteria = np.array([sum(len(d.criteria_met) for d in p.diagnoses) for p in generated], dtype=float)
+    gold_criteria = np.array([sum(len(d.criteria_met) for d in p.diagnoses) for p in golden], dtype=float)
+    metrics["criteria_delta"] = gen_criteria - gold_criteria
+    metrics["criteria_similarity"] = 1 - np.minimum(
+        np.abs(metrics["criteria_delta"]) / np.maximum(gold_criteria, 1), 1
+    )
+    metrics["riasec_rank_similarity"] = (1 + metrics["riasec_spearman"]) / 2
+
+    components = np.column_stack([metrics[name] for name in SCORE_WEIGHTS])
+    weights = np.where(np.isnan(components), 0.0, np.array(list(SCORE_WEIGHTS.values())))
+    metrics["local_score"] = (np.nan_to_num(components) * weights).sum(axis=1) / weights.sum(axis=1)
+    return metrics
+
+
+def needs_judge(local_scores: np.ndarray, band: tuple[float, float] = UNCERTAIN_BAND) -> np.ndarray:
+    """Whether each local score falls in the uncertain band and must be escalated to the judge."""
+    low, high = band
+    return (local_scores >= low) & (local_scores <= high)
+
+
+def estimated_score(local_scores: np.ndarray) -> np.ndarray:
+    """Maps local scores in [0, 1] to the judge's 1-5 scale."""
+    return np.clip(np.rint(1 + 4 * local_scores), 1, 5).astype(int)
@@ -1,11 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from datetime import date
+import functools
+import itertools
 import json
-from datetime import date
-import os
-from .models import CharacterProfile, TCCProgram, EvaluationResult
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional
+from .models import AssessmentSummary, CharacterProfile, CharacterProfileList, TCCProgram, EvaluationResult, HollandCodeAssessment, DiagnosisEntry, DiagnosisEntryList, DiagnosticAssessment
+from .partial_json import parse_partial_json
+from . import clients, metrics
+from .repair import (HOLLAND_SECTION, SUMMARY_SECTION, IncompleteProfileError, merge_section, repair_profile,
+                     truncated_before_diagnoses)
+from .cache import get_response_cache, make_key
+from .context_cache import get_context_cache
+from .ratelimit import acall_with_retry, call_with_retry, estimate_tokens, get_rate_limiter, is_retryable
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    # google.genai is slow to import; it is only loaded once a request is built.
+    from google import genai
+    from google.genai import types
 
-from google import genai
-from google.genai import types
+logger = logging.getLogger(__name__)
 
 
 SYSTEM_PROMPT = f"""
@@ -16,7 +37,7 @@ You are a clinical psychologist and career counselor. Your task is to analyze th
 2.  **ALL TEXT OUTPUT MUST BE IN FRENCH.** This includes all summaries, descriptions, and notes.
 3.  If no disorder is apparent, provide an empty `diagnoses` array and explain your reasoning in the `overall_assessment_summary`.
 4.  For any diagnosis, you **must** list the specific DSM-5 criteria met in the `criteria_met` field.
-5.  Set the `profile_date` to today's date: {date.today().isoformat()}.
+5.  Set the `profile_date` to today's date, given before the character description.
 6.  Your output **must** be a single, valid JSON object, without any markdown formatting or extra text.
 
 **EXAMPLE:**
@@ -64,6 +85,72 @@ Subject is a 52-year-old male architect. He reports chronic feelings of emptines
 ```
 """
 
+# The two focused prompts of the split strategy, each with its half of the example.
+SYSTEM_PROMPT_DIAGNOSES = f"""
+You are a clinical psychologist. Your task is to analyze the provided character description and identify the DSM-5 diagnoses that apply, in JSON format.
+
+**CRITICAL INSTRUCTIONS:**
+1.  **ALL TEXT OUTPUT MUST BE IN FRENCH.** This includes all summaries, descriptions, and notes.
+2.  If no disorder is apparent, provide an empty `diagnoses` array and explain your reasoning in the `clinical_summary`.
+3.  For any diagnosis, you **must** list the specific DSM-5 criteria met in the `criteria_met` field.
+4.  Do not assess the character's vocational interests: only the clinical assessment is requested.
+5.  Your output **must** be a single, valid JSON object, without any markdown formatting or extra text.
+
+**EXAMPLE OUTPUT** (for a 52-year-old architect with chronic emptiness, unstable relationships and fear of abandonment):
+```json
+{{
+    "character_name": "John Doe",
+    "clinical_summary": "Le sujet présente des symptômes clairs et persistants d'un trouble de la personnalité borderline (TPB), caractérisé par une instabilité marquée des relations interpersonnelles, de l'image de soi et des affects.",
+    "diagnoses": [
+        {{
+            "disorder_name": "Trouble de la personnalité borderline",
+            "dsm_category": "Troubles de la personnalité",
+            "dsm_code": "301.83 (F60.3)",
+            "criteria_met": [
+                "Efforts effrénés pour éviter les abandons réels ou imaginés.",
+                "Mode de relations interpersonnelles instables et intenses.",
+                "Perturbation de l'identité.",
+                "Idées suicidaires récurrentes, gestes ou menaces suicidaires.",
+                "Sentiments chroniques de vide."
+            ],
+            "functional_impairment": "L'instabilité émotionnelle et relationnelle nuit à ses relations professionnelles et personnelles.",
+            "diagnostic_note": "Les symptômes correspondent à au moins 5 des 9 critères du DSM-5 pour le trouble de la personnalité borderline."
+        }}
+    ]
+}}
+```
+"""
+
+SYSTEM_PROMPT_HOLLAND = f"""
+You are a career counselor. Your task is to assess the personality of the character described below with the Holland Code (RIASEC) model, in JSON format.
+
+**CRITICAL INSTRUCTIONS:**
+1.  **ALL TEXT OUTPUT MUST BE IN FRENCH.** This includes all summaries and descriptions.
+2.  Score each of the six RIASEC themes from 1 to 10, and give the top 2-3 themes that best fit the character.
+3.  Do not diagnose the character: only the Holland Code assessment is requested.
+4.  Your output **must** be a single, valid JSON object, without any markdown formatting or extra text.
+
+**EXAMPLE OUTPUT** (for a 52-year-old architect):
+```json
+{{
+    "riasec_scores": [
+        {{"theme": "Réaliste", "score": 6, "description": "Aime travailler avec des outils, des machines; peut être pratique, mécanique."}},
+        {{"theme": "Investigateur", "score": 8, "description": "Aime étudier et résoudre des problèmes mathématiques ou scientifiques; peut être précis, scientifique."}},
+        {{"theme": "Artistique", "score": 9, "description": "Aime faire du travail créatif, de l'art, du design; peut être imaginatif, original."}},
+        {{"theme": "Social", "score": 4, "description": "Aime aider les gens, enseigner; peut être coopératif, empathique."}},
+        {{"theme": "Entreprenant", "score": 5, "description": "Aime diriger, persuader; peut être énergique, ambitieux."}},
+        {{"theme": "Conventionnel", "score": 3, "description": "Aime travailler avec des données, avoir des routines; peut être ordonné, efficace."}}
+    ],
+    "top_themes": ["Artistique", "Investigateur"],
+    "summary": "Les thèmes dominants sont Artistique et Investigateur, indiquant une forte orientation vers la créativité et la résolution de problèmes complexes."
+}}
+```
+"""
+
+SYSTEM_PROMPT_SUMMARY = f"""
+You are a clinical psychologist and career counselor. Write the overall assessment summary of the profile below in two or three sentences, covering both the clinical assessment and the Holland Code assessment. **ALL TEXT OUTPUT MUST BE IN FRENCH.** Your output **must** be a single, valid JSON object, without any markdown formatting or extra text.
+"""
+
 SYSTEM_PROMPT_TCC = f"""
 You are a clinical psychologist and career counselor. 
 Your task is to analyze the clinical profile and create a TCC program adapted to manage disorder in JSON format.
@@ -93,17 +180,144 @@ Your output **must** be a single, valid JSON object matching the `EvaluationResu
 """
 
 def get_genai_client() -> genai.Client:
-        client = genai.Client(                                                                                                                                                            
-            vertexai=True,                                                                                                                                                    
-            project=os.getenv("GOOGLE_CLOUD_PROJECT"),                                                                                                                                                    
-            location=os.getenv("GOOGLE_CLOUD_LOCATION"),                                                                                                                                                     
-        ) 
-        return client
+    """
+    Returns the shared, pooled Gemini client for the configured project and location.
+    """
+    return clients.get_client()
 
-def generate_tcc_program(
-    profile: CharacterProfile, model_id: str) -> TCCProgram:
-    
-    generation_config = types.GenerateContentConfig(
+# Token counts of the last request sent from the current thread or task.
+_last_usage: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("last_usage", default=None)
+
+USAGE_FIELDS = {
+    "prompt_tokens": "prompt_token_count",
+    "cached_tokens": "cached_content_token_count",
+    "output_tokens": "candidates_token_count",
+    "thinking_tokens": "thoughts_token_count",
+    "total_tokens": "total_token_count",
+}
+
+def get_last_usage() -> Optional[dict]:
+    """
+    Returns the token counts of the last model call made from the current
+    thread (or asyncio task), or None if it was answered from the cache.
+    """
+    return _last_usage.get()
+
+def _usage_counts(model_id: str, response, function: str) -> dict:
+    """Records the token counts of a response as the last usage and in the metrics, and returns them."""
+    usage = getattr(response, "usage_metadata", None)
+    counts = {name: getattr(usage, field, None) for name, field in USAGE_FIELDS.items()}
+    counts = {name: count for name, count in counts.items() if isinstance(count, int)}
+    _last_usage.set(counts or None)
+    metrics.record_tokens(function, model_id, counts)
+    return counts
+
+def _record_usage(limiter, model_id: str, response, estimated_tokens: int, function: str):
+    counts = _usage_counts(model_id, response, function)
+    if "total_tokens" in counts:
+        limiter.record_usage(model_id, counts["total_tokens"] - estimated_tokens)
+
+async def _arecord_usage(limiter, model_id: str, response, estimated_tokens: int, function: str):
+    """Async counterpart of `_record_usage`; the rate limiter's SQLite transaction runs in a thread."""
+    counts = _usage_counts(model_id, response, function)
+    if "total_tokens" in counts:
+        await asyncio.to_thread(limiter.record_usage, model_id, counts["total_tokens"] - estimated_tokens)
+
+def _build_request(function: str, model_id: str, build: Callable[..., tuple], *args):
+    """Builds the (prompt, config) of a request, timed as its "build" span."""
+    with metrics.span("build", function, model_id):
+        return build(*args)
+
+def _with_cached_prefix(prompt: str, generation_config: types.GenerateContentConfig,
+                        cached_prefix: Optional[str], cached_name: Optional[str]):
+    """
+    Returns the contents and config to send when `cached_prefix` is held in the
+    cached content `cached_name`: only the rest of the prompt is sent.
+    """
+    if cached_name is None or not prompt.startswith(cached_prefix):
+        return prompt, generation_config
+    return prompt[len(cached_prefix):], generation_config.model_copy(update={"cached_content": cached_name})
+
+def _cached_content_rejected(error: Exception, cached_name: Optional[str]) -> bool:
+    """
+    Whether a request failed because its cached content is gone (expired or
+    deleted): a client error whose message refers to the cached content.
+    """
+    from google.genai import errors
+
+    if cached_name is None or not isinstance(error, errors.ClientError) or is_retryable(error):
+        return False
+    message = str(error).lower()
+    return cached_name.lower() in message or "cachedcontent" in message.replace(" ", "").replace("_", "")
+
+def _generate_content(model_id: str, prompt: str, generation_config: types.GenerateContentConfig,
+                      response_model: type[BaseModel], use_cache: bool = True,
+                      cached_prefix: Optional[str] = None,
+                      salvage: Optional[Callable[[str], Any]] = None,
+                      function: str = "generate_content"):
+    """
+    Sends a request to the model and returns the parsed response.
+
+    Responses are looked up in and stored to the shared response cache.
+    With `use_cache=False` the lookup is bypassed, but the fresh response
+    still replaces the cached one. Requests go through the shared rate
+    limiter and are retried on quota (429) and overload (503) errors.
+
+    When context caching is enabled, `cached_prefix` (a static start of the
+    prompt) is served from a Gemini cached content instead of being re-sent.
+    When the response does not match the schema, `salvage` may recover what it
+    can from the raw text; salvaged responses are not cached.
+
+    The call is recorded in the metrics under `function`.
+    """
+    with metrics.call(function, model_id) as call:
+        cache = get_response_cache()
+        _last_usage.set(None)
+        with metrics.span("cache", function, model_id):
+            key = make_key(model_id, prompt, generation_config, response_model)
+            cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            call.outcome = "cache_hit"
+            return response_model.model_validate_json(cached)
+
+        client = get_genai_client()
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(prompt)
+
+        context_cache = get_context_cache()
+
+        def send():
+            with metrics.span("rate_limit", function, model_id):
+                limiter.acquire(model_id, estimated_tokens)
+            with metrics.span("context_cache", function, model_id):
+                cached_name = context_cache.lookup(client, model_id, cached_prefix) if cached_prefix else None
+            contents, config = _with_cached_prefix(prompt, generation_config, cached_prefix, cached_name)
+            with metrics.span("model", function, model_id):
+                try:
+                    return client.models.generate_content(model=model_id, contents=contents, config=config)
+                except Exception as e:
+                    if not _cached_content_rejected(e, cached_name):
+                        raise
+                    context_cache.invalidate(model_id, cached_prefix)
+                    return client.models.generate_content(model=model_id, contents=prompt, config=generation_config)
+
+        response = call_with_retry(send)
+        _record_usage(limiter, model_id, response, estimated_tokens, function)
+
+        with metrics.span("parse", function, model_id):
+            parsed = response.parsed
+            if parsed is not None:
+                cache.set(key, parsed.model_dump_json())
+        # Outside of the parse span: salvaging may call the model again.
+        if parsed is None and salvage is not None and isinstance(getattr(response, "text", None), str):
+            return salvage(response.text)
+        return parsed
+
+@functools.cache
+def _tcc_generation_config() -> types.GenerateContentConfig:
+    from google.genai import types
+
+    return types.GenerateContentConfig(
         response_schema=TCCProgram,
         response_mime_type="application/json",
         temperature=0.0,
@@ -111,24 +325,318 @@ def generate_tcc_program(
         max_output_tokens=8192,
     )
 
+def _tcc_request(profile: CharacterProfile) -> tuple[str, types.GenerateContentConfig]:
+    generation_config = _tcc_generation_config()
     prompt = f"{SYSTEM_PROMPT_TCC}\n\nCharacter PROFILE:\n{profile.model_dump_json()}"
-    client = get_genai_client()
-    response = client.models.generate_content(
-        model=model_id,
-        contents=prompt,
-        config=generation_config,
+    return prompt, generation_config
+
+def generate_tcc_program(
+    profile: CharacterProfile, model_id: str, use_cache: bool = True) -> TCCProgram:
+    """
+    Generates a TCC program adapted to the given character profile.
+    """
+    prompt, generation_config = _build_request("generate_tcc_program", model_id, _tcc_request, profile)
+    return _generate_content(model_id, prompt, generation_config, TCCProgram, use_cache,
+                             function="generate_tcc_program")
+
+@functools.cache
+def _profile_generation_config() -> types.GenerateContentConfig:
+    """
+    The profile generation config, built once at first use.
+
+    The configs are shared by every request and must not be mutated.
+    """
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_schema=CharacterProfile,
+        response_mime_type="application/json",
+        temperature=0.0,
+        top_p=0,
+        top_k=1,
+        max_output_tokens=8192,
+        thinking_config=types.ThinkingConfig(thinking_budget=-1)
     )
 
-    return response.parsed
+def _profile_request(description: str) -> tuple[str, types.GenerateContentConfig]:
+    # The date follows the system prompt so the prefix stays the same every day.
+    prompt = f"{SYSTEM_PROMPT}\n\nToday's date: {date.today().isoformat()}\n\nCharacter Description:\n{description}"
+    return prompt, _profile_generation_config()
 
 def generate_character_profile(
-    description: str, model_id: str) -> CharacterProfile:
+    description: str, model_id: str, use_cache: bool = True) -> Optional[CharacterProfile]:
     """
     Generates a character profile using a generative model.
+
+    A truncated or malformed response is repaired rather than regenerated
+    (see `_repair_profile_response`); None is returned when it cannot be.
     """
+    prompt, generation_config = _build_request("generate_character_profile", model_id, _profile_request, description)
+    salvage = functools.partial(_repair_profile_response, description, model_id, use_cache)
+    return _generate_content(model_id, prompt, generation_config, CharacterProfile, use_cache, SYSTEM_PROMPT,
+                             salvage=salvage, function="generate_character_profile")
 
-    generation_config = types.GenerateContentConfig(
-        response_schema=CharacterProfile,
+# Breaks of a response repaired with targeted section requests; beyond, the
+# response is rejected.
+MAX_REPAIRED_SECTIONS = 1
+SECTION_MAX_OUTPUT_TOKENS = 4096
+# A profile cut off before its diagnoses is regenerated once, with room for the
+# answer that did not fit.
+REGENERATION_MAX_OUTPUT_TOKENS = 16384
+
+def _section_request(description: str, profile: CharacterProfile, section: str,
+                     fragment: Any) -> tuple[str, types.GenerateContentConfig, type[BaseModel]]:
+    """Builds the request of one missing or broken section of a profile, with its response model."""
+    from google.genai import types
+
+    if section == HOLLAND_SECTION:
+        response_model = HollandCodeAssessment
+        task = ("Write the `holland_code_assessment` of this profile: the six RIASEC scores (1 to 10), "
+                "the top 2-3 themes and a summary.")
+    elif section == SUMMARY_SECTION:
+        response_model = AssessmentSummary
+        task = ("Write the `overall_assessment_summary` of this profile: a brief summary of its clinical "
+                "and Holland Code assessments.")
+    elif section.endswith(":]"):
+        response_model = DiagnosisEntryList
+        task = (f"The `diagnoses` array of this profile was cut off after {len(profile.diagnoses)} diagnoses. "
+                "Return a JSON array of the remaining DSM-5 diagnoses, without repeating the ones already listed "
+                "(an empty array if there are none), with the criteria met for each diagnosis.")
+    else:
+        response_model = DiagnosisEntry
+        task = ("One diagnosis of this profile is malformed. Return it as a single, complete diagnosis object, "
+                f"with the criteria met:\n{json.dumps(fragment, ensure_ascii=False)}")
+    prompt = f"""You are a clinical psychologist and career counselor completing a clinical profile generated from the character description below. ALL TEXT OUTPUT MUST BE IN FRENCH. Your output **must** be valid JSON, without any markdown formatting or extra text.
+
+**TASK:** {task}
+
+Character Description:
+{description}
+
+Profile so far:
+{profile.model_dump_json(exclude_none=True)}"""
+    config = types.GenerateContentConfig(
+        response_schema=response_model,
+        response_mime_type="application/json",
+        temperature=0.0,
+        top_p=0,
+        top_k=1,
+        max_output_tokens=SECTION_MAX_OUTPUT_TOKENS,
+    )
+    return prompt, config, response_model
+
+def _add_usage(first: Optional[dict], second: Optional[dict]) -> Optional[dict]:
+    if first is None or second is None:
+        return first or second
+    return {name: first.get(name, 0) + second.get(name, 0) for name in first.keys() | second.keys()}
+
+def _repair_profile_response(description: str, model_id: str, use_cache: bool, text: str) -> Optional[CharacterProfile]:
+    """
+    Repairs a truncated or malformed profile response (see `app.repair`).
+
+    The well-formed sections are kept; a break confined to one section (the
+    Holland Code assessment, one diagnosis, the diagnoses from a cut on, or
+    the summary) is re-requested with a short, targeted prompt and merged in.
+    A response cut off before its diagnoses has lost most of the profile: it
+    is regenerated with one full request instead. The token usage of all the
+    calls is reported by `get_last_usage`.
+
+    Returns:
+        The repaired profile, or None when the response has more than
+        `MAX_REPAIRED_SECTIONS` breaks (or misses the character name).
+    """
+    profile, broken = repair_profile(text)
+    if profile is not None and truncated_before_diagnoses(broken):
+        return _regenerate_profile(description, model_id, use_cache)
+    if profile is None or len(broken) > MAX_REPAIRED_SECTIONS:
+        return None
+    for section, fragment in broken.items():
+        function = "repair_profile_section"
+        usage = get_last_usage()
+        prompt, config, response_model = _build_request(function, model_id, _section_request,
+                                                        description, profile, section, fragment)
+        try:
+            value = _generate_content(model_id, prompt, config, response_model, use_cache, function=function)
+        finally:
+            _last_usage.set(_add_usage(usage, get_last_usage()))
+        if value is None:
+            return None
+        profile = merge_section(profile, section, value.root if isinstance(value, DiagnosisEntryList) else value)
+    return profile
+
+def _regenerate_profile(description: str, model_id: str, use_cache: bool) -> Optional[CharacterProfile]:
+    """
+    Regenerates a profile whose response was cut off, with one full request
+    and a larger output token cap. The response is not repaired again.
+    """
+    function = "regenerate_profile"
+    usage = get_last_usage()
+    prompt, config = _build_request(function, model_id, _profile_request, description)
+    config = config.model_copy(update={"max_output_tokens": REGENERATION_MAX_OUTPUT_TOKENS})
+    try:
+        return _generate_content(model_id, prompt, config, CharacterProfile, use_cache, SYSTEM_PROMPT,
+                                 function=function)
+    finally:
+        _last_usage.set(_add_usage(usage, get_last_usage()))
+
+def count_profile_tokens(description: str, model_id: str, verify: bool = False) -> int:
+    """
+    Counts the input tokens of the profile request of a description.
+
+    The count is a local estimate, or the model's own count (one
+    count-tokens API call) with `verify`.
+    """
+    prompt, _ = _profile_request(description)
+    if not verify:
+        return estimate_tokens(prompt)
+    client = get_genai_client()
+    response = call_with_retry(lambda: client.models.count_tokens(model=model_id, contents=prompt))
+    return response.total_tokens
+
+# Packed requests share the 8192 output token cap between their profiles.
+PACKED_MAX_OUTPUT_TOKENS = 8192
+PACKED_THINKING_BUDGET = 1024
+# Estimated output tokens of one profile (JSON in French), before the share
+# that grows with the length of the description.
+PROFILE_OUTPUT_TOKENS = 1500
+MAX_PACK_SIZE = 8
+
+def estimate_profile_output_tokens(description: str) -> int:
+    """Estimated output tokens of the profile of `description`."""
+    return PROFILE_OUTPUT_TOKENS + estimate_tokens(description) // 2
+
+def pack_descriptions(
+    items: Iterable[tuple[str, str]], max_pack_size: int = MAX_PACK_SIZE,
+    max_output_tokens: int = PACKED_MAX_OUTPUT_TOKENS) -> Iterator[list[tuple[str, str]]]:
+    """
+    Groups (id, description) pairs into packs for `generate_packed_profiles`.
+
+    A pack holds at most `max_pack_size` descriptions with unique ids, and the
+    estimated output of its profiles plus the thinking budget stays under
+    `max_output_tokens`, so a packed response is never cut off by the cap.
+    """
+    budget = max_output_tokens - PACKED_THINKING_BUDGET
+    pack, pack_tokens = [], 0
+    for item_id, description in items:
+        tokens = estimate_profile_output_tokens(description)
+        if pack and (len(pack) >= max_pack_size or pack_tokens + tokens > budget
+                     or any(item_id == other for other, _ in pack)):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append((item_id, description))
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+@functools.cache
+def _packed_profile_generation_config() -> types.GenerateContentConfig:
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_schema=CharacterProfileList,
+        response_mime_type="application/json",
+        temperature=0.0,
+        top_p=0,
+        top_k=1,
+        max_output_tokens=PACKED_MAX_OUTPUT_TOKENS,
+        # A fixed thinking budget keeps room for the profiles under the output cap.
+        thinking_config=types.ThinkingConfig(thinking_budget=PACKED_THINKING_BUDGET)
+    )
+
+def _packed_profile_request(items: list[tuple[str, str]]) -> tuple[str, types.GenerateContentConfig]:
+    descriptions = "\n\n".join(
+        f"Character Description (id: {item_id}):\n{description}" for item_id, description in items
+    )
+    prompt = f"""{SYSTEM_PROMPT}
+
+Today's date: {date.today().isoformat()}
+
+**PACKED REQUEST:** The {len(items)} character descriptions below are independent. Return a JSON array with one profile per description, in the same order, and set the `character_id` of each profile to the id of its description.
+
+{descriptions}"""
+    return prompt, _packed_profile_generation_config()
+
+def _salvage_packed_profiles(text: str) -> Optional[CharacterProfileList]:
+    """Keeps the well-formed profiles of a packed response that failed validation as a whole."""
+    data, complete = parse_partial_json(text)
+    if not isinstance(data, list):
+        return None
+    if not complete:
+        # The last profile of a cut-off response is incomplete.
+        data = data[:-1]
+    profiles = []
+    for item in data:
+        try:
+            profiles.append(CharacterProfile.model_validate(item))
+        except ValueError:
+            continue
+    return CharacterProfileList(profiles)
+
+def generate_packed_profiles(
+    items: list[tuple[str, str]], model_id: str, use_cache: bool = True) -> dict[str, CharacterProfile]:
+    """
+    Generates the profiles of several descriptions in a single request.
+
+    Args:
+        items: (id, description) pairs with unique ids, e.g. a pack from `pack_descriptions`.
+        model_id: The model to use for generation.
+        use_cache: Whether to look the request up in the response cache.
+
+    Returns:
+        The well-formed profiles by id. Ids the model skipped, duplicated or
+        answered with a malformed profile are missing from the result.
+    """
+    prompt, generation_config = _build_request("generate_packed_profiles", model_id, _packed_profile_request, items)
+    packed = _generate_content(
+        model_id, prompt, generation_config, CharacterProfileList, use_cache, SYSTEM_PROMPT,
+        salvage=_salvage_packed_profiles, function="generate_packed_profiles",
+    )
+    expected = {item_id for item_id, _ in items}
+    profiles = {}
+    duplicates = set()
+    for profile in packed.root if packed is not None else []:
+        if profile.character_id not in expected:
+            continue
+        if profile.character_id in profiles:
+            duplicates.add(profile.character_id)
+        profiles[profile.character_id] = profile
+    for item_id in duplicates:
+        del profiles[item_id]
+    return profiles
+
+def generate_character_profiles(
+    descriptions: dict[str, str], model_id: str, use_cache: bool = True,
+    max_pack_size: int = MAX_PACK_SIZE) -> dict[str, CharacterProfile]:
+    """
+    Generates the profiles of many descriptions, packing several per request.
+
+    Descriptions whose packed request failed, or whose profile was missing or
+    malformed, are re-submitted individually with `generate_character_profile`.
+
+    Returns:
+        The profiles by id, in the order of `descriptions`.
+    """
+    profiles = {}
+    for pack in pack_descriptions(descriptions.items(), max_pack_size):
+        try:
+            profiles.update(generate_packed_profiles(pack, model_id, use_cache))
+        except Exception as e:
+            logger.warning("Packed request of %d descriptions failed, retrying them individually: %s", len(pack), e)
+        for item_id, description in pack:
+            if item_id not in profiles:
+                profiles[item_id] = generate_character_profile(description, model_id, use_cache)
+    return {item_id: profiles[item_id] for item_id in descriptions}
+
+# Split strategy: the diagnoses and the Holland Code assessment are generated
+# by two focused requests in parallel, then merged into one profile.
+SPLIT_SUMMARIES = ("local", "model")
+
+@functools.cache
+def _split_generation_config(response_model: type[BaseModel]) -> types.GenerateContentConfig:
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_schema=response_model,
         response_mime_type="application/json",
         temperature=0.0,
         top_p=0,
@@ -137,26 +645,332 @@ def generate_character_profile(
         thinking_config=types.ThinkingConfig(thinking_budget=-1)
     )
 
-    prompt = f"{SYSTEM_PROMPT}\n\nCharacter Description:\n{description}"
-    client = get_genai_client()
-    response = client.models.generate_content(
-        model=model_id,
-        contents=prompt,
-        config=generation_config,
+def _diagnoses_request(description: str) -> tuple[str, types.GenerateContentConfig]:
+    prompt = f"{SYSTEM_PROMPT_DIAGNOSES}\n\nCharacter Description:\n{description}"
+    return prompt, _split_generation_config(DiagnosticAssessment)
+
+def _holland_request(description: str) -> tuple[str, types.GenerateContentConfig]:
+    prompt = f"{SYSTEM_PROMPT_HOLLAND}\n\nCharacter Description:\n{description}"
+    return prompt, _split_generation_config(HollandCodeAssessment)
+
+def _summary_request(profile: CharacterProfile) -> tuple[str, types.GenerateContentConfig]:
+    from google.genai import types
+
+    prompt = f"{SYSTEM_PROMPT_SUMMARY}\n\nCharacter PROFILE:\n{profile.model_dump_json(exclude_none=True)}"
+    return prompt, types.GenerateContentConfig(
+        response_schema=AssessmentSummary,
+        response_mime_type="application/json",
+        temperature=0.0,
+        top_p=0,
+        top_k=1,
+        max_output_tokens=1024,
+        thinking_config=types.ThinkingConfig(thinking_budget=0)
     )
 
-    return response.parsed
+def _merge_split_profile(diagnostic: DiagnosticAssessment, holland: HollandCodeAssessment) -> CharacterProfile:
+    """Merges the two halves of a split profile, with the two summaries joined as the overall summary."""
+    summaries = [summary.strip() for summary in (diagnostic.clinical_summary, holland.summary) if summary and summary.strip()]
+    return CharacterProfile(
+        character_name=diagnostic.character_name,
+        profile_date=date.today().isoformat(),
+        overall_assessment_summary=" ".join(summaries) or None,
+        holland_code_assessment=holland,
+        diagnoses=diagnostic.diagnoses,
+    )
 
-def evaluate_profile_with_llm(
-    description: str,
-    generated_profile: CharacterProfile,
-    golden_profile: CharacterProfile,
-    model_id: str
-) -> EvaluationResult:
+def _check_split_summary(summary: str):
+    if summary not in SPLIT_SUMMARIES:
+        raise ValueError(f"summary must be one of {', '.join(SPLIT_SUMMARIES)}")
+
+def generate_character_profile_split(
+    description: str, model_id: str, use_cache: bool = True, summary: str = "local") -> Optional[CharacterProfile]:
     """
-    Evaluates a generated character profile using an LLM-as-a-Judge.
+    Generates a character profile with two focused requests sent in parallel,
+    one for the diagnoses and one for the Holland Code assessment, instead of
+    a single request reasoning about both in turn.
+
+    Args:
+        description: The character description.
+        model_id: The model of both requests.
+        use_cache: Look the requests up in the response cache.
+        summary: "local" to join the summaries of the two halves as the
+            overall summary, or "model" to have it written by a short third
+            request once both halves are in.
+
+    Returns:
+        The merged profile, or None when either half could not be parsed.
+        `get_last_usage` reports the token usage of all the requests.
+    """
+    _check_split_summary(summary)
+
+    # The two system prompts are far below the minimum size of a cached content,
+    # so they are sent in full (see `context_cache.MIN_CACHED_TOKENS`).
+    def generate(function: str, build: Callable[..., tuple], response_model: type[BaseModel]):
+        prompt, generation_config = _build_request(function, model_id, build, description)
+        value = _generate_content(model_id, prompt, generation_config, response_model, use_cache,
+                                  function=function)
+        return value, get_last_usage()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        holland_future = executor.submit(generate, "generate_holland_assessment", _holland_request,
+                                         HollandCodeAssessment)
+        diagnostic, usage = generate("generate_diagnoses", _diagnoses_request, DiagnosticAssessment)
+        holland, holland_usage = holland_future.result()
+    usage = _add_usage(usage, holland_usage)
+    _last_usage.set(usage)
+    if diagnostic is None or holland is None:
+        return None
+
+    profile = _merge_split_profile(diagnostic, holland)
+    if summary == "model":
+        prompt, generation_config = _build_request("generate_profile_summary", model_id, _summary_request, profile)
+        written = _generate_content(model_id, prompt, generation_config, AssessmentSummary, use_cache,
+                                    function="generate_profile_summary")
+        _last_usage.set(_add_usage(usage, get_last_usage()))
+        if written is not None:
+            profile.overall_assessment_summary = written.overall_assessment_summary
+    return profile
+
+async def agenerate_character_profile_split(
+    description: str, model_id: str, use_cache: bool = True, summary: str = "local",
+    timeout_s: Optional[float] = None) -> Optional[CharacterProfile]:
     """
-    generation_config = types.GenerateContentConfig(
+    Async counterpart of `generate_character_profile_split`, with the two
+    requests awaited concurrently on the event loop. `timeout_s` applies to
+    each request; `get_last_usage` is not updated by the concurrent requests.
+    """
+    _check_split_summary(summary)
+    diagnoses_prompt, diagnoses_config = _build_request(
+        "agenerate_diagnoses", model_id, _diagnoses_request, description)
+    holland_prompt, holland_config = _build_request(
+        "agenerate_holland_assessment", model_id, _holland_request, description)
+    diagnostic, holland = await asyncio.gather(
+        _agenerate_content(model_id, diagnoses_prompt, diagnoses_config, DiagnosticAssessment, use_cache,
+                           timeout_s, function="agenerate_diagnoses"),
+        _agenerate_content(model_id, holland_prompt, holland_config, HollandCodeAssessment, use_cache,
+                           timeout_s, function="agenerate_holland_assessment"),
+    )
+    if diagnostic is None or holland is None:
+        return None
+
+    profile = _merge_split_profile(diagnostic, holland)
+    if summary == "model":
+        prompt, generation_config = _build_request("agenerate_profile_summary", model_id, _summary_request, profile)
+        written = await _agenerate_content(model_id, prompt, generation_config, AssessmentSummary, use_cache,
+                                           timeout_s, function="agenerate_profile_summary")
+        if written is not None:
+            profile.overall_assessment_summary = written.overall_assessment_summary
+    return profile
+
+# Cascade generation: the fast model first, the strong model only for the
+# profiles failing the local checks of `validation.validate_profile`.
+FAST_MODEL_ID = "gemini-2.5-flash"
+STRONG_MODEL_ID = "gemini-2.5-pro"
+
+_last_cascade: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("last_cascade", default=None)
+_cascade_lock = threading.Lock()
+_cascade_counts = {"calls": 0, "escalations": 0}
+
+def get_last_cascade() -> Optional[dict]:
+    """
+    Returns how the last cascade generation of the current thread (or asyncio
+    task) went: the model whose profile was returned, whether it escalated,
+    the problems found in the fast model's profile and the token usage of
+    each model called. None before the first cascade generation.
+    """
+    return _last_cascade.get()
+
+def get_cascade_stats() -> dict:
+    """Returns the cascade generations and escalations of this process so far, and the escalation rate."""
+    with _cascade_lock:
+        calls, escalations = _cascade_counts["calls"], _cascade_counts["escalations"]
+    return {
+        "calls": calls,
+        "escalations": escalations,
+        "escalation_rate": round(escalations / calls, 4) if calls else 0.0,
+    }
+
+def reset_cascade_stats():
+    """Resets the counts of `get_cascade_stats`."""
+    with _cascade_lock:
+        _cascade_counts.update(calls=0, escalations=0)
+
+def generate_character_profile_cascade(
+    description: str, fast_model_id: str = FAST_MODEL_ID, strong_model_id: str = STRONG_MODEL_ID,
+    use_cache: bool = True) -> CharacterProfile:
+    """
+    Generates a character profile with the fast model, and regenerates it with
+    the strong model only when the fast model's profile fails the local
+    checks (incomplete schema, missing RIASEC scores, malformed DSM codes,
+    diagnoses without criteria, inconsistent scores) or the fast call fails.
+
+    The escalation is recorded in `get_last_cascade`, `get_cascade_stats`
+    and the `psy_dsm_cascade_total` metric.
+    """
+    from .validation import validate_profile
+
+    outcome = {"fast_model_id": fast_model_id, "strong_model_id": strong_model_id,
+               "model_id": fast_model_id, "escalated": False, "problems": [], "usage": {}}
+    _last_cascade.set(outcome)
+    try:
+        profile = generate_character_profile(description, fast_model_id, use_cache)
+        outcome["usage"][fast_model_id] = get_last_usage()
+        outcome["problems"] = validate_profile(profile)
+    except Exception as e:
+        if not isinstance(e, ValueError) and not is_retryable(e):
+            # Not a bad answer: e.g. a configuration error the strong model would hit too.
+            raise
+        outcome["problems"] = [f"fast model call failed: {type(e).__name__}: {e}"]
+
+    outcome["escalated"] = bool(outcome["problems"])
+    with _cascade_lock:
+        _cascade_counts["calls"] += 1
+        _cascade_counts["escalations"] += outcome["escalated"]
+    metrics.record_cascade(fast_model_id, strong_model_id, outcome["escalated"])
+    if not outcome["escalated"]:
+        return profile
+    outcome["model_id"] = strong_model_id
+    profile = generate_character_profile(description, strong_model_id, use_cache)
+    outcome["usage"][strong_model_id] = get_last_usage()
+    return profile
+
+def _partial_profile(data: dict, complete: bool) -> CharacterProfile:
+    """
+    Builds a profile from the parsed part of a streamed response.
+
+    Sections still being streamed are left out, so every section of the
+    returned profile is final: the summary once written, the Holland Code
+    assessment once closed, and each diagnosis once the next one starts.
+    """
+    fields = dict(data)
+    if not complete and fields:
+        last_key = list(fields)[-1]
+        if last_key == "diagnoses" and isinstance(fields[last_key], list):
+            fields["diagnoses"] = fields["diagnoses"][:-1]
+        elif isinstance(fields[last_key], (dict, list)):
+            del fields[last_key]
+
+    holland = fields.pop("holland_code_assessment", None)
+    diagnoses = fields.pop("diagnoses", None) or []
+    fields.setdefault("character_name", "")
+    fields.setdefault("profile_date", "")
+    try:
+        profile = CharacterProfile.model_validate(fields)
+    except ValueError:
+        profile = CharacterProfile(character_name="", profile_date="")
+    if isinstance(holland, dict):
+        try:
+            profile.holland_code_assessment = HollandCodeAssessment.model_validate(holland)
+        except ValueError:
+            pass
+    for entry in diagnoses:
+        try:
+            profile.diagnoses.append(DiagnosisEntry.model_validate(entry))
+        except ValueError:
+            continue
+    return profile
+
+def _profile_sections(profile: CharacterProfile) -> tuple:
+    return (
+        profile.character_name,
+        profile.overall_assessment_summary is not None,
+        profile.holland_code_assessment is not None,
+        len(profile.diagnoses),
+    )
+
+def generate_character_profile_stream(
+    description: str, model_id: str, use_cache: bool = True) -> Iterator[CharacterProfile]:
+    """
+    Generates a character profile, yielding partially populated profiles while
+    the response streams in.
+
+    A new profile is yielded each time a section is complete: the summary
+    first, then the Holland Code assessment, then each diagnosis. The last
+    profile yielded is the full one; a truncated or malformed response is
+    repaired first, or raises `IncompleteProfileError` when it cannot be.
+    """
+    function = "generate_character_profile_stream"
+    prompt, generation_config = _build_request(function, model_id, _profile_request, description)
+
+    with metrics.call(function, model_id) as call:
+        cache = get_response_cache()
+        _last_usage.set(None)
+        with metrics.span("cache", function, model_id):
+            key = make_key(model_id, prompt, generation_config, CharacterProfile)
+            cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            call.outcome = "cache_hit"
+            yield CharacterProfile.model_validate_json(cached)
+            return
+
+        client = get_genai_client()
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(prompt)
+        context_cache = get_context_cache()
+
+        def open_stream():
+            # Quota errors surface on the first chunk, so it is read inside the retry.
+            with metrics.span("rate_limit", function, model_id):
+                limiter.acquire(model_id, estimated_tokens)
+            with metrics.span("context_cache", function, model_id):
+                cached_name = context_cache.lookup(client, model_id, SYSTEM_PROMPT)
+            contents, config = _with_cached_prefix(prompt, generation_config, SYSTEM_PROMPT, cached_name)
+            with metrics.span("first_chunk", function, model_id):
+                try:
+                    stream = iter(client.models.generate_content_stream(model=model_id, contents=contents, config=config))
+                    first = next(stream)
+                except Exception as e:
+                    if not _cached_content_rejected(e, cached_name):
+                        raise
+                    context_cache.invalidate(model_id, SYSTEM_PROMPT)
+                    stream = iter(client.models.generate_content_stream(
+                        model=model_id, contents=prompt, config=generation_config))
+                    first = next(stream)
+            return itertools.chain([first], stream)
+
+        text = ""
+        last_sections = None
+        last_profile = None
+        last_chunk = None
+        for chunk in call_with_retry(open_stream):
+            last_chunk = chunk
+            if not chunk.text:
+                continue
+            text += chunk.text
+            with metrics.span("parse", function, model_id):
+                data, complete = parse_partial_json(text)
+                if not isinstance(data, dict):
+                    continue
+                profile = _partial_profile(data, complete)
+                sections = _profile_sections(profile)
+            if sections != last_sections:
+                last_sections = sections
+                last_profile = profile
+                yield profile
+        # The usage metadata comes with the last chunk.
+        _record_usage(limiter, model_id, last_chunk, estimated_tokens, function)
+
+        data, complete = parse_partial_json(text)
+        try:
+            if not complete:
+                raise ValueError("truncated response")
+            profile = CharacterProfile.model_validate(data)
+        except ValueError:
+            profile = _repair_profile_response(description, model_id, use_cache, text)
+            if profile is None:
+                raise IncompleteProfileError("The model's answer was incomplete and could not be repaired.")
+            # Repaired profiles are not cached, like the other salvaged responses.
+            yield profile
+            return
+        if profile != last_profile:
+            yield profile
+        cache.set(key, profile.model_dump_json())
+
+@functools.cache
+def _judge_generation_config() -> types.GenerateContentConfig:
+    from google.genai import types
+
+    return types.GenerateContentConfig(
         response_schema=EvaluationResult,
         response_mime_type="application/json",
         temperature=0.0,
@@ -165,6 +979,12 @@ def evaluate_profile_with_llm(
         max_output_tokens=8192,
     )
 
+def _judge_request(
+    description: str,
+    generated_profile: CharacterProfile,
+    golden_profile: CharacterProfile,
+) -> tuple[str, types.GenerateContentConfig]:
+    generation_config = _judge_generation_config()
     prompt = f"""{SYSTEM_PROMPT_JUDGE}
 
     **Original Description:**
@@ -182,12 +1002,109 @@ def evaluate_profile_with_llm(
     {generated_profile.model_dump_json(indent=2)}
     ```
     """
+    return prompt, generation_config
 
-    client = get_genai_client()
-    response = client.models.generate_content(
-        model=model_id,
-        contents=prompt,
-        config=generation_config,
-    )
+def evaluate_profile_with_llm(
+    description: str,
+    generated_profile: CharacterProfile,
+    golden_profile: CharacterProfile,
+    model_id: str,
+    use_cache: bool = True
+) -> EvaluationResult:
+    """
+    Evaluates a generated character profile using an LLM-as-a-Judge.
+    """
+    prompt, generation_config = _build_request(
+        "evaluate_profile_with_llm", model_id, _judge_request, description, generated_profile, golden_profile)
+    return _generate_content(model_id, prompt, generation_config, EvaluationResult, use_cache,
+                             function="evaluate_profile_with_llm")
+
+async def _agenerate_content(model_id: str, prompt: str, generation_config: types.GenerateContentConfig,
+                             response_model: type[BaseModel], use_cache: bool = True,
+                             timeout_s: Optional[float] = None, cached_prefix: Optional[str] = None,
+                             function: str = "agenerate_content"):
+    """
+    Async counterpart of `_generate_content`, built on the client's async surface.
+
+    The call is cancelled (raising `asyncio.TimeoutError`) once `timeout_s`
+    seconds have passed, rate-limiter waits and retries included. Cancelling
+    the awaiting task cancels the in-flight HTTP request. The response cache
+    and rate limiter may wait on their SQLite files, so their calls run in a
+    thread.
+    """
+    with metrics.call(function, model_id) as call:
+        cache = get_response_cache()
+        _last_usage.set(None)
+        with metrics.span("cache", function, model_id):
+            key = make_key(model_id, prompt, generation_config, response_model)
+            cached = await asyncio.to_thread(cache.get, key) if use_cache else None
+        if cached is not None:
+            call.outcome = "cache_hit"
+            return response_model.model_validate_json(cached)
+
+        client = get_genai_client()
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(prompt)
+
+        context_cache = get_context_cache()
+
+        async def send():
+            with metrics.span("rate_limit", function, model_id):
+                await limiter.aacquire(model_id, estimated_tokens)
+            with metrics.span("context_cache", function, model_id):
+                cached_name = await context_cache.alookup(client, model_id, cached_prefix) if cached_prefix else None
+            contents, config = _with_cached_prefix(prompt, generation_config, cached_prefix, cached_name)
+            with metrics.span("model", function, model_id):
+                try:
+                    return await client.aio.models.generate_content(model=model_id, contents=contents, config=config)
+                except Exception as e:
+                    if not _cached_content_rejected(e, cached_name):
+                        raise
+                    context_cache.invalidate(model_id, cached_prefix)
+                    return await client.aio.models.generate_content(
+                        model=model_id, contents=prompt, config=generation_config)
 
-    return response.parsed
\ No newline at end of file
+        response = await asyncio.wait_for(acall_with_retry(send), timeout_s)
+        await _arecord_usage(limiter, model_id, response, estimated_tokens, function)
+
+        with metrics.span("parse", function, model_id):
+            if response.parsed is not None:
+                await asyncio.to_thread(cache.set, key, response.parsed.model_dump_json())
+            return response.parsed
+
+async def agenerate_character_profile(
+    description: str, model_id: str, use_cache: bool = True,
+    timeout_s: Optional[float] = None) -> CharacterProfile:
+    """
+    Generates a character profile without blocking the event loop.
+    """
+    prompt, generation_config = _build_request("agenerate_character_profile", model_id, _profile_request, description)
+    return await _agenerate_content(
+        model_id, prompt, generation_config, CharacterProfile, use_cache, timeout_s, SYSTEM_PROMPT,
+        function="agenerate_character_profile")
+
+async def agenerate_tcc_program(
+    profile: CharacterProfile, model_id: str, use_cache: bool = True,
+    timeout_s: Optional[float] = None) -> TCCProgram:
+    """
+    Generates a TCC program adapted to the given character profile without blocking the event loop.
+    """
+    prompt, generation_config = _build_request("agenerate_tcc_program", model_id, _tcc_request, profile)
+    return await _agenerate_content(model_id, prompt, generation_config, TCCProgram, use_cache, timeout_s,
+                                    function="agenerate_tcc_program")
+
+async def aevaluate_profile_with_llm(
+    description: str,
+    generated_profile: CharacterProfile,
+    golden_profile: CharacterProfile,
+    model_id: str,
+    use_cache: bool = True,
+    timeout_s: Optional[float] = None
+) -> EvaluationResult:
+    """
+    Evaluates a generated character profile using an LLM-as-a-Judge without blocking the event loop.
+    """
+    prompt, generation_config = _build_request(
+        "aevaluate_profile_with_llm", model_id, _judge_request, description, generated_profile, golden_profile)
+    return await _agenerate_content(model_id, prompt, generation_config, EvaluationResult, use_cache, timeout_s,
+                                    function="aevaluate_profile_with_llm")
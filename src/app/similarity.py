@@ -0,0 +1,251 @@
+"""
+Similar-profile search over the RIASEC score vectors of stored profiles.
+
+The index keeps one six-dimensional vector per profile (in `RIASEC_THEMES`
+order) in a float32 matrix, and answers top-k queries by cosine similarity
+or L2 distance with vectorized NumPy, optionally restricted to the profiles
+sharing a diagnosis code. On disk, the matrix is a raw float32 file that is
+memory-mapped on load and appended to on insert, next to a JSONL file of the
+profile ids, names and diagnosis codes.
+
+Usage:
+    python -m app.similarity profiles.jsonl index/
+"""
+
+import argparse
+import json
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .models import CharacterProfile
+from .scoring import RIASEC_THEMES, diagnosis_codes, riasec_matrix
+
+DIMENSIONS = len(RIASEC_THEMES)
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+# Added profiles are written to disk at least this often.
+FLUSH_EVERY = 1000
+
+
+def riasec_vector(profile: CharacterProfile) -> Optional[np.ndarray]:
+    """
+    Returns the RIASEC vector of a profile, with 0 for the themes it does not
+    score, or None when it has no RIASEC score at all.
+    """
+    vector = riasec_matrix([profile])[0]
+    if np.isnan(vector).all():
+        return None
+    return np.nan_to_num(vector).astype(np.float32)
+
+
+class RiasecIndex:
+    """
+    A top-k similarity index over profile RIASEC vectors.
+
+    Args:
+        directory: Where the index is persisted; an existing index there is
+            memory-mapped. None keeps the index in memory only.
+        read_only: Open the index for queries only, e.g. while a batch is
+            appending to it from another process.
+    """
+
+    def __init__(self, directory: Optional[str] = None, read_only: bool = False):
+        self.directory = directory
+        self.read_only = read_only
+        self._metadata: list[dict] = []
+        self._by_code: dict[str, list[int]] = {}
+        self._by_id: dict[str, list[int]] = {}
+        self._pending: list[np.ndarray] = []
+        self._vectors = np.empty((0, DIMENSIONS), dtype=np.float32)
+        if directory is not None:
+            if not read_only:
+                os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        metadata_path = self._path(METADATA_FILE)
+        vectors_path = self._path(VECTORS_FILE)
+        entries, offsets = [], [0]
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'rb') as f_in:
+                for line in f_in:
+                    if not line.endswith(b"\n"):
+                        break
+                    entries.append(json.loads(line))
+                    offsets.append(offsets[-1] + len(line))
+        vector_rows = os.path.getsize(vectors_path) // (DIMENSIONS * 4) if os.path.exists(vectors_path) else 0
+        # A crash between (or during) the two appends leaves one file ahead
+        # of the other; both are cut back to the rows they share.
+        rows = min(vector_rows, len(entries))
+        if not self.read_only:
+            if os.path.exists(metadata_path):
+                os.truncate(metadata_path, offsets[rows])
+            if os.path.exists(vectors_path):
+                os.truncate(vectors_path, rows * DIMENSIONS * 4)
+        for entry in entries[:rows]:
+            self._remember(entry)
+        self._map(rows)
+
+    def _map(self, rows: int):
+        if rows == 0:
+            self._vectors = np.empty((0, DIMENSIONS), dtype=np.float32)
+        else:
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(rows, DIMENSIONS))
+
+    def _remember(self, entry: dict):
+        row = len(self._metadata)
+        self._metadata.append(entry)
+        self._by_id.setdefault(entry["id"], []).append(row)
+        for code in entry["codes"]:
+            self._by_code.setdefault(code, []).append(row)
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    def count(self, item_id: str) -> int:
+        """Returns the number of indexed profiles with this id."""
+        return len(self._by_id.get(item_id, []))
+
+    @staticmethod
+    def profile_codes(profile: CharacterProfile) -> list[str]:
+        """Returns the diagnosis codes a profile is indexed under."""
+        return sorted({code for diagnosis in profile.diagnoses for code in diagnosis_codes(diagnosis)})
+
+    def add(self, item_id: str, profile: CharacterProfile) -> bool:
+        """
+        Adds a profile to the index.
+
+        Returns:
+            False (and nothing is added) when the profile has no RIASEC score.
+        """
+        if self.read_only:
+            raise ValueError("the index is read-only")
+        vector = riasec_vector(profile)
+        if vector is None:
+            return False
+        self._pending.append(vector)
+        self._remember({"id": item_id, "character_name": profile.character_name,
+                        "codes": self.profile_codes(profile)})
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+        return True
+
+    def add_many(self, items: Iterable[tuple[str, CharacterProfile]]) -> int:
+        """Adds (id, profile) pairs and flushes them; returns the number indexed."""
+        added = sum(self.add(item_id, profile) for item_id, profile in items)
+        self.flush()
+        return added
+
+    def flush(self):
+        """Appends the vectors added since the last flush to the index files."""
+        if not self._pending:
+            return
+        pending = np.stack(self._pending)
+        first = len(self._metadata) - len(pending)
+        self._pending = []
+        if self.directory is None:
+            self._vectors = np.concatenate([self._vectors, pending])
+            return
+        # Vectors first: on load, metadata lines without a vector are dropped.
+        with open(self._path(VECTORS_FILE), 'ab') as f_vectors:
+            f_vectors.write(pending.tobytes())
+        with open(self._path(METADATA_FILE), 'a', encoding='utf-8') as f_metadata:
+            for entry in self._metadata[first:]:
+                f_metadata.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._map(len(self._metadata))
+
+    def __enter__(self) -> "RiasecIndex":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def query(self, profile: CharacterProfile, k: int = 5, metric: str = "cosine",
+              code: Optional[str] = None, exclude_id: Optional[str] = None) -> list[dict]:
+        """
+        Returns the `k` indexed profiles closest to `profile`, closest first.
+
+        Args:
+            profile: The profile to find similar profiles for.
+            k: Number of profiles to return.
+            metric: "cosine" (highest similarity first) or "l2" (smallest
+                distance first).
+            code: Only consider profiles diagnosed with this code (e.g.
+                "301.4" or "F60.5").
+            exclude_id: An id to leave out of the results, e.g. the query
+                profile's own.
+
+        Returns:
+            The id, character name and diagnosis codes of each profile, with
+            its `similarity` (cosine) or `distance` (l2).
+        """
+        if metric not in ("cosine", "l2"):
+            raise ValueError("metric must be 'cosine' or 'l2'")
+        vector = riasec_vector(profile)
+        if vector is None or k < 1:
+            return []
+        self.flush()
+
+        if code is not None:
+            rows = np.asarray(self._by_code.get(code.strip().upper(), []), dtype=np.int64)
+            candidates = self._vectors[rows]
+        else:
+            rows = None
+            candidates = self._vectors
+        excluded = self._by_id.get(exclude_id, []) if exclude_id is not None else []
+        if excluded:
+            positions = rows if rows is not None else np.arange(len(candidates))
+            keep = ~np.isin(positions, excluded)
+            rows, candidates = positions[keep], candidates[keep]
+        if len(candidates) == 0:
+            return []
+
+        if metric == "cosine":
+            norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(vector)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = np.where(norms > 0, candidates @ vector / norms, 0.0)
+            order_keys = -scores
+        else:
+            scores = np.linalg.norm(candidates - vector, axis=1)
+            order_keys = scores
+        k = min(k, len(candidates))
+        top = np.argpartition(order_keys, k - 1)[:k]
+        top = top[np.argsort(order_keys[top], kind="stable")]
+
+        key = "similarity" if metric == "cosine" else "distance"
+        results = []
+        for position in top:
+            row = int(rows[position]) if rows is not None else int(position)
+            results.append({**self._metadata[row], key: round(float(scores[position]), 4)})
+        return results
+
+
+def index_batch_output(input_file: str, directory: str) -> int:
+    """Adds the profiles of a batch output file (JSONL) to the index in `directory`."""
+    index = RiasecIndex(directory)
+
+    def profiles():
+        with open(input_file, 'r', encoding='utf-8') as f_in:
+            for line in f_in:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                if result.get("profile") is not None:
+                    yield result["id"], CharacterProfile.model_validate(result["profile"])
+
+    return index.add_many(profiles())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the RIASEC vectors of a batch output file for similar-profile search.")
+    parser.add_argument("input_file", help="Path to the JSONL batch output file.")
+    parser.add_argument("index_dir", help="Directory of the index (created or extended).")
+    args = parser.parse_args()
+
+    added = index_batch_output(args.input_file, args.index_dir)
+    print(f"Indexed {added} profiles ({len(RiasecIndex(args.index_dir))} in the index).")
@@ -0,0 +1,64 @@
+"""
+Token usage totals and cost estimates of the model calls.
+
+Usage dictionaries are the ones returned by `services.get_last_usage`
+(prompt_tokens, cached_tokens, output_tokens, thinking_tokens, total_tokens).
+"""
+
+from typing import Optional
+
+# USD per million tokens, standard tier, prompts of up to 200k tokens. Thinking
+# tokens are billed as output tokens; cached prompt tokens at the cached rate.
+MODEL_PRICING = {
+    "gemini-2.5-pro": {"input": 1.25, "cached": 0.125, "output": 10.0},
+    "gemini-2.5-flash": {"input": 0.30, "cached": 0.03, "output": 2.50},
+    "gemini-2.5-flash-lite": {"input": 0.10, "cached": 0.01, "output": 0.40},
+}
+
+USAGE_KEYS = ("prompt_tokens", "cached_tokens", "output_tokens", "thinking_tokens", "total_tokens")
+
+
+def model_pricing(model_id: str) -> Optional[dict]:
+    """
+    Returns the prices of a model, matching versioned ids (e.g.
+    "gemini-2.5-pro-preview-06-05") by their longest known prefix.
+    """
+    matches = [name for name in MODEL_PRICING if model_id == name or model_id.startswith(name + "-")]
+    return MODEL_PRICING[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model_id: str, usage: dict) -> Optional[float]:
+    """Returns the estimated cost in USD of the given token counts, or None for an unknown model."""
+    pricing = model_pricing(model_id)
+    if pricing is None:
+        return None
+    cached = usage.get("cached_tokens") or 0
+    uncached = max((usage.get("prompt_tokens") or 0) - cached, 0)
+    output = (usage.get("output_tokens") or 0) + (usage.get("thinking_tokens") or 0)
+    return (uncached * pricing["input"] + cached * pricing["cached"] + output * pricing["output"]) / 1_000_000
+
+
+def add_usage(totals: dict, usage: Optional[dict]):
+    """Adds the token counts of one call to `totals` (a call answered from the cache has no usage)."""
+    if not usage:
+        return
+    totals["requests"] = totals.get("requests", 0) + 1
+    for key in USAGE_KEYS:
+        totals[key] = totals.get(key, 0) + (usage.get(key) or 0)
+
+
+def usage_report(totals_by_model: dict[str, dict], elapsed_s: float) -> dict[str, dict]:
+    """
+    Summarizes the token totals of each model: counts, estimated cost and
+    tokens per second over the run.
+    """
+    report = {}
+    for model_id, totals in totals_by_model.items():
+        cost = estimate_cost(model_id, totals)
+        report[model_id] = {
+            "requests": totals.get("requests", 0),
+            **{key: totals.get(key, 0) for key in USAGE_KEYS},
+            "estimated_cost_usd": round(cost, 4) if cost is not None else None,
+            "tokens_per_s": round(totals.get("total_tokens", 0) / elapsed_s, 1) if elapsed_s > 0 else 0.0,
+        }
+    return report
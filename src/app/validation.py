@@ -0,0 +1,97 @@
+"""
+Local validity checks of generated profiles.
+
+A profile passes when it is complete (summary, Holland Code assessment with
+the six RIASEC scores, criteria for every diagnosis), its DSM codes are well
+formed and it is self-consistent (the top themes are among the highest
+scores, the scores are not all the same). The checks are cheap enough to run
+on every response, e.g. to decide whether a fast model's profile must be
+regenerated by a stronger one.
+"""
+
+import re
+from typing import Optional
+
+from .models import CharacterProfile
+
+# DSM-5 / ICD-9-CM codes (301.83) and ICD-10-CM codes (F60.3, F32.A), shared with `app.scoring`.
+DSM_CODE = re.compile(r"[A-Z]\d{2}(?:\.[0-9A-Z]{1,4})?|\d{3}(?:\.\d{1,2})?")
+_DSM_CODE_IN_TEXT = re.compile(rf"\b(?:{DSM_CODE.pattern})\b")
+# Separators between the codes of one diagnosis, e.g. "301.83 (F60.3)" or "F42.2 / 300.3".
+_CODE_SEPARATORS = re.compile(r"[\s/(),;]+")
+
+MIN_SCORE = 1
+MAX_SCORE = 10
+
+
+def split_dsm_codes(code: str) -> list[str]:
+    """Splits a `dsm_code` field into its uppercased tokens, e.g. "301.83 (F60.3)" into ["301.83", "F60.3"]."""
+    return [token for token in _CODE_SEPARATORS.split(code.strip().upper()) if token]
+
+
+def find_dsm_codes(text: str) -> list[str]:
+    """Returns the uppercased DSM-5/ICD codes found in a text, e.g. ["F60.3"] for "F60.3 borderline"."""
+    return _DSM_CODE_IN_TEXT.findall(text.upper())
+
+
+def dsm_code_is_well_formed(code: str) -> bool:
+    """Whether a `dsm_code` field holds one or more well-formed DSM-5/ICD codes and nothing else."""
+    tokens = split_dsm_codes(code)
+    return bool(tokens) and all(DSM_CODE.fullmatch(token) for token in tokens)
+
+
+def validate_profile(profile: Optional[CharacterProfile]) -> list[str]:
+    """
+    Runs the local checks on a profile.
+
+    Returns:
+        The problems found, empty when the profile passes.
+    """
+    # Loaded on first use: scoring brings NumPy along.
+    from .scoring import RIASEC_THEMES, theme_index
+
+    if profile is None:
+        return ["no parsable profile"]
+    problems = []
+    if not profile.character_name.strip():
+        problems.append("character name missing")
+    if not (profile.overall_assessment_summary or "").strip():
+        problems.append("overall assessment summary missing")
+
+    assessment = profile.holland_code_assessment
+    if assessment is None:
+        problems.append("Holland Code assessment missing")
+    else:
+        scores = {}
+        for score in assessment.riasec_scores:
+            index = theme_index(score.theme)
+            if index is None:
+                problems.append(f"unknown RIASEC theme {score.theme!r}")
+            elif index in scores:
+                problems.append(f"RIASEC theme {RIASEC_THEMES[index]} scored twice")
+            else:
+                scores[index] = score.score
+            if not MIN_SCORE <= score.score <= MAX_SCORE:
+                problems.append(f"RIASEC score {score.score} of {score.theme!r} out of range")
+        missing = [RIASEC_THEMES[i] for i in range(len(RIASEC_THEMES)) if i not in scores]
+        if missing:
+            problems.append(f"RIASEC scores missing for {', '.join(missing)}")
+        if not assessment.top_themes:
+            problems.append("top themes missing")
+        elif not missing:
+            if len(set(scores.values())) == 1:
+                problems.append("all RIASEC scores are equal")
+            top_indexes = [theme_index(theme) for theme in assessment.top_themes]
+            ranked = sorted(scores.values(), reverse=True)
+            cutoff = ranked[min(len(assessment.top_themes), len(ranked)) - 1]
+            if any(index is None or scores.get(index, MIN_SCORE - 1) < cutoff for index in top_indexes):
+                problems.append("top themes are not the highest scored")
+
+    for diagnosis in profile.diagnoses:
+        if diagnosis.dsm_code is None or not diagnosis.dsm_code.strip():
+            problems.append(f"DSM code missing for {diagnosis.disorder_name!r}")
+        elif not dsm_code_is_well_formed(diagnosis.dsm_code):
+            problems.append(f"malformed DSM code {diagnosis.dsm_code!r}")
+        if not diagnosis.criteria_met:
+            problems.append(f"no criteria listed for {diagnosis.disorder_name!r}")
+    return problems
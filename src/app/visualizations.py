@@ -1,7 +1,76 @@
-import matplotlib.pyplot as plt
-import numpy as np
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
 import os
-from .models import HollandCodeAssessment
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from .models import CharacterProfile, HollandCodeAssessment
+
+if TYPE_CHECKING:
+    # matplotlib and numpy are slow to import; they are loaded on the first chart.
+    from matplotlib.figure import Figure
+
+BAR_COLORS = ['#FF4136', '#FFDC00', '#0074D9', '#2ECC40', '#FF851B', '#B10DC9']
+
+
+def _scores(assessment: HollandCodeAssessment) -> tuple[list[str], list[int]]:
+    labels = [score.theme for score in assessment.riasec_scores]
+    values = [score.score for score in assessment.riasec_scores]
+    return labels, values
+
+
+def _bar_chart(labels: list[str], values: list[int]) -> Figure:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # Figures are built with the object-oriented API on an Agg canvas, so they
+    # never touch pyplot's global state and are safe to render in parallel.
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.bar(labels, values, color=BAR_COLORS)
+    ax.set_title('RIASEC Scores')
+    ax.set_xlabel('Theme')
+    ax.set_ylabel('Score')
+    ax.grid(axis='y', linestyle='--')
+    return fig
+
+
+def _radar_chart(labels: list[str], values: list[int]) -> Figure:
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    num_vars = len(labels)
+    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
+    radar_values = values + values[:1]
+    radar_angles = angles + angles[:1]
+
+    fig = Figure(figsize=(8, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots(subplot_kw=dict(polar=True))
+    ax.fill(radar_angles, radar_values, color='red', alpha=0.25)
+    ax.plot(radar_angles, radar_values, color='red', linewidth=2)
+
+    ax.set_yticklabels([])
+    ax.set_xticks(angles)
+    ax.set_xticklabels(labels)
+
+    ax.set_title('RIASEC Profile', size=20, color='red', y=1.1)
+    return fig
+
+
+def _save(fig: Figure, path: str):
+    # Written to a temporary file first, so an interrupted render never leaves
+    # a partial chart that a later run would skip as already rendered.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format="png")
+    os.replace(tmp_path, path)
+
 
 def create_riasec_visualizations(assessment: HollandCodeAssessment, output_dir: str = "output"):
     """
@@ -14,38 +83,9 @@ def create_riasec_visualizations(assessment: HollandCodeAssessment, output_dir:
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    labels = [score.theme for score in assessment.riasec_scores]
-    values = [score.score for score in assessment.riasec_scores]
-    
-    # Bar Chart
-    plt.figure(figsize=(10, 6))
-    plt.bar(labels, values, color=['#FF4136', '#FFDC00', '#0074D9', '#2ECC40', '#FF851B', '#B10DC9'])
-    plt.title('RIASEC Scores')
-    plt.xlabel('Theme')
-    plt.ylabel('Score')
-    plt.grid(axis='y', linestyle='--')
-    bar_chart_path = os.path.join(output_dir, 'riasec_bar_chart.png')
-    plt.savefig(bar_chart_path)
-    plt.close()
-
-    # Radar Chart
-    num_vars = len(labels)
-    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
-    values += values[:1]
-    angles += angles[:1]
-
-    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-    ax.fill(angles, values, color='red', alpha=0.25)
-    ax.plot(angles, values, color='red', linewidth=2)
-    
-    ax.set_yticklabels([])
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(labels)
-
-    plt.title('RIASEC Profile', size=20, color='red', y=1.1)
-    radar_chart_path = os.path.join(output_dir, 'riasec_radar_chart.png')
-    plt.savefig(radar_chart_path)
-    plt.close()
+    labels, values = _scores(assessment)
+    _save(_bar_chart(labels, values), os.path.join(output_dir, 'riasec_bar_chart.png'))
+    _save(_radar_chart(labels, values), os.path.join(output_dir, 'riasec_radar_chart.png'))
 
     print(f"Charts saved to {os.path.abspath(output_dir)}")
 
@@ -62,31 +102,131 @@ def get_riasec_figures(assessment: HollandCodeAssessment):
     """
     if assessment is None:
         return None, None
-    labels = [score.theme for score in assessment.riasec_scores]
-    values = [score.score for score in assessment.riasec_scores]
-    
-    # Bar Chart
-    bar_fig, bar_ax = plt.subplots(figsize=(10, 6))
-    bar_ax.bar(labels, values, color=['#FF4136', '#FFDC00', '#0074D9', '#2ECC40', '#FF851B', '#B10DC9'])
-    bar_ax.set_title('RIASEC Scores')
-    bar_ax.set_xlabel('Theme')
-    bar_ax.set_ylabel('Score')
-    bar_ax.grid(axis='y', linestyle='--')
-
-    # Radar Chart
-    num_vars = len(labels)
-    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
-    radar_values = values + values[:1]
-    radar_angles = angles + angles[:1]
+    labels, values = _scores(assessment)
+    return _bar_chart(labels, values), _radar_chart(labels, values)
+
+
+def score_vector_hash(assessment: HollandCodeAssessment) -> str:
+    """Identifies the charts of an assessment: equal score vectors give equal charts."""
+    labels, values = _scores(assessment)
+    payload = json.dumps([labels, values], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def chart_paths(output_dir: str, vector_hash: str) -> tuple[str, str]:
+    """Returns the bar and radar chart paths of a score vector."""
+    return (
+        os.path.join(output_dir, f"riasec_{vector_hash}_bar.png"),
+        os.path.join(output_dir, f"riasec_{vector_hash}_radar.png"),
+    )
+
+
+def render_charts(assessment_json: str, output_dir: str) -> bool:
+    """
+    Renders the charts of a serialized assessment unless they already exist.
+
+    Returns:
+        True if the charts were rendered, False if they were already on disk.
+    """
+    assessment = HollandCodeAssessment.model_validate_json(assessment_json)
+    bar_path, radar_path = chart_paths(output_dir, score_vector_hash(assessment))
+    if os.path.exists(bar_path) and os.path.exists(radar_path):
+        return False
+    labels, values = _scores(assessment)
+    _save(_bar_chart(labels, values), bar_path)
+    _save(_radar_chart(labels, values), radar_path)
+    return True
+
+
+def _read_profiles(input_file: str) -> Iterator[tuple[str, CharacterProfile]]:
+    """
+    Yields (id, profile) pairs from a JSONL file of profiles.
+
+    Lines may be batch output records (with a `profile` field) or bare profiles;
+    records without a profile are skipped.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f_in:
+        for line_number, line in enumerate(f_in, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("profile"):
+                profile = CharacterProfile.model_validate(record["profile"])
+            elif "character_name" in record:
+                profile = CharacterProfile.model_validate(record)
+            else:
+                continue
+            record_id = record.get("id") or profile.character_id or str(line_number)
+            yield str(record_id), profile
+
+
+def batch_render_charts(input_file: str, output_dir: str, workers: Optional[int] = None) -> dict:
+    """
+    Renders the RIASEC charts of every profile of a JSONL file in a process pool.
+
+    Charts are named after the hash of their score vector, so profiles sharing
+    a score vector share their charts, and charts already on disk are skipped.
+    A `charts.jsonl` manifest maps every profile id to its chart files.
+
+    Args:
+        input_file: JSONL file of profiles or batch output records.
+        output_dir: The directory to save the charts and the manifest to.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        A dictionary of run statistics: the number of profiles, of unique
+        score vectors, of vectors rendered and skipped (charts already on
+        disk), of profiles sharing the vector of an earlier one (`shared`),
+        and renders per second.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    to_render = {}
+    profiles = 0
+
+    with open(os.path.join(output_dir, "charts.jsonl"), 'w', encoding='utf-8') as f_manifest:
+        for record_id, profile in _read_profiles(input_file):
+            assessment = profile.holland_code_assessment
+            if assessment is None or not assessment.riasec_scores:
+                continue
+            profiles += 1
+            vector_hash = score_vector_hash(assessment)
+            to_render.setdefault(vector_hash, assessment.model_dump_json())
+            bar_path, radar_path = chart_paths(output_dir, vector_hash)
+            f_manifest.write(json.dumps({"id": record_id, "bar_chart": bar_path, "radar_chart": radar_path}) + "\n")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rendered = sum(executor.map(
+            render_charts,
+            to_render.values(),
+            [output_dir] * len(to_render),
+            chunksize=max(len(to_render) // ((workers or os.cpu_count() or 1) * 4), 1),
+        ))
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "profiles": profiles,
+        "unique_score_vectors": len(to_render),
+        "rendered": rendered,
+        "skipped": len(to_render) - rendered,
+        "shared": profiles - len(to_render),
+        "elapsed_s": round(elapsed, 3),
+        "renders_per_s": round(rendered / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+    print(
+        f"Rendered charts for {stats['rendered']} score vectors ({stats['skipped']} already on disk, "
+        f"{stats['shared']} profiles sharing the score vector of another) "
+        f"in {stats['elapsed_s']}s: {stats['renders_per_s']} renders/s"
+    )
+    return stats
 
-    radar_fig, radar_ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-    radar_ax.fill(radar_angles, radar_values, color='red', alpha=0.25)
-    radar_ax.plot(radar_angles, radar_values, color='red', linewidth=2)
-    
-    radar_ax.set_yticklabels([])
-    radar_ax.set_xticks(angles)
-    radar_ax.set_xticklabels(labels)
 
-    radar_ax.set_title('RIASEC Profile', size=20, color='red', y=1.1)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the RIASEC charts of a batch of profiles.")
+    parser.add_argument("input_file", help="Path to the JSONL file of profiles (e.g. the batch output).")
+    parser.add_argument("output_dir", help="Directory to save the charts and the charts.jsonl manifest to.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs).")
+    args = parser.parse_args()
 
-    return bar_fig, radar_fig
\ No newline at end of file
+    batch_render_charts(args.input_file, args.output_dir, args.workers)
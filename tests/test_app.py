@@ -64,3 +64,350 @@ def test_generate_tcc_program_success(mock_get_genai_client):
 
     assert isinstance(program, TCCProgram)
     assert program.title == "Test Program"
+
+from app.services import generate_character_profile_stream
+
+def _chunk(text):
+    chunk = MagicMock()
+    chunk.text = text
+    return chunk
+
+@patch('app.services.get_genai_client')
+def test_generate_character_profile_stream_yields_sections(mock_get_genai_client):
+    """
+    Tests that the streaming generation yields a profile per completed section.
+    """
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    document = CharacterProfile(
+        character_name="Streamed Character",
+        profile_date="2024-01-01",
+        overall_assessment_summary="A streamed summary.",
+        diagnoses=[
+            {"disorder_name": "Trouble A", "dsm_category": "Cat A", "criteria_met": ["c1"]},
+            {"disorder_name": "Trouble B", "dsm_category": "Cat B", "criteria_met": ["c2"]},
+        ],
+    ).model_dump_json()
+    chunks = [document[i:i + 20] for i in range(0, len(document), 20)]
+    mock_client.models.generate_content_stream.return_value = iter([_chunk(c) for c in chunks])
+
+    profiles = list(generate_character_profile_stream("A streamed description.", "gemini-2.5-pro"))
+
+    assert len(profiles) > 2
+    assert profiles[-1].model_dump_json() == document
+    diagnosis_counts = [len(p.diagnoses) for p in profiles]
+    assert diagnosis_counts == sorted(diagnosis_counts)
+    assert profiles[0].diagnoses == []
+
+import asyncio
+from unittest.mock import AsyncMock
+from app.models import EvaluationResult
+from app.services import agenerate_character_profile, agenerate_tcc_program, aevaluate_profile_with_llm
+
+@pytest.mark.asyncio
+@patch('app.services.get_genai_client')
+async def test_async_services_use_the_async_client(mock_get_genai_client):
+    """
+    Tests that the async counterparts call the client's async surface.
+    """
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    profile = CharacterProfile(character_name="Async Character", profile_date="2024-01-01")
+    program = TCCProgram(title="Async Program", global_objective="An objective.")
+    evaluation = EvaluationResult(score=5, rationale="Identical.")
+    mock_client.aio.models.generate_content = AsyncMock(side_effect=[
+        MagicMock(parsed=profile), MagicMock(parsed=program), MagicMock(parsed=evaluation),
+    ])
+
+    generated = await agenerate_character_profile("An async description.", "gemini-2.5-pro")
+    generated_program = await agenerate_tcc_program(generated, "gemini-2.5-pro")
+    result = await aevaluate_profile_with_llm("An async description.", generated, profile, "gemini-2.5-pro")
+
+    assert generated == profile
+    assert generated_program == program
+    assert result == evaluation
+    assert mock_client.aio.models.generate_content.await_count == 3
+    mock_client.models.generate_content.assert_not_called()
+
+@pytest.mark.asyncio
+@patch('app.services.get_genai_client')
+async def test_async_generation_times_out(mock_get_genai_client):
+    """
+    Tests that a per-call timeout cancels a slow request.
+    """
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+
+    async def slow_call(**kwargs):
+        await asyncio.sleep(10)
+
+    mock_client.aio.models.generate_content = slow_call
+
+    with pytest.raises(asyncio.TimeoutError):
+        await agenerate_character_profile("A slow description.", "gemini-2.5-pro", timeout_s=0.05)
+
+@pytest.mark.asyncio
+@patch('app.services.get_rate_limiter')
+@patch('app.services.get_response_cache')
+@patch('app.services.get_genai_client')
+async def test_async_generation_keeps_cache_and_limiter_writes_off_the_event_loop(
+        mock_get_genai_client, mock_get_response_cache, mock_get_rate_limiter):
+    """
+    Tests that the blocking cache and rate-limiter calls run in a worker thread.
+    """
+    import threading
+
+    loop_thread = threading.get_ident()
+    threads = []
+    mock_cache = MagicMock(get=lambda key: threads.append(threading.get_ident()),
+                           set=lambda key, value: threads.append(threading.get_ident()))
+    mock_get_response_cache.return_value = mock_cache
+    mock_limiter = MagicMock(aacquire=AsyncMock(),
+                             record_usage=lambda model_id, extra: threads.append(threading.get_ident()))
+    mock_get_rate_limiter.return_value = mock_limiter
+    profile = CharacterProfile(character_name="Async Character", profile_date="2024-01-01")
+    mock_get_genai_client.return_value.aio.models.generate_content = AsyncMock(return_value=MagicMock(
+        parsed=profile, usage_metadata=MagicMock(total_token_count=100)))
+
+    assert await agenerate_character_profile("An async description.", "gemini-2.5-pro") == profile
+
+    assert len(threads) == 3
+    assert loop_thread not in threads
+
+from app.models import CharacterProfileList
+from app.services import generate_character_profiles, generate_packed_profiles, pack_descriptions
+
+def test_pack_descriptions_respects_the_output_token_budget():
+    items = [(str(i), "short") for i in range(10)]
+
+    packs = list(pack_descriptions(items, max_pack_size=8, max_output_tokens=1024 + 3 * 1600))
+
+    assert [len(pack) for pack in packs] == [3, 3, 3, 1]
+    assert [item for pack in packs for item in pack] == items
+
+def test_pack_descriptions_never_repeats_an_id_in_a_pack():
+    packs = list(pack_descriptions([("a", "x"), ("a", "y"), ("b", "z")]))
+
+    assert packs == [[("a", "x")], [("a", "y"), ("b", "z")]]
+
+@patch('app.services.get_genai_client')
+def test_generate_packed_profiles_salvages_well_formed_items(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    good = CharacterProfile(character_name="A", profile_date="2024-01-01", character_id="a")
+    mock_response = MagicMock()
+    mock_response.parsed = None
+    # The second profile is malformed and the response was cut off in the third one.
+    mock_response.text = f'[{good.model_dump_json()}, {{"character_id": "b"}}, {{"character_name": "C", "character_id": "c"'
+    mock_client.models.generate_content.return_value = mock_response
+
+    profiles = generate_packed_profiles([("a", "A."), ("b", "B."), ("c", "C.")], "gemini-2.5-pro", use_cache=False)
+
+    assert profiles == {"a": good}
+    prompt = mock_client.models.generate_content.call_args.kwargs["contents"]
+    assert "Character Description (id: b):\nB." in prompt
+
+@patch('app.services.get_genai_client')
+def test_generate_character_profiles_resubmits_missing_items(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    packed = MagicMock()
+    packed.parsed = CharacterProfileList([
+        CharacterProfile(character_name="A", profile_date="2024-01-01", character_id="a"),
+        CharacterProfile(character_name="Unknown", profile_date="2024-01-01", character_id="z"),
+    ])
+    single = MagicMock()
+    single.parsed = CharacterProfile(character_name="B", profile_date="2024-01-01")
+    mock_client.models.generate_content.side_effect = [packed, single]
+
+    profiles = generate_character_profiles({"a": "A.", "b": "B."}, "gemini-2.5-pro", use_cache=False)
+
+    assert [p.character_name for p in profiles.values()] == ["A", "B"]
+    assert list(profiles) == ["a", "b"]
+    assert mock_client.models.generate_content.call_count == 2
+
+@patch('app.services.get_genai_client')
+def test_generate_character_profiles_logs_a_failed_pack(mock_get_genai_client, caplog):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    single = MagicMock()
+    single.parsed = CharacterProfile(character_name="A", profile_date="2024-01-01")
+    mock_client.models.generate_content.side_effect = [ValueError("bad pack"), single]
+
+    with caplog.at_level("WARNING", logger="app.services"):
+        profiles = generate_character_profiles({"a": "A."}, "gemini-2.5-pro", use_cache=False)
+
+    assert profiles["a"].character_name == "A"
+    assert "Packed request of 1 descriptions failed" in caplog.text
+
+from app.services import get_last_usage
+
+@patch('app.services.get_genai_client')
+def test_get_last_usage_reports_the_token_counts_of_the_call(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    mock_response = MagicMock()
+    mock_response.parsed = CharacterProfile(character_name="Usage", profile_date="2024-01-01")
+    mock_response.usage_metadata.prompt_token_count = 1200
+    mock_response.usage_metadata.candidates_token_count = 800
+    mock_response.usage_metadata.total_token_count = 2000
+    mock_client.models.generate_content.return_value = mock_response
+
+    generate_character_profile("Usage description.", "gemini-2.5-pro", use_cache=False)
+    assert get_last_usage() == {"prompt_tokens": 1200, "output_tokens": 800, "total_tokens": 2000}
+
+    generate_character_profile("Usage description.", "gemini-2.5-pro")
+    assert get_last_usage() is None
+
+from app.models import DiagnosisEntry, HollandCode, HollandCodeAssessment
+from app.services import generate_character_profile_cascade, get_cascade_stats, get_last_cascade, reset_cascade_stats
+
+def _valid_profile(name):
+    return CharacterProfile(
+        character_name=name,
+        profile_date="2024-01-01",
+        overall_assessment_summary="A test summary.",
+        holland_code_assessment=HollandCodeAssessment(
+            riasec_scores=[HollandCode(theme=theme, score=score, description="...")
+                           for theme, score in zip("RIASEC", [2, 9, 3, 2, 3, 8])],
+            top_themes=["Investigative", "Conventional"],
+            summary="...",
+        ),
+        diagnoses=[DiagnosisEntry(disorder_name="Trouble", dsm_category="Catégorie",
+                                  dsm_code="301.4 (F60.5)", criteria_met=["A1"])],
+    )
+
+def test_cascade_escalates_only_the_profiles_failing_the_checks():
+    reset_cascade_stats()
+    incomplete = CharacterProfile(character_name="Fast", profile_date="2024-01-01")
+
+    def generate(description, model_id, use_cache=True):
+        if model_id == "gemini-2.5-pro":
+            return _valid_profile("Strong")
+        return _valid_profile("Fast") if description == "good" else incomplete
+
+    with patch('app.services.generate_character_profile', side_effect=generate) as mock_generate:
+        assert generate_character_profile_cascade("good").character_name == "Fast"
+        assert get_last_cascade()["escalated"] is False
+        assert generate_character_profile_cascade("bad").character_name == "Strong"
+
+    cascade = get_last_cascade()
+    assert cascade["model_id"] == "gemini-2.5-pro"
+    assert cascade["problems"] == ["overall assessment summary missing", "Holland Code assessment missing"]
+    assert set(cascade["usage"]) == {"gemini-2.5-flash", "gemini-2.5-pro"}
+    assert mock_generate.call_count == 3
+    assert get_cascade_stats() == {"calls": 2, "escalations": 1, "escalation_rate": 0.5}
+
+    # An unparsable answer escalates too, other errors are raised.
+    with patch('app.services.generate_character_profile', side_effect=[ValueError("bad JSON"), _valid_profile("Strong")]):
+        assert generate_character_profile_cascade("bad").character_name == "Strong"
+    with patch('app.services.generate_character_profile', side_effect=PermissionError("denied")):
+        with pytest.raises(PermissionError):
+            generate_character_profile_cascade("bad")
+    reset_cascade_stats()
+
+from app.models import DiagnosisEntryList
+from app.repair import IncompleteProfileError
+
+def _truncated_document():
+    document = _valid_profile("Truncated").model_dump_json()
+    return document[:document.index('"criteria_met"')]
+
+@patch('app.services.get_genai_client')
+def test_truncated_profile_is_repaired_with_a_section_request(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    entry = DiagnosisEntry(disorder_name="Trouble", dsm_category="Catégorie", dsm_code="301.4", criteria_met=["A1"])
+    mock_client.models.generate_content.side_effect = [
+        MagicMock(parsed=None, text=_truncated_document()),
+        MagicMock(parsed=DiagnosisEntryList([entry])),
+    ]
+
+    profile = generate_character_profile("A truncated description.", "gemini-2.5-pro", use_cache=False)
+
+    assert profile.holland_code_assessment is not None
+    assert profile.diagnoses == [entry]
+    section_prompt = mock_client.models.generate_content.call_args_list[1].kwargs["contents"]
+    assert "cut off after 0 diagnoses" in section_prompt
+    assert "A truncated description." in section_prompt
+
+@patch('app.services.get_genai_client')
+def test_profile_truncated_before_the_diagnoses_is_regenerated_once(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    valid = _valid_profile("Truncated")
+    document = valid.model_dump_json()
+    mock_client.models.generate_content.side_effect = [
+        MagicMock(parsed=None, text=document[:document.index('"top_themes"')]),
+        MagicMock(parsed=valid),
+    ]
+
+    profile = generate_character_profile("A truncated description.", "gemini-2.5-pro", use_cache=False)
+
+    assert profile == valid
+    first, second = mock_client.models.generate_content.call_args_list
+    assert second.kwargs["config"].response_schema is CharacterProfile
+    assert second.kwargs["config"].max_output_tokens > first.kwargs["config"].max_output_tokens
+
+@patch('app.services.get_genai_client')
+def test_stream_repairs_or_rejects_a_truncated_profile(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    text = _truncated_document()
+    mock_client.models.generate_content_stream.side_effect = lambda **kwargs: iter([_chunk(text)])
+    mock_client.models.generate_content.side_effect = [
+        MagicMock(parsed=DiagnosisEntryList([])),
+        MagicMock(parsed=None, text="not JSON"),
+    ]
+
+    profiles = list(generate_character_profile_stream("A truncated stream.", "gemini-2.5-pro", use_cache=False))
+    assert profiles[-1].holland_code_assessment is not None
+    assert profiles[-1].diagnoses == []
+
+    with pytest.raises(IncompleteProfileError):
+        list(generate_character_profile_stream("A truncated stream.", "gemini-2.5-pro", use_cache=False))
+
+from app.models import AssessmentSummary, DiagnosticAssessment
+from app.services import agenerate_character_profile_split, generate_character_profile_split
+
+def _split_response(**kwargs):
+    schema = kwargs["config"].response_schema
+    if schema is DiagnosticAssessment:
+        return MagicMock(parsed=DiagnosticAssessment(character_name="Split", clinical_summary="Clinique.",
+                                                     diagnoses=_valid_profile("Split").diagnoses))
+    if schema is HollandCodeAssessment:
+        return MagicMock(parsed=_valid_profile("Split").holland_code_assessment)
+    return MagicMock(parsed=AssessmentSummary(overall_assessment_summary="Résumé global."))
+
+@patch('app.services.get_genai_client')
+def test_split_generation_merges_the_two_requests(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    mock_client.models.generate_content.side_effect = _split_response
+
+    profile = generate_character_profile_split("A split description.", "gemini-2.5-pro", use_cache=False)
+    assert profile.character_name == "Split"
+    assert profile.overall_assessment_summary == "Clinique. ..."
+    assert profile.holland_code_assessment == _valid_profile("Split").holland_code_assessment
+    assert len(profile.diagnoses) == 1
+    assert mock_client.models.generate_content.call_count == 2
+
+    profile = generate_character_profile_split("A split description.", "gemini-2.5-pro", use_cache=False,
+                                               summary="model")
+    assert profile.overall_assessment_summary == "Résumé global."
+    assert mock_client.models.generate_content.call_count == 5
+
+    with pytest.raises(ValueError):
+        generate_character_profile_split("A split description.", "gemini-2.5-pro", summary="remote")
+
+@pytest.mark.asyncio
+@patch('app.services.get_genai_client')
+async def test_async_split_generation_awaits_both_requests(mock_get_genai_client):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    mock_client.aio.models.generate_content = AsyncMock(side_effect=_split_response)
+
+    profile = await agenerate_character_profile_split("An async split description.", "gemini-2.5-pro", use_cache=False)
+
+    assert profile.character_name == "Split"
+    assert mock_client.aio.models.generate_content.await_count == 2
@@ -1,31 +1,310 @@
 import os
 import json
+import time
 import pytest
-from app.batch import batch_process
+from app.batch import batch_process, read_records
 from unittest.mock import patch
-from app.models import CharacterProfile
+from app.models import CharacterProfile, TCCProgram
+
+def _profile(name):
+    return CharacterProfile(
+        character_name=name,
+        profile_date="2024-01-01",
+        overall_assessment_summary="A test summary.",
+        diagnoses=[],
+        holland_code_assessment=None,
+    )
 
 def test_batch_process(tmp_path):
     input_file = tmp_path / "input.txt"
-    output_file = tmp_path / "output.json"
+    output_file = tmp_path / "output.jsonl"
 
     with open(input_file, "w") as f:
         f.write("Test character 1\n")
+        f.write("\n")
         f.write("Test character 2\n")
 
-    mock_profile = CharacterProfile(
-        character_name="Test Character",
-        profile_date="2024-01-01",
-        overall_assessment_summary="A test summary.",
-        diagnoses=[],
-        holland_code_assessment=None,
+    mock_profile = _profile("Test Character")
+
+    with patch('app.batch.generate_character_profile', return_value=mock_profile) as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro")
+
+    assert os.path.exists(output_file)
+    assert mock_generate.call_count == 2
+    assert stats["total"] == 2
+    assert stats["failed"] == 0
+
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["id"] for r in records] == ["1", "3"]
+    assert all(r["profile"]["character_name"] == "Test Character" for r in records)
+
+def test_batch_process_keeps_input_order_with_concurrency(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("slow\nfast\nmedium\n")
+    delays = {"slow": 0.2, "fast": 0.0, "medium": 0.1}
+
+    def fake_generate(description, model_id):
+        time.sleep(delays[description])
+        return _profile(description)
+
+    with patch('app.batch.generate_character_profile', side_effect=fake_generate):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", concurrency=3)
+
+    with open(output_file, "r") as f:
+        names = [json.loads(line)["profile"]["character_name"] for line in f]
+    assert names == ["slow", "fast", "medium"]
+
+def test_batch_process_records_errors(tmp_path):
+    input_file = tmp_path / "input.jsonl"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text(
+        json.dumps({"id": "a", "description": "ok"}) + "\n"
+        + json.dumps({"id": "b", "description": "boom"}) + "\n"
     )
 
-    with patch('app.batch.generate_character_profile', return_value=mock_profile):
+    def fake_generate(description, model_id):
+        if description == "boom":
+            raise RuntimeError("quota exceeded")
+        return _profile(description)
+
+    with patch('app.batch.generate_character_profile', side_effect=fake_generate):
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", concurrency=2)
+
+    with open(output_file, "r") as f:
+        records = {r["id"]: r for r in map(json.loads, f)}
+    assert records["a"]["profile"]["character_name"] == "ok"
+    assert records["b"]["error"] == "RuntimeError: quota exceeded"
+    assert stats["failed"] == 1
+    assert stats["p95_latency_s"] >= stats["p50_latency_s"]
+
+def test_read_records_jsonl_defaults_id_to_line_number(tmp_path):
+    input_file = tmp_path / "input.jsonl"
+    input_file.write_text(json.dumps({"description": "first"}) + "\n")
+
+    assert list(read_records(str(input_file))) == [{"id": "1", "description": "first"}]
+
+def test_batch_process_resume_skips_completed_records(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("first\nsecond\nthird\n")
+
+    def flaky_generate(description, model_id):
+        if description == "third":
+            raise RuntimeError("preempted")
+        return _profile(description)
+
+    with patch('app.batch.generate_character_profile', side_effect=flaky_generate):
         batch_process(str(input_file), str(output_file), "gemini-2.5-pro")
 
-    assert os.path.exists(output_file)
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)) as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", resume=True)
+
+    assert mock_generate.call_count == 1
+    assert mock_generate.call_args.args[0] == "third"
+    assert stats["skipped"] == 2
+
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["id"] for r in records if "profile" in r] == ["1", "2", "3"]
+    with open(str(output_file) + ".journal", "r") as f:
+        assert len(f.read().split()) == 3
+
+def test_batch_process_resume_replaces_the_lines_of_retried_records(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("first\nsecond\n")
+    program = TCCProgram(title="Programme", global_objective="Objectif")
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)), \
+            patch('app.batch.generate_tcc_program', side_effect=[program, RuntimeError("timeout")]):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", with_tcc=True)
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)), \
+            patch('app.batch.generate_tcc_program', return_value=program):
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", resume=True, with_tcc=True)
+
+    assert stats["skipped"] == 1
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["id"] for r in records] == ["1", "2"]
+    assert not any("error" in r for r in records)
+
+def test_batch_process_resume_drops_partially_written_line(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("first\n")
+    output_file.write_text('{"index": 0, "id": "1", "prof')
+
+    with patch('app.batch.generate_character_profile', return_value=_profile("first")):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", resume=True)
 
     with open(output_file, "r") as f:
-        profile = json.load(f)
-        assert profile["character_name"] == "Test Character"
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]["profile"]["character_name"] == "first"
+
+def test_batch_process_with_tcc_pipelines_both_stages(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("first\nsecond\nthird\n")
+    program = TCCProgram(title="Programme", global_objective="Objectif")
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)), \
+            patch('app.batch.generate_tcc_program', return_value=program) as mock_tcc:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", concurrency=2, with_tcc=True)
+
+    assert mock_tcc.call_count == 3
+    assert stats["failed"] == 0
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["profile"]["character_name"] for r in records] == ["first", "second", "third"]
+    assert all(r["tcc_program"]["title"] == "Programme" for r in records)
+
+def test_batch_process_with_tcc_records_tcc_failures(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("first\n")
+
+    with patch('app.batch.generate_character_profile', return_value=_profile("first")), \
+            patch('app.batch.generate_tcc_program', side_effect=RuntimeError("timeout")):
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", with_tcc=True)
+
+    with open(output_file, "r") as f:
+        record = json.loads(f.readline())
+    assert record["profile"]["character_name"] == "first"
+    assert record["error"] == "TCC generation failed: RuntimeError: timeout"
+    assert stats["failed"] == 1
+
+def test_batch_process_packs_records_and_retries_missing_ones_individually(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("one\ntwo\nthree\n")
+
+    def fake_packed(items, model_id):
+        # The model drops the second description of the pack.
+        return {item_id: _profile(description).model_copy(update={"character_id": item_id})
+                for item_id, description in items if description != "two"}
+
+    with patch('app.batch.generate_packed_profiles', side_effect=fake_packed) as mock_packed, \
+            patch('app.batch.generate_character_profile', return_value=_profile("two")) as mock_single:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", pack_size=3)
+
+    assert mock_packed.call_count == 1
+    mock_single.assert_called_once_with("two", "gemini-2.5-pro")
+    assert stats["succeeded"] == 3
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["profile"]["character_name"] for r in records] == ["one", "two", "three"]
+    assert [r["id"] for r in records] == ["1", "2", "3"]
+    assert all(r["profile"]["character_id"] is None for r in records)
+
+def test_batch_process_logs_a_failed_pack(tmp_path, caplog):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("one\ntwo\n")
+
+    with patch('app.batch.generate_packed_profiles', side_effect=ValueError("bad pack")), \
+            patch('app.batch.generate_character_profile', side_effect=lambda description, model_id: _profile(description)), \
+            caplog.at_level("WARNING", logger="app.batch"):
+        stats = batch_process(str(input_file), str(tmp_path / "output.jsonl"), "gemini-2.5-pro", pack_size=2)
+
+    assert stats["succeeded"] == 2
+    assert "Packed request of 2 records failed, retrying them individually: ValueError: bad pack" in caplog.text
+
+from app.batch import preflight_batch
+from app.services import count_profile_tokens
+
+def test_batch_process_rejects_or_truncates_records_above_the_token_budget(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("short\n" + "word " * 2000 + "\n")
+    budget = count_profile_tokens("short", "gemini-2.5-pro") + 100
+
+    with patch('app.batch.generate_character_profile', return_value=_profile("ok")) as mock_generate:
+        stats = batch_process(str(input_file), str(tmp_path / "rejected.jsonl"), "gemini-2.5-pro",
+                              max_input_tokens=budget)
+    assert mock_generate.call_count == 1
+    assert stats["rejected"] == 1
+    with open(tmp_path / "rejected.jsonl", "r") as f:
+        records = [json.loads(line) for line in f]
+    assert records[1]["error"].startswith("PreflightError")
+
+    with patch('app.batch.generate_character_profile', return_value=_profile("ok")) as mock_generate:
+        stats = batch_process(str(input_file), str(tmp_path / "truncated.jsonl"), "gemini-2.5-pro",
+                              max_input_tokens=budget, on_oversize="truncate")
+    assert stats["truncated"] == 1 and stats["failed"] == 0
+    truncated = mock_generate.call_args_list[1].args[0]
+    assert truncated.startswith("word") and len(truncated) < 2000 * 5
+    assert count_profile_tokens(truncated, "gemini-2.5-pro") <= budget
+
+def test_batch_process_reports_token_usage_and_cost_by_model(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("one\ntwo\n")
+    usage = {"prompt_tokens": 1000, "output_tokens": 500, "thinking_tokens": 500, "total_tokens": 2000}
+
+    with patch('app.batch.generate_character_profile', return_value=_profile("ok")), \
+            patch('app.batch.get_last_usage', return_value=usage):
+        stats = batch_process(str(input_file), str(tmp_path / "output.jsonl"), "gemini-2.5-pro")
+
+    report = stats["usage"]["gemini-2.5-pro"]
+    assert report["requests"] == 2
+    assert report["prompt_tokens"] == 2000 and report["thinking_tokens"] == 1000
+    assert report["estimated_cost_usd"] == pytest.approx((2000 * 1.25 + 2000 * 10.0) / 1_000_000, abs=1e-4)
+
+def test_preflight_batch_counts_without_generating(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("short\n" + "word " * 2000 + "\n")
+    budget = count_profile_tokens("short", "gemini-2.5-pro") + 100
+
+    with patch('app.batch.generate_character_profile') as mock_generate:
+        report = preflight_batch(str(input_file), "gemini-2.5-pro", max_input_tokens=budget)
+
+    mock_generate.assert_not_called()
+    assert report["records"] == 2 and report["accepted"] == 1 and report["rejected"] == 1
+    assert report["input_tokens"] == count_profile_tokens("short", "gemini-2.5-pro")
+    assert report["estimated_cost_usd"] > 0
+
+def test_batch_process_cascade_reports_the_escalation_rate(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("Simple\nHard\n")
+
+    def generate(description, fast_model_id, model_id):
+        from app.services import _last_cascade
+        escalated = description == "Hard"
+        _last_cascade.set({"fast_model_id": fast_model_id, "strong_model_id": model_id,
+                           "model_id": model_id if escalated else fast_model_id, "escalated": escalated,
+                           "problems": ["top themes missing"] if escalated else [],
+                           "usage": {fast_model_id: {"prompt_tokens": 100, "output_tokens": 50},
+                                     **({model_id: {"prompt_tokens": 100, "output_tokens": 80}} if escalated else {})}})
+        return _profile(description)
+
+    with patch('app.batch.generate_character_profile_cascade', side_effect=generate), \
+            patch('app.batch.generate_character_profile') as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", fast_model_id="gemini-2.5-flash")
+
+    assert mock_generate.call_count == 0
+    assert stats["cascade"] == {"fast_model_id": "gemini-2.5-flash", "strong_model_id": "gemini-2.5-pro",
+                                "profiles": 2, "escalated": 1, "escalation_rate": 0.5}
+    assert stats["usage"]["gemini-2.5-flash"]["requests"] == 2
+    assert stats["usage"]["gemini-2.5-pro"]["requests"] == 1
+    records = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert [r["cascade"]["model_id"] for r in records] == ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+    with pytest.raises(ValueError):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", pack_size=2, fast_model_id="gemini-2.5-flash")
+
+def test_batch_process_split_strategy(tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.jsonl"
+    input_file.write_text("Split character\n")
+
+    with patch('app.batch.generate_character_profile_split', return_value=_profile("Split")) as mock_split, \
+            patch('app.batch.generate_character_profile') as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", split="model")
+
+    assert stats["succeeded"] == 1
+    assert mock_generate.call_count == 0
+    assert mock_split.call_args.kwargs == {"summary": "model"}
+    with pytest.raises(ValueError):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", split="model", fast_model_id="gemini-2.5-flash")
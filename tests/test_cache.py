@@ -0,0 +1,117 @@
+import sqlite3
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app import cache
+from app.cache import DiskCache, LRUCache, ResponseCache, make_key
+from app.models import CharacterProfile, TCCProgram
+from app.services import generate_character_profile
+
+@pytest.fixture
+def response_cache():
+    response_cache = ResponseCache(LRUCache(maxsize=8))
+    cache.set_response_cache(response_cache)
+    yield response_cache
+    cache.set_response_cache(None)
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", "1")
+    lru.set("b", "2")
+    assert lru.get("a") == "1"
+    lru.set("c", "3")
+
+    assert lru.get("b") is None
+    assert lru.get("a") == "1"
+    assert len(lru) == 2
+
+def test_disk_cache_expires_entries_after_ttl(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite"), ttl_s=60)
+    with patch('app.cache.time.time', return_value=1000.0):
+        disk.set("key", "value")
+        assert disk.get("key") == "value"
+    with patch('app.cache.time.time', return_value=1061.0):
+        assert disk.get("key") is None
+
+def test_disk_cache_evicts_by_size(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    now = time.time()
+    with patch('app.cache.time.time', side_effect=[now - 2, now - 1]):
+        disk.set("old", "x" * 6)
+        disk.set("new", "y" * 6)
+
+    assert disk.get("old") is None
+    assert disk.get("new") == "y" * 6
+
+def test_disk_cache_closes_its_connections(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite"))
+    connections = []
+    connect = sqlite3.connect
+
+    def tracked_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    with patch('app.cache.sqlite3.connect', side_effect=tracked_connect):
+        disk.set("key", "value")
+        assert disk.get("key") == "value"
+
+    assert len(connections) == 2
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+def test_response_cache_promotes_disk_hits_and_counts(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite"))
+    disk.set("key", "value")
+    response_cache = ResponseCache(LRUCache(maxsize=4), disk)
+
+    assert response_cache.get("missing") is None
+    assert response_cache.get("key") == "value"
+    assert response_cache.get("key") == "value"
+
+    stats = response_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["hits"] == 2
+
+def test_make_key_depends_on_model_prompt_and_schema():
+    key = make_key("gemini-2.5-pro", "prompt", {"temperature": 0}, CharacterProfile)
+
+    assert key == make_key("gemini-2.5-pro", "prompt", {"temperature": 0}, CharacterProfile)
+    assert key != make_key("gemini-2.5-flash", "prompt", {"temperature": 0}, CharacterProfile)
+    assert key != make_key("gemini-2.5-pro", "other prompt", {"temperature": 0}, CharacterProfile)
+    assert key != make_key("gemini-2.5-pro", "prompt", {"temperature": 1}, CharacterProfile)
+    assert key != make_key("gemini-2.5-pro", "prompt", {"temperature": 0}, TCCProgram)
+
+def test_make_key_follows_changes_to_a_config_object():
+    from google.genai import types
+    config = types.GenerateContentConfig(temperature=0)
+    key = make_key("gemini-2.5-pro", "prompt", config, CharacterProfile)
+    config.temperature = 1
+
+    assert key != make_key("gemini-2.5-pro", "prompt", config, CharacterProfile)
+
+@patch('app.services.get_genai_client')
+def test_generate_character_profile_is_served_from_cache(mock_get_genai_client, response_cache):
+    mock_client = MagicMock()
+    mock_get_genai_client.return_value = mock_client
+    mock_response = MagicMock()
+    mock_response.parsed = CharacterProfile(character_name="Cached", profile_date="2024-01-01")
+    mock_client.models.generate_content.return_value = mock_response
+
+    first = generate_character_profile("Same description.", "gemini-2.5-pro")
+    second = generate_character_profile("Same description.", "gemini-2.5-pro")
+
+    assert mock_client.models.generate_content.call_count == 1
+    assert second == first
+    assert response_cache.stats()["hits"] == 1
+
+    generate_character_profile("Same description.", "gemini-2.5-pro", use_cache=False)
+    assert mock_client.models.generate_content.call_count == 2
+
+def test_normalize_text_collapses_whitespace_and_unicode_forms():
+    assert cache.normalize_text("  Un  patient\n\tcalme ") == "Un patient calme"
+    assert cache.normalize_text("énergique") == cache.normalize_text("énergique")
@@ -0,0 +1,79 @@
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app import clients
+
+@pytest.fixture(autouse=True)
+def reset_shared_clients():
+    clients.reset_clients()
+    yield
+    clients.configure(max_connections=clients.DEFAULT_MAX_CONNECTIONS, timeout_s=None, base_url=None)
+
+@patch('google.genai.Client')
+def test_get_client_reuses_instance_per_project_and_location(mock_client_cls):
+    mock_client_cls.side_effect = lambda **kwargs: MagicMock()
+
+    first = clients.get_client("project-a", "us-central1")
+    second = clients.get_client("project-a", "us-central1")
+    other = clients.get_client("project-b", "us-central1")
+
+    assert first is second
+    assert other is not first
+    assert mock_client_cls.call_count == 2
+
+@patch('google.genai.Client')
+def test_get_client_is_thread_safe(mock_client_cls):
+    mock_client_cls.side_effect = lambda **kwargs: MagicMock()
+    results = []
+
+    def worker():
+        results.append(clients.get_client("project-a", "europe-west1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert mock_client_cls.call_count == 1
+    assert all(client is results[0] for client in results)
+
+@patch('google.genai.Client')
+def test_configure_applies_pool_size_and_timeout(mock_client_cls):
+    clients.get_client("project-a", "us-central1")
+    clients.configure(max_connections=5, timeout_s=30)
+    clients.get_client("project-a", "us-central1")
+
+    assert mock_client_cls.call_count == 2
+    http_options = mock_client_cls.call_args.kwargs["http_options"]
+    assert http_options.timeout == 30000
+    assert http_options.client_args["limits"].max_connections == 5
+
+def test_configure_leaves_omitted_settings_unchanged():
+    clients.configure(timeout_s=30, base_url="http://127.0.0.1:8089")
+    clients.configure(max_connections=5)
+
+    assert clients.get_settings() == {"max_connections": 5, "timeout_s": 30, "base_url": "http://127.0.0.1:8089"}
+
+def test_configure_rejects_empty_pool():
+    with pytest.raises(ValueError):
+        clients.configure(max_connections=0)
+
+@patch('google.genai.Client')
+def test_reset_after_fork_drops_clients(mock_client_cls):
+    clients.get_client("project-a", "us-central1")
+    clients._reset_after_fork()
+    clients.get_client("project-a", "us-central1")
+
+    assert mock_client_cls.call_count == 2
+
+@patch('google.genai.Client')
+def test_base_url_switches_to_the_gemini_api_protocol(mock_client_cls):
+    clients.configure(base_url="http://127.0.0.1:8089")
+    clients.get_client("project-a", "us-central1")
+
+    kwargs = mock_client_cls.call_args.kwargs
+    assert "vertexai" not in kwargs
+    assert kwargs["api_key"]
+    assert kwargs["http_options"].base_url == "http://127.0.0.1:8089"
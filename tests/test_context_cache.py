@@ -0,0 +1,133 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from google.genai import errors
+
+from app import services
+from app.cache import LRUCache, ResponseCache, set_response_cache
+from app.context_cache import ContextCacheManager, set_context_cache
+from app.models import CharacterProfile
+
+@pytest.fixture(autouse=True)
+def isolated_caches():
+    set_response_cache(ResponseCache(LRUCache(16), enabled=False))
+    yield
+    set_response_cache(None)
+    set_context_cache(None)
+
+def _client(name="cachedContents/123"):
+    client = MagicMock()
+    client.caches.create.return_value = MagicMock(name="cached")
+    client.caches.create.return_value.name = name
+    return client
+
+def test_disabled_manager_never_creates_a_cache():
+    client = _client()
+    manager = ContextCacheManager(enabled=False)
+
+    assert manager.lookup(client, "gemini-2.5-pro", "prefix") is None
+    client.caches.create.assert_not_called()
+
+def test_cache_is_created_once_per_model_and_extended_before_expiry():
+    client = _client()
+    manager = ContextCacheManager(enabled=True, ttl_s=3600, refresh_margin_s=300, min_tokens=1)
+
+    with patch('app.context_cache.time.time', return_value=1000.0):
+        assert manager.lookup(client, "gemini-2.5-pro", "prefix") == "cachedContents/123"
+        assert manager.lookup(client, "gemini-2.5-pro", "prefix") == "cachedContents/123"
+        manager.lookup(client, "gemini-2.5-flash", "prefix")
+    assert client.caches.create.call_count == 2
+    client.caches.update.assert_not_called()
+
+    with patch('app.context_cache.time.time', return_value=1000.0 + 3400):
+        assert manager.lookup(client, "gemini-2.5-pro", "prefix") == "cachedContents/123"
+    client.caches.update.assert_called_once()
+    assert client.caches.create.call_count == 2
+
+def test_unavailable_caching_falls_back_and_retries_later():
+    client = _client()
+    client.caches.create.side_effect = RuntimeError("prefix too small")
+    manager = ContextCacheManager(enabled=True, retry_after_s=600, min_tokens=1)
+
+    with patch('app.context_cache.time.time', return_value=1000.0):
+        assert manager.lookup(client, "gemini-2.5-pro", "prefix") is None
+        assert manager.lookup(client, "gemini-2.5-pro", "prefix") is None
+    assert client.caches.create.call_count == 1
+
+    with patch('app.context_cache.time.time', return_value=1700.0):
+        manager.lookup(client, "gemini-2.5-pro", "prefix")
+    assert client.caches.create.call_count == 2
+
+@patch('app.services.get_genai_client')
+def test_profile_requests_send_only_the_suffix_with_the_cache_reference(mock_get_genai_client):
+    client = _client()
+    mock_get_genai_client.return_value = client
+    client.models.generate_content.return_value.parsed = CharacterProfile(character_name="A", profile_date="2024-01-01")
+    set_context_cache(ContextCacheManager(enabled=True, min_tokens=1))
+
+    services.generate_character_profile("A description.", "gemini-2.5-pro")
+
+    kwargs = client.models.generate_content.call_args.kwargs
+    assert services.SYSTEM_PROMPT not in kwargs["contents"]
+    assert "A description." in kwargs["contents"]
+    assert "Today's date" in kwargs["contents"]
+    assert kwargs["config"].cached_content == "cachedContents/123"
+    assert client.caches.create.call_args.kwargs["config"].contents == [services.SYSTEM_PROMPT]
+
+@patch('app.services.get_genai_client')
+def test_rejected_cache_falls_back_to_the_full_prompt(mock_get_genai_client):
+    client = _client()
+    mock_get_genai_client.return_value = client
+    expected = CharacterProfile(character_name="A", profile_date="2024-01-01")
+    client.models.generate_content.side_effect = [
+        errors.ClientError(404, {"error": {"message": "CachedContent not found (or permission denied)", "status": "NOT_FOUND"}}),
+        MagicMock(parsed=expected),
+    ]
+    manager = ContextCacheManager(enabled=True, min_tokens=1)
+    set_context_cache(manager)
+
+    assert services.generate_character_profile("A description.", "gemini-2.5-pro") == expected
+
+    retry = client.models.generate_content.call_args.kwargs
+    assert retry["contents"].startswith(services.SYSTEM_PROMPT)
+    assert retry["config"].cached_content is None
+    assert manager._entries == {}
+
+def test_prefixes_under_the_model_minimum_are_not_cached(caplog):
+    client = _client()
+    manager = ContextCacheManager(enabled=True)
+
+    assert manager.lookup(client, "gemini-2.5-pro", services.SYSTEM_PROMPT) is None
+    assert manager.lookup(client, "gemini-2.5-flash", services.SYSTEM_PROMPT_DIAGNOSES) is None
+    assert manager.lookup(client, "gemini-2.5-flash", services.SYSTEM_PROMPT) == "cachedContents/123"
+    client.caches.create.assert_called_once()
+    assert not caplog.text
+
+@patch('app.services.get_genai_client')
+def test_other_client_errors_are_not_taken_for_a_rejected_cache(mock_get_genai_client):
+    client = _client()
+    mock_get_genai_client.return_value = client
+    client.models.generate_content.side_effect = errors.ClientError(
+        400, {"error": {"message": "Request contains an invalid argument.", "status": "INVALID_ARGUMENT"}})
+    set_context_cache(ContextCacheManager(enabled=True, min_tokens=1))
+
+    with pytest.raises(errors.ClientError):
+        services.generate_character_profile("A description.", "gemini-2.5-pro")
+    assert client.models.generate_content.call_count == 1
+
+@patch('app.services.get_genai_client')
+def test_split_requests_are_not_context_cached(mock_get_genai_client):
+    client = _client()
+    mock_get_genai_client.return_value = client
+    client.models.generate_content.return_value.parsed = None
+    set_context_cache(ContextCacheManager(enabled=True, min_tokens=1))
+
+    services.generate_character_profile_split("A description.", "gemini-2.5-pro", use_cache=False)
+
+    client.caches.create.assert_not_called()
+
+def test_system_prompt_does_not_depend_on_the_date():
+    prompt, _ = services._profile_request("A description.")
+
+    assert prompt.startswith(services.SYSTEM_PROMPT)
+    assert services.date.today().isoformat() not in services.SYSTEM_PROMPT
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+from unittest.mock import patch
+
+from app.batch import batch_process
+from app.dedup import (
+    cluster_signatures,
+    dedup_report,
+    find_near_duplicates,
+    lsh_parameters,
+    minhash_signatures,
+    normalize_description,
+)
+from app.models import CharacterProfile
+
+BASE = ("Un ingénieur logiciel de 30 ans, méticuleux, préoccupé par les règles, les listes et les détails "
+        "au point de ne jamais terminer ses projets; il refuse de déléguer.")
+
+def test_normalize_description_ignores_case_accents_punctuation_and_spacing():
+    assert normalize_description("  Un Ingénieur,\tméticuleux !") == normalize_description("un ingenieur meticuleux")
+
+def test_signature_agreement_estimates_jaccard_similarity():
+    signatures = minhash_signatures([BASE, BASE.upper(), BASE + " Il aime les trains.", "Une danseuse extravertie."],
+                                    num_perm=128)
+    agreement = (signatures == signatures[0]).mean(axis=1)
+    assert agreement[1] == 1.0
+    assert 0.6 < agreement[2] < 1.0
+    assert agreement[3] < 0.1
+
+def test_lsh_parameters_favor_recall_at_the_threshold():
+    bands, rows = lsh_parameters(0.9, 64)
+    assert bands * rows <= 64
+    assert 1 - (1 - 0.9 ** rows) ** bands >= 0.95
+
+def test_find_near_duplicates_groups_trivial_variants_only():
+    texts = [
+        BASE,
+        "Une femme de 45 ans, chaleureuse et sociable, qui consacre sa vie à aider les autres.",
+        BASE.replace(",", " ,").replace("30", "30 "),
+        "UN INGÉNIEUR LOGICIEL DE 30 ANS, MÉTICULEUX, PRÉOCCUPÉ PAR LES RÈGLES, LES LISTES ET LES DÉTAILS "
+        "AU POINT DE NE JAMAIS TERMINER SES PROJETS ; IL REFUSE DE DÉLÉGUER !",
+        "Un ingénieur logiciel de 30 ans.",
+    ]
+    representatives = find_near_duplicates(texts, threshold=0.9)
+
+    assert representatives.tolist() == [0, 1, 0, 0, 4]
+    assert dedup_report(representatives) == {"records": 5, "clusters": 3, "duplicates": 2, "calls_saved_pct": 40.0}
+
+def test_cluster_members_must_be_close_to_their_representative():
+    # 0 and 2 both share half of their signature with 1, but not with each other.
+    signatures = np.array([[1] * 8 + [2] * 8, [1] * 8 + [3] * 8, [4] * 8 + [3] * 8], dtype=np.uint32)
+    assert cluster_signatures(signatures, threshold=0.5).tolist() == [0, 0, 2]
+
+def test_batch_process_sends_one_request_per_cluster(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(f"{BASE}\nUne danseuse extravertie.\n{BASE.upper()}\n")
+    output_file = tmp_path / "output.jsonl"
+    profile = CharacterProfile(character_name="Ingénieur", profile_date="2024-01-01")
+
+    with patch('app.batch.generate_character_profile', return_value=profile) as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", dedup_threshold=0.9)
+
+    assert mock_generate.call_count == 2
+    assert stats["total"] == 3 and stats["succeeded"] == 3
+    assert stats["dedup"]["calls_saved"] == 1
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["id"] for r in records] == ["1", "3", "2"]
+    assert records[1]["duplicate_of"] == "1"
+    assert records[1]["profile"] == records[0]["profile"]
+
+    # The duplicate was journaled: a resumed run has nothing left to do.
+    with patch('app.batch.generate_character_profile', return_value=profile) as mock_generate:
+        stats = batch_process(str(input_file), str(output_file), "gemini-2.5-pro", resume=True, dedup_threshold=0.9)
+    mock_generate.assert_not_called()
+    assert stats["skipped"] == 3
@@ -0,0 +1,75 @@
+import json
+
+from app.dsm_codes import check_batch_output, get_code_index
+from app.models import CharacterProfile, DiagnosisEntry
+
+def _diagnosis(name, code, category="Troubles de la personnalité"):
+    return DiagnosisEntry(disorder_name=name, dsm_category=category, dsm_code=code)
+
+def test_codes_are_matched_exactly_or_by_parent_or_family():
+    index = get_code_index()
+    how, positions = index.match_code("f60.3")
+    assert how == "exact" and [index.entry(p)["name_en"] for p in positions] == ["Borderline personality disorder"]
+    how, positions = index.match_code("F50.810")
+    assert how == "parent" and {index.format_code(p) for p in positions} == {"307.51 (F50.81)"}
+    how, positions = index.match_code("296.2")
+    assert how == "family" and len(positions) == 5
+    how, positions = index.match_code("F60")
+    assert how == "family" and len(positions) > 5
+    assert index.match_code("999.9") == (None, frozenset())
+
+def test_names_are_matched_in_english_and_french():
+    index = get_code_index()
+    names = lambda positions: sorted(index.entry(p)["name_en"] for p in positions)
+    assert names(index.match_name("Borderline Personality Disorder")[1]) == ["Borderline personality disorder"]
+    assert index.match_name("Trouble de la personnalité borderline")[0] == "exact"
+    how, positions = index.match_name("Anorexie mentale")
+    assert how == "prefix" and len(positions) == 2
+    how, positions = index.match_name("Trouble de la personalité narcisique")
+    assert how == "fuzzy" and names(positions) == ["Narcissistic personality disorder"]
+    assert index.match_name("Syndrome imaginaire") == (None, frozenset())
+    how, positions = index.match_name("Trouble bipolaire de type I")
+    assert how == "exact" and all(name.startswith("Bipolar I disorder") for name in names(positions))
+
+def test_table_pairs_each_icd9_code_with_its_icd10_code():
+    index = get_code_index()
+    assert {index.format_code(p) for p in index.match_code("296.40")[1]} == {"296.40 (F31.0)"}
+    assert {index.format_code(p) for p in index.match_code("F31.9")[1]} == {"296.7 (F31.9)", "296.80 (F31.9)"}
+    check = index.check_diagnosis(_diagnosis("Trouble dépressif non spécifié", "311 (F32.A)", "Troubles dépressifs"))
+    assert check["flags"] == [] and check["normalized_code"] == "311 (F32.A)"
+
+def test_check_diagnosis_normalizes_codes_and_flags_mismatches():
+    index = get_code_index()
+    check = index.check_diagnosis(_diagnosis("Trouble de la personnalité borderline", "F60.3"))
+    assert check["normalized_code"] == "301.83 (F60.3)" and check["flags"] == []
+    check = index.check_diagnosis(_diagnosis("Trouble anxieux généralisé", None, "Troubles anxieux"))
+    assert check["flags"] == ["missing_code"] and check["normalized_code"] == "300.02 (F41.1)"
+    check = index.check_diagnosis(_diagnosis("Trouble de la personnalité borderline", "301.7 (F60.2)"))
+    assert check["flags"] == ["name_mismatch"] and check["name_code"] == "301.83 (F60.3)"
+    assert index.check_diagnosis(_diagnosis("Trouble de la personnalité narcissique", "301.81 (F60.3)"))["flags"] == ["inconsistent_codes"]
+    assert index.check_diagnosis(_diagnosis("Trouble de la personnalité borderline", "301.83", "Troubles anxieux"))["flags"] == ["category_mismatch"]
+    for category in ("Troubles liés aux traumatismes et au stress", "Trauma and stressor related disorders"):
+        assert index.check_diagnosis(_diagnosis("Trouble stress post-traumatique", "309.81 (F43.10)", category))["flags"] == []
+    assert index.check_diagnosis(_diagnosis("Trouble stress post-traumatique", "309.81", "Troubles anxieux"))["flags"] == ["category_mismatch"]
+    assert index.check_diagnosis(_diagnosis("Syndrome imaginaire", "999.9"))["flags"] == ["unknown_code", "unknown_name"]
+    assert index.check_diagnosis(_diagnosis("Trouble", "F60.3 borderline"))["flags"][0] == "malformed_code"
+
+def test_check_batch_output_counts_flags_and_writes_the_checks(tmp_path):
+    profile = CharacterProfile(character_name="A", profile_date="2024-01-01", diagnoses=[
+        _diagnosis("Trouble de la personnalité borderline", "301.83 (F60.3)"),
+        _diagnosis("Trouble de la personnalité borderline", "301.7 (F60.2)"),
+    ])
+    input_file = tmp_path / "profiles.jsonl"
+    input_file.write_text("\n".join(json.dumps(result) for result in [
+        {"index": 0, "id": "a", "profile": profile.model_dump()},
+        {"index": 1, "id": "b", "profile": None, "error": "failed"},
+    ]) + "\n")
+    output_file = tmp_path / "checks.jsonl"
+
+    report = check_batch_output(str(input_file), str(output_file))
+
+    assert (report["profiles"], report["diagnoses"], report["flagged"]) == (1, 2, 1)
+    assert report["flags"]["name_mismatch"] == 1
+    lines = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert [line["id"] for line in lines] == ["a"]
+    assert [check["flags"] for check in lines[0]["diagnoses"]] == [[], ["name_mismatch"]]
@@ -0,0 +1,144 @@
+import csv
+import json
+import threading
+import pytest
+from unittest.mock import patch
+
+from app.evaluation import DEFAULT_DATASET, evaluate_dataset, generate_cases, load_cases, run_evaluation, summarize
+from app.models import CharacterProfile, DiagnosisEntry, EvaluationResult
+
+def _case(case_id):
+    return {
+        "id": case_id,
+        "description": f"Description {case_id}",
+        "golden_profile": CharacterProfile(character_name=case_id, profile_date="2024-01-01"),
+    }
+
+def test_bundled_golden_cases_load():
+    cases = load_cases(DEFAULT_DATASET)
+
+    assert cases
+    assert all(isinstance(case["golden_profile"], CharacterProfile) for case in cases)
+
+def test_profiles_are_judged_while_other_generations_are_in_flight():
+    slow_generation_started = threading.Event()
+    release_slow_generation = threading.Event()
+    judged_while_slow_in_flight = []
+
+    def fake_generate(description, model_id):
+        if description == "Description slow":
+            slow_generation_started.set()
+            release_slow_generation.wait(5)
+        return CharacterProfile(character_name=description, profile_date="2024-01-01")
+
+    def fake_judge(description, generated, golden, model_id):
+        if description == "Description fast":
+            slow_generation_started.wait(5)
+            judged_while_slow_in_flight.append(not release_slow_generation.is_set())
+            release_slow_generation.set()
+        return EvaluationResult(score=4, rationale="ok")
+
+    with patch('app.evaluation.generate_character_profile', side_effect=fake_generate), \
+            patch('app.evaluation.evaluate_profile_with_llm', side_effect=fake_judge):
+        results = list(run_evaluation([_case("slow"), _case("fast")], "flash", "pro", concurrency=2, band=None))
+
+    assert judged_while_slow_in_flight == [True]
+    assert [r["id"] for r in results] == ["fast", "slow"]
+    assert all(r["score"] == 4 for r in results)
+
+def test_failed_generations_are_not_judged():
+    with patch('app.evaluation.generate_character_profile', side_effect=RuntimeError("boom")), \
+            patch('app.evaluation.evaluate_profile_with_llm') as mock_judge:
+        results = list(run_evaluation([_case("a")], "flash", "pro"))
+
+    mock_judge.assert_not_called()
+    assert results[0]["error"] == "Generation failed: RuntimeError: boom"
+
+def test_generate_cases_runs_concurrently_and_keeps_the_case_order():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_generate(description, model_id):
+        barrier.wait()
+        if description == "Description b":
+            raise RuntimeError("boom")
+        return CharacterProfile(character_name=description, profile_date="2024-01-01")
+
+    with patch('app.evaluation.generate_character_profile', side_effect=fake_generate):
+        results = generate_cases([_case("a"), _case("b")], "flash", concurrency=2)
+
+    assert [r["id"] for r in results] == ["a", "b"]
+    assert results[0]["generated_profile"].character_name == "Description a"
+    assert results[1]["error"] == "Generation failed: RuntimeError: boom"
+
+def test_summarize_aggregates_scores_and_tokens():
+    results = [
+        {"id": "a", "generated_profile": object(), "score": 5, "score_source": "judge", "generation_latency_s": 1.0,
+         "judge_latency_s": 2.0, "generation_total_tokens": 100, "judge_total_tokens": 50},
+        {"id": "b", "generated_profile": object(), "score": 3, "score_source": "judge", "generation_latency_s": 3.0,
+         "judge_latency_s": 1.0, "generation_total_tokens": 200, "judge_total_tokens": None},
+        {"id": "c", "error": "Generation failed", "generation_latency_s": 0.5},
+        {"id": "d", "generated_profile": object(), "score": 1, "score_source": "local", "generation_latency_s": 1.0},
+    ]
+
+    summary = summarize(results, elapsed_s=2.0)
+
+    assert (summary["judged"], summary["locally_scored"]) == (2, 1)
+    assert summary["failed"] == 1
+    assert (summary["mean_judge_score"], summary["mean_local_score"]) == (4, 1)
+    assert summary["judge_score_distribution"]["5"] == 1
+    assert summary["judge_score_distribution"]["1"] == 0 and summary["local_score_distribution"]["1"] == 1
+    assert summary["p95_generation_latency_s"] == 3.0
+    assert summary["generation_total_tokens"] == 300
+    assert summary["judge_total_tokens"] == 50
+    assert summary["cases_per_s"] == 2.0
+
+def test_evaluate_dataset_writes_the_results_table(tmp_path):
+    dataset = tmp_path / "cases.jsonl"
+    dataset.write_text("\n".join(
+        json.dumps({"id": case_id, "description": case_id, "golden_profile": {"character_name": case_id, "profile_date": "2024-01-01"}})
+        for case_id in ["b", "a"]
+    ))
+    usage = {"prompt_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+
+    with patch('app.evaluation.generate_character_profile',
+               side_effect=lambda d, m: CharacterProfile(character_name=d, profile_date="2024-01-01")), \
+            patch('app.evaluation.evaluate_profile_with_llm', return_value=EvaluationResult(score=5, rationale="Parfait.")), \
+            patch('app.evaluation.get_last_usage', return_value=usage):
+        summary = evaluate_dataset(str(dataset), str(tmp_path / "out"), "flash", "pro", band=None)
+
+    with open(tmp_path / "out" / "results.csv", newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row["id"] for row in rows] == ["b", "a"]
+    assert rows[0]["rationale"] == "Parfait."
+    assert rows[0]["generation_total_tokens"] == "15"
+    assert summary["judge_total_tokens"] == 30
+    assert json.loads((tmp_path / "out" / "summary.json").read_text())["judged"] == 2
+
+def test_only_uncertain_cases_are_escalated_to_the_judge():
+    diagnosis = DiagnosisEntry(disorder_name="TPB", dsm_category="Personnalité", dsm_code="301.83 (F60.3)",
+                               criteria_met=["a", "b", "c"])
+    golden = CharacterProfile(character_name="G", profile_date="2024-01-01", diagnoses=[diagnosis])
+    cases = [
+        {"id": "identical", "description": "identical", "golden_profile": golden},
+        {"id": "unrelated", "description": "unrelated", "golden_profile": golden},
+        {"id": "partial", "description": "partial", "golden_profile": golden},
+    ]
+    generated = {
+        "identical": golden,
+        "unrelated": CharacterProfile(character_name="U", profile_date="2024-01-01", diagnoses=[
+            DiagnosisEntry(disorder_name="TAG", dsm_category="Anxiété", dsm_code="F41.1", criteria_met=["a"])]),
+        # Right disorder given by its DSM code only, with fewer criteria.
+        "partial": CharacterProfile(character_name="P", profile_date="2024-01-01", diagnoses=[
+            DiagnosisEntry(disorder_name="TPB", dsm_category="Personnalité", dsm_code="301.83", criteria_met=["a"]),
+            DiagnosisEntry(disorder_name="TAG", dsm_category="Anxiété", dsm_code="F41.1", criteria_met=[])]),
+    }
+
+    with patch('app.evaluation.generate_character_profile', side_effect=lambda d, m: generated[d]), \
+            patch('app.evaluation.evaluate_profile_with_llm', return_value=EvaluationResult(score=3, rationale="ok")) as mock_judge:
+        results = {r["id"]: r for r in run_evaluation(cases, "flash", "pro")}
+
+    assert mock_judge.call_count == 1
+    assert results["partial"]["score_source"] == "judge"
+    assert (results["identical"]["score"], results["identical"]["score_source"]) == (5, "local")
+    assert (results["unrelated"]["score"], results["unrelated"]["score_source"]) == (1, "local")
+    assert summarize(list(results.values()))["locally_scored"] == 2
@@ -0,0 +1,108 @@
+import pyarrow.parquet as pq
+
+from app.export import ParquetExporter, export_jsonl, flatten_profile, recover_parts
+from app.batch import batch_process
+from app.models import CharacterProfile, DiagnosisEntry, DiagnosisSpecifier, HollandCode, HollandCodeAssessment
+from unittest.mock import patch
+
+def _profile(name="Test"):
+    return CharacterProfile(
+        character_name=name,
+        profile_date="2024-01-01",
+        holland_code_assessment=HollandCodeAssessment(
+            riasec_scores=[HollandCode(theme="Investigatif", score=9, description="..."),
+                           HollandCode(theme="Conventional", score=7, description="...")],
+            top_themes=["Investigatif"],
+            summary="Analytique.",
+        ),
+        diagnoses=[DiagnosisEntry(
+            disorder_name="Trouble de la personnalité obsessionnelle-compulsive",
+            dsm_category="Troubles de la personnalité",
+            dsm_code="301.4 (F60.5)",
+            criteria_met=["A1", "A2"],
+            specifiers=[DiagnosisSpecifier(specifier_type="Sévérité", value="Modérée")],
+        )],
+    )
+
+def _result(index, name="Test"):
+    return {"index": index, "id": str(index + 1), "profile": _profile(name).model_dump()}
+
+def test_flatten_profile_maps_riasec_scores_to_columns():
+    rows = flatten_profile(0, "1", _profile().model_dump())
+
+    profile = rows["profiles"][0]
+    assert profile["riasec_investigative"] == 9
+    assert profile["riasec_conventional"] == 7
+    assert profile["riasec_realistic"] is None
+    assert profile["diagnosis_count"] == 1
+    assert rows["diagnoses"][0]["criteria_count"] == 2
+    assert rows["specifiers"] == [{"record_index": 0, "record_id": "1", "diagnosis_index": 0,
+                                   "specifier_type": "Sévérité", "value": "Modérée"}]
+
+def test_exporter_finalizes_a_part_per_row_group(tmp_path):
+    with ParquetExporter(str(tmp_path), row_group_size=2) as exporter:
+        for index in range(5):
+            exporter.add(_result(index))
+            if index == 1:
+                assert pq.read_table(tmp_path / "profiles").num_rows == 2
+        exporter.add({"index": 5, "id": "6", "error": "failed"})
+
+    assert sorted(path.name for path in (tmp_path / "profiles").iterdir()) == [
+        "part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    assert pq.ParquetFile(tmp_path / "profiles" / "part-00002.parquet").metadata.num_rows == 1
+
+    with ParquetExporter(str(tmp_path)) as exporter:
+        exporter.add(_result(6))
+    assert pq.read_table(tmp_path / "profiles").num_rows == 6
+    assert pq.read_table(tmp_path / "specifiers").num_rows == 6
+    assert not list(tmp_path.glob("*/*.tmp"))
+
+def test_recover_parts_drops_unfinished_parts(tmp_path):
+    with ParquetExporter(str(tmp_path), row_group_size=1) as exporter:
+        exporter.add(_result(0))
+        exporter.add(_result(1))
+    # A crash between the child tables and the profiles table of part 1.
+    (tmp_path / "profiles" / "part-00001.parquet").rename(tmp_path / "profiles" / "part-00001.parquet.tmp")
+
+    assert recover_parts(str(tmp_path)) == {0}
+    for table in ("profiles", "diagnoses", "specifiers"):
+        assert [path.name for path in (tmp_path / table).iterdir()] == ["part-00000.parquet"]
+
+def test_resumed_batch_exports_the_records_lost_by_a_crash(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("one\ntwo\nthree\n")
+    output_file = tmp_path / "output.jsonl"
+    parquet_dir = tmp_path / "parquet"
+
+    def crash_on_close(self):
+        raise KeyboardInterrupt
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)), \
+            patch('app.export.ParquetExporter.close', crash_on_close):
+        try:
+            batch_process(str(input_file), str(output_file), "gemini-2.5-pro", parquet_dir=str(parquet_dir))
+        except KeyboardInterrupt:
+            pass
+    assert len(output_file.read_text().splitlines()) == 3
+
+    with patch('app.batch.generate_character_profile') as mock_generate:
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", parquet_dir=str(parquet_dir), resume=True)
+
+    mock_generate.assert_not_called()
+    table = pq.read_table(parquet_dir / "profiles").sort_by("record_index")
+    assert table.column("character_name").to_pylist() == ["one", "two", "three"]
+    assert pq.read_table(parquet_dir / "diagnoses").num_rows == 3
+
+def test_export_jsonl_and_batch_write_the_same_tables(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("one\ntwo\n")
+    output_file = tmp_path / "output.jsonl"
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: _profile(d)):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", parquet_dir=str(tmp_path / "batch"))
+    rows = export_jsonl(str(output_file), str(tmp_path / "export"))
+
+    assert rows == {"profiles": 2, "diagnoses": 2, "specifiers": 2}
+    batch_table = pq.read_table(tmp_path / "batch" / "profiles").sort_by("record_index")
+    assert batch_table.column("character_name").to_pylist() == ["one", "two"]
+    assert batch_table.equals(pq.read_table(tmp_path / "export" / "profiles").sort_by("record_index"))
@@ -0,0 +1,47 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+from google.genai import errors
+
+from app import clients, services
+from app.cache import LRUCache, ResponseCache, set_response_cache
+from app.models import CharacterProfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_gemini import start_server
+
+@pytest.fixture
+def backend(request):
+    server = start_server(**getattr(request, "param", {}))
+    previous_settings = clients.get_settings()
+    clients.configure(base_url=server.url)
+    set_response_cache(ResponseCache(LRUCache(16), enabled=False))
+    yield server
+    server.shutdown()
+    clients.configure(**previous_settings)
+    set_response_cache(None)
+
+def test_profiles_from_the_fake_backend_are_schema_valid(backend):
+    profile = services.generate_character_profile("A description.", "gemini-2.5-pro")
+
+    assert isinstance(profile, CharacterProfile)
+    assert profile.diagnoses
+    assert services.get_last_usage()["total_tokens"] > 0
+
+def test_fake_backend_streams_and_answers_packed_requests(backend):
+    streamed = list(services.generate_character_profile_stream("A description.", "gemini-2.5-pro"))
+    packed = services.generate_packed_profiles([("a", "First."), ("b", "Second.")], "gemini-2.5-pro")
+
+    assert streamed[-1].diagnoses
+    assert set(packed) == {"a", "b"}
+    assert backend.stats["streams"] == 1
+
+@pytest.mark.parametrize("backend", [{"rate_429": 1.0}], indirect=True)
+def test_fake_backend_injects_quota_errors(backend):
+    with patch('app.ratelimit.time.sleep'), pytest.raises(errors.ClientError) as error:
+        services.generate_character_profile("A description.", "gemini-2.5-pro")
+
+    assert error.value.code == 429
+    assert backend.stats["rate_limited"] == 6
@@ -0,0 +1,49 @@
+import os
+import pytest
+from unittest.mock import patch
+from streamlit.testing.v1 import AppTest
+
+from app.models import CharacterProfile, TCCProgram
+from app.repair import IncompleteProfileError
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "src", "app", "main.py")
+
+def _profile():
+    return CharacterProfile(character_name="Cached Character", profile_date="2024-01-01")
+
+def test_same_description_is_served_from_the_shared_cache():
+    """
+    Tests that a second session submitting the same description reuses the first result.
+    """
+    program = TCCProgram(title="Programme", global_objective="Objectif")
+    with patch('app.services.generate_character_profile_stream', side_effect=lambda *a, **k: iter([_profile()])) as mock_stream, \
+            patch('app.services.generate_tcc_program', return_value=program):
+        first = AppTest.from_file(MAIN_SCRIPT).run(timeout=30)
+        first.text_area[0].input("A  shared description.").run()
+        first.button[0].click().run(timeout=30)
+        assert not first.exception
+
+        second = AppTest.from_file(MAIN_SCRIPT).run(timeout=30)
+        second.text_area[0].input("A shared description.").run()
+        second.button[0].click().run(timeout=30)
+
+        assert mock_stream.call_count == 1
+        assert any("Served from cache" in info.value for info in second.info)
+
+        second.button[1].click().run(timeout=30)
+        assert mock_stream.call_count == 2
+        assert not any("Served from cache" in info.value for info in second.info)
+
+def test_an_unrepairable_answer_shows_an_error():
+    def stream(*args, **kwargs):
+        yield _profile()
+        raise IncompleteProfileError("truncated")
+
+    with patch('app.services.generate_character_profile_stream', side_effect=stream):
+        app = AppTest.from_file(MAIN_SCRIPT).run(timeout=30)
+        app.text_area[0].input("An unrepairable description.").run()
+        app.button[0].click().run(timeout=30)
+
+    assert not app.exception
+    assert any("no profile" in error.value for error in app.error)
+    assert "profile" not in app.session_state
@@ -0,0 +1,101 @@
+import urllib.request
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app import metrics
+from app.cache import LRUCache, ResponseCache, set_response_cache
+from app.metrics import Registry, set_registry
+from app.models import CharacterProfile
+from app.services import generate_character_profile
+
+@pytest.fixture
+def registry():
+    registry = Registry(enabled=True)
+    set_registry(registry)
+    set_response_cache(ResponseCache(LRUCache(16)))
+    yield registry
+    set_registry(None)
+    set_response_cache(None)
+
+def _client():
+    client = MagicMock()
+    response = MagicMock()
+    response.parsed = CharacterProfile(character_name="Metrics", profile_date="2024-01-01")
+    response.usage_metadata.prompt_token_count = 1200
+    response.usage_metadata.candidates_token_count = 800
+    response.usage_metadata.thoughts_token_count = 300
+    response.usage_metadata.total_token_count = 2300
+    client.models.generate_content.return_value = response
+    return client
+
+@patch('app.services.get_genai_client')
+def test_calls_record_outcomes_spans_and_tokens(mock_get_genai_client, registry):
+    mock_get_genai_client.return_value = _client()
+
+    generate_character_profile("A metered description.", "gemini-2.5-pro")
+    generate_character_profile("A metered description.", "gemini-2.5-pro")
+
+    labels = ("generate_character_profile", "gemini-2.5-pro")
+    assert registry.calls.value((*labels, "ok")) == 1
+    assert registry.calls.value((*labels, "cache_hit")) == 1
+    for span in ("build", "cache", "rate_limit", "model", "parse"):
+        assert registry.span_seconds.count((*labels, span)) >= 1
+    assert registry.span_seconds.count((*labels, "model")) == 1
+    assert registry.tokens.value((*labels, "prompt")) == 1200
+    assert registry.tokens.value((*labels, "thinking")) == 300
+
+@patch('app.services.get_genai_client')
+def test_failed_calls_are_counted_as_errors(mock_get_genai_client, registry):
+    mock_client = _client()
+    mock_client.models.generate_content.side_effect = ValueError("bad request")
+    mock_get_genai_client.return_value = mock_client
+
+    with pytest.raises(ValueError):
+        generate_character_profile("A failing description.", "gemini-2.5-pro", use_cache=False)
+
+    assert registry.calls.value(("generate_character_profile", "gemini-2.5-pro", "error")) == 1
+
+def test_disabled_registry_records_nothing():
+    registry = Registry(enabled=False)
+    set_registry(registry)
+    try:
+        with metrics.call("f", "m"):
+            with metrics.span("model", "f", "m"):
+                pass
+        metrics.record_tokens("f", "m", {"prompt_tokens": 10})
+        metrics.record_cascade("f", "m", escalated=True)
+    finally:
+        set_registry(None)
+    assert registry.render().count("\n") == 10  # only the HELP and TYPE lines
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("latency_seconds", "Latency.", ("function",), buckets=(0.1, 1))
+    histogram.observe(("f",), 0.05)
+    histogram.observe(("f",), 0.5)
+    histogram.observe(("f",), 5)
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{function="f",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{function="f",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{function="f",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{function="f"} 3' in lines
+
+def test_metrics_endpoint_serves_the_registry(registry):
+    registry.calls.inc(("f", "m", "ok"))
+    server = metrics.start_metrics_server(0, host="127.0.0.1")
+    try:
+        host, port = server.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+    assert 'psy_dsm_calls_total{function="f",model="m",outcome="ok"} 1.0' in body
+
+def test_cascade_outcomes_are_counted(registry):
+    metrics.record_cascade("gemini-2.5-flash", "gemini-2.5-pro", escalated=False)
+    metrics.record_cascade("gemini-2.5-flash", "gemini-2.5-pro", escalated=True)
+
+    assert registry.cascade.value(("gemini-2.5-flash", "gemini-2.5-pro", "accepted")) == 1
+    assert 'psy_dsm_cascade_total{fast_model="gemini-2.5-flash",strong_model="gemini-2.5-pro",outcome="escalated"} 1' \
+        in registry.render()
@@ -0,0 +1,41 @@
+import json
+import pytest
+from app.partial_json import parse_partial_json
+
+DOCUMENT = json.dumps({
+    "name": "Jo",
+    "scores": [{"theme": "Social", "score": 4}, {"theme": "Artistique", "score": 9}],
+    "notes": "done",
+})
+
+def test_parse_partial_json_complete_document():
+    assert parse_partial_json(DOCUMENT) == (json.loads(DOCUMENT), True)
+
+def test_parse_partial_json_strips_code_fence():
+    assert parse_partial_json("```json\n" + DOCUMENT + "\n```") == (json.loads(DOCUMENT), True)
+
+@pytest.mark.parametrize("cut", range(1, len(DOCUMENT)))
+def test_parse_partial_json_every_prefix_is_a_prefix_of_the_document(cut):
+    data, complete = parse_partial_json(DOCUMENT[:cut])
+
+    assert not complete
+    assert data is None or isinstance(data, dict)
+    if data:
+        full = json.loads(DOCUMENT)
+        for key, value in data.items():
+            if isinstance(value, str):
+                assert value == full[key]
+
+def test_parse_partial_json_keeps_complete_members_only():
+    data, complete = parse_partial_json('{"name": "Jo", "scores": [{"theme": "Social", "score": 4}, {"theme": "Art')
+
+    assert not complete
+    assert data == {"name": "Jo", "scores": [{"theme": "Social", "score": 4}, {}]}
+
+def test_parse_partial_json_handles_escaped_quotes():
+    data, _ = parse_partial_json('{"a": "say \\"hi\\", then", "b": "unfinished')
+
+    assert data == {"a": 'say "hi", then'}
+
+def test_parse_partial_json_without_structure():
+    assert parse_partial_json("not json") == (None, False)
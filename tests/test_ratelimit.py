@@ -0,0 +1,110 @@
+import asyncio
+import sqlite3
+import pytest
+from unittest.mock import patch, MagicMock
+
+from google.genai import errors
+
+from app.ratelimit import RateLimiter, acall_with_retry, call_with_retry, estimate_tokens
+
+def _api_error(code):
+    return errors.APIError(code, {"error": {"message": "error", "status": "ERROR"}})
+
+def test_limiter_without_limits_never_waits(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limits.sqlite"))
+
+    assert not limiter.enabled
+    with patch('app.ratelimit.time.sleep') as mock_sleep:
+        for _ in range(100):
+            limiter.acquire("gemini-2.5-pro", 1000)
+    mock_sleep.assert_not_called()
+
+def test_limiter_waits_once_the_request_burst_is_spent(tmp_path):
+    # 60 requests/minute with a 2 second burst: two requests pass, the third waits one second.
+    limiter = RateLimiter(str(tmp_path / "limits.sqlite"), requests_per_minute=60, burst_s=2)
+
+    with patch('app.ratelimit.time.time', return_value=1000.0):
+        assert limiter._try_acquire("gemini-2.5-pro", 0) == 0
+        assert limiter._try_acquire("gemini-2.5-pro", 0) == 0
+        assert limiter._try_acquire("gemini-2.5-pro", 0) == pytest.approx(1.0)
+    with patch('app.ratelimit.time.time', return_value=1001.0):
+        assert limiter._try_acquire("gemini-2.5-pro", 0) == 0
+
+def test_limiter_buckets_are_shared_through_the_database(tmp_path):
+    path = str(tmp_path / "limits.sqlite")
+    first = RateLimiter(path, requests_per_minute=60, burst_s=1)
+    second = RateLimiter(path, requests_per_minute=60, burst_s=1)
+
+    with patch('app.ratelimit.time.time', return_value=1000.0):
+        assert first._try_acquire("gemini-2.5-pro", 0) == 0
+        assert second._try_acquire("gemini-2.5-pro", 0) > 0
+        assert second._try_acquire("gemini-2.5-flash", 0) == 0
+
+def test_limiter_raises_the_error_of_a_transaction_that_cannot_start(tmp_path):
+    path = str(tmp_path / "limits.sqlite")
+    limiter = RateLimiter(path, requests_per_minute=60)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    try:
+        with patch.object(limiter, "_connect", lambda: sqlite3.connect(path, timeout=0, isolation_level=None)):
+            with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+                limiter._try_acquire("gemini-2.5-pro", 0)
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+
+def test_limiter_tracks_tokens_and_usage_debt(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limits.sqlite"), tokens_per_minute=6000, burst_s=10)
+
+    with patch('app.ratelimit.time.time', return_value=1000.0):
+        assert limiter._try_acquire("gemini-2.5-pro", 500) == 0
+        limiter.record_usage("gemini-2.5-pro", 500)
+        # The 1000 token burst is spent, so 100 more tokens need one second of refill.
+        assert limiter._try_acquire("gemini-2.5-pro", 100) == pytest.approx(1.0)
+
+def test_call_with_retry_retries_quota_errors():
+    call = MagicMock(side_effect=[_api_error(429), _api_error(503), "ok"])
+
+    with patch('app.ratelimit.time.sleep') as mock_sleep:
+        assert call_with_retry(call) == "ok"
+
+    assert call.call_count == 3
+    assert mock_sleep.call_count == 2
+
+def test_call_with_retry_raises_other_errors_immediately():
+    call = MagicMock(side_effect=_api_error(400))
+
+    with patch('app.ratelimit.time.sleep'), pytest.raises(errors.APIError):
+        call_with_retry(call)
+    assert call.call_count == 1
+
+def test_call_with_retry_gives_up_after_max_attempts():
+    call = MagicMock(side_effect=_api_error(429))
+
+    with patch('app.ratelimit.time.sleep'), pytest.raises(errors.APIError):
+        call_with_retry(call, max_attempts=3)
+    assert call.call_count == 3
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 100
+
+@pytest.mark.asyncio
+async def test_acall_with_retry_retries_quota_errors():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _api_error(429)
+        return "ok"
+
+    assert await acall_with_retry(call, base_delay_s=0.001) == "ok"
+    assert len(attempts) == 3
+
+@pytest.mark.asyncio
+async def test_aacquire_waits_without_blocking(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limits.sqlite"), requests_per_minute=600, burst_s=0.1)
+
+    await limiter.aacquire("gemini-2.5-pro")
+    await asyncio.wait_for(limiter.aacquire("gemini-2.5-pro"), timeout=1)
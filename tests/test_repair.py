@@ -0,0 +1,72 @@
+import json
+
+from app.models import AssessmentSummary, DiagnosisEntry, HollandCode, HollandCodeAssessment
+from app.repair import merge_section, repair_profile, truncated_before_diagnoses
+
+HOLLAND = {
+    "riasec_scores": [{"theme": theme, "score": score, "description": "..."}
+                      for theme, score in zip("RIASEC", [2, 9, 3, 2, 3, 8])],
+    "top_themes": ["Investigative", "Conventional"],
+    "summary": "...",
+}
+DIAGNOSES = [
+    {"disorder_name": "Trouble A", "dsm_category": "Cat A", "dsm_code": "300.02", "criteria_met": ["c1"]},
+    {"disorder_name": "Trouble B", "dsm_category": "Cat B", "dsm_code": "301.4", "criteria_met": ["c2"]},
+]
+DOCUMENT = json.dumps({
+    "character_name": "Repaired",
+    "profile_date": "2024-01-01",
+    "overall_assessment_summary": "A summary.",
+    "holland_code_assessment": HOLLAND,
+    "diagnoses": DIAGNOSES,
+})
+
+def test_missing_closing_brackets_and_stray_commas_are_repaired_locally():
+    profile, broken = repair_profile("Here is the profile:\n" + DOCUMENT[:-2])
+    assert broken == {}
+    assert len(profile.diagnoses) == 2
+
+    profile, broken = repair_profile(DOCUMENT.replace('"c2"]', '"c2"],'))
+    assert broken == {}
+    assert profile.diagnoses[1].disorder_name == "Trouble B"
+
+def test_truncated_and_malformed_sections_are_named():
+    cut = DOCUMENT.index("Trouble B") + 5
+    profile, broken = repair_profile(DOCUMENT[:cut])
+    assert broken == {"diagnoses[1:]": None}
+    assert [d.disorder_name for d in profile.diagnoses] == ["Trouble A"]
+
+    malformed = DOCUMENT.replace('"dsm_category": "Cat A", ', "")
+    profile, broken = repair_profile(malformed)
+    assert list(broken) == ["diagnoses[0]"]
+    assert broken["diagnoses[0]"]["disorder_name"] == "Trouble A"
+
+    cut = DOCUMENT.index('"top_themes"')
+    profile, broken = repair_profile(DOCUMENT[:cut])
+    assert broken == {"holland_code_assessment": None, "diagnoses[0:]": None}
+    assert profile.overall_assessment_summary == "A summary."
+
+    cut = DOCUMENT.index("A summary") + 3
+    profile, broken = repair_profile(DOCUMENT[:cut])
+    assert list(broken) == ["holland_code_assessment", "diagnoses[0:]", "overall_assessment_summary"]
+    assert profile.overall_assessment_summary is None
+
+    assert repair_profile('{"profile_date": "2024-01-01"') == (None, {})
+
+def test_truncation_before_the_diagnoses_is_told_apart_from_a_confined_break():
+    for cut in (DOCUMENT.index("A summary") + 3, DOCUMENT.index('"top_themes"')):
+        assert truncated_before_diagnoses(repair_profile(DOCUMENT[:cut])[1])
+    for cut in (DOCUMENT.index("Trouble A"), DOCUMENT.index("Trouble B")):
+        assert not truncated_before_diagnoses(repair_profile(DOCUMENT[:cut])[1])
+
+def test_merge_section_puts_the_section_back_in_place():
+    profile, _ = repair_profile(DOCUMENT.replace('"dsm_category": "Cat A", ', ""))
+    entry = DiagnosisEntry.model_validate(DIAGNOSES[0])
+    assert [d.disorder_name for d in merge_section(profile, "diagnoses[0]", entry).diagnoses] == ["Trouble A", "Trouble B"]
+    assert len(merge_section(profile, "diagnoses[1:]", [entry, entry]).diagnoses) == 3
+
+    holland = HollandCodeAssessment(riasec_scores=[HollandCode(theme="Social", score=9, description="...")],
+                                    top_themes=["Social"], summary="...")
+    assert merge_section(profile, "holland_code_assessment", holland).holland_code_assessment == holland
+    summary = AssessmentSummary(overall_assessment_summary="Rewritten.")
+    assert merge_section(profile, "overall_assessment_summary", summary).overall_assessment_summary == "Rewritten."
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.models import CharacterProfile, DiagnosisEntry, HollandCode, HollandCodeAssessment
+from app.scoring import (
+    dsm_metrics, estimated_score, needs_judge, riasec_matrix, riasec_metrics, score_profiles,
+)
+
+def _profile(scores=None, top_themes=(), codes=(), criteria=0):
+    assessment = None
+    if scores is not None:
+        assessment = HollandCodeAssessment(
+            riasec_scores=[HollandCode(theme=theme, score=score, description="") for theme, score in scores.items()],
+            top_themes=list(top_themes),
+            summary="",
+        )
+    return CharacterProfile(
+        character_name="C",
+        profile_date="2024-01-01",
+        holland_code_assessment=assessment,
+        diagnoses=[
+            DiagnosisEntry(disorder_name=f"Trouble {code}", dsm_category="", dsm_code=code,
+                           criteria_met=["c"] * criteria)
+            for code in codes
+        ],
+    )
+
+FRENCH = {"Réaliste": 6, "Investigateur": 8, "Artistique": 9, "Social": 4, "Entreprenant": 5, "Conventionnel": 3}
+ENGLISH = {"Realistic": 6, "Investigative": 8, "Artistic": 9, "Social": 4, "Enterprising": 5, "Conventional": 3}
+
+def test_riasec_matrix_aligns_french_and_english_themes():
+    matrix = riasec_matrix([_profile(FRENCH), _profile(ENGLISH), _profile()])
+
+    np.testing.assert_array_equal(matrix[0], [6, 8, 9, 4, 5, 3])
+    np.testing.assert_array_equal(matrix[1], matrix[0])
+    assert np.isnan(matrix[2]).all()
+
+def test_riasec_metrics_compare_rows():
+    golden = np.array([[6, 8, 9, 4, 5, 3]] * 3, dtype=float)
+    generated = np.array([[6, 8, 9, 4, 5, 3], [3, 2, 1, 5, 4, 6], [np.nan] * 6])
+
+    metrics = riasec_metrics(generated, golden)
+
+    assert metrics["riasec_cosine"][0] == pytest.approx(1.0)
+    assert metrics["riasec_l2"][0] == 0
+    assert metrics["riasec_spearman"][0] == pytest.approx(1.0)
+    assert metrics["riasec_spearman"][1] == pytest.approx(-1.0)
+    assert np.isnan(metrics["riasec_cosine"][2])
+
+def test_dsm_metrics_match_equivalent_codes():
+    golden = [_profile(codes=["301.83 (F60.3)"]), _profile(codes=["F32.1", "F41.1"]), _profile()]
+    generated = [_profile(codes=["F60.3"]), _profile(codes=["F32.1", "F43.10"]), _profile()]
+
+    metrics = dsm_metrics(generated, golden)
+
+    np.testing.assert_allclose(metrics["dsm_precision"], [1.0, 0.5, 1.0])
+    np.testing.assert_allclose(metrics["dsm_recall"], [1.0, 0.5, 1.0])
+
+def test_score_profiles_combines_metrics_into_a_local_score():
+    golden = _profile(FRENCH, ["Artistique", "Investigateur"], ["301.83"], criteria=5)
+    same = _profile(ENGLISH, ["Artistic", "Investigative"], ["301.83"], criteria=5)
+    different = _profile({"Réaliste": 9, "Investigateur": 1, "Artistique": 2, "Social": 8, "Entreprenant": 3, "Conventionnel": 7},
+                         ["Réaliste", "Social"], ["F41.1"], criteria=1)
+
+    metrics = score_profiles([same, different], [golden, golden])
+
+    assert metrics["local_score"][0] == pytest.approx(1.0)
+    assert metrics["local_score"][1] < 0.2
+    assert metrics["top_theme_overlap"][1] == 0
+    assert metrics["criteria_delta"][1] == -4
+
+def test_score_profiles_rejects_mismatched_lengths():
+    with pytest.raises(ValueError):
+        score_profiles([_profile()], [])
+
+def test_needs_judge_and_estimated_score():
+    local_scores = np.array([0.1, 0.5, 0.95])
+
+    np.testing.assert_array_equal(needs_judge(local_scores), [False, True, False])
+    np.testing.assert_array_equal(estimated_score(local_scores), [1, 3, 5])
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.batch import batch_process
+from app.models import CharacterProfile, DiagnosisEntry, HollandCode, HollandCodeAssessment
+from app.similarity import RiasecIndex, riasec_vector
+
+THEMES = ["Réaliste", "Investigatif", "Artistique", "Social", "Entreprenant", "Conventionnel"]
+
+def _profile(name, scores, code=None):
+    return CharacterProfile(
+        character_name=name,
+        profile_date="2024-01-01",
+        holland_code_assessment=HollandCodeAssessment(
+            riasec_scores=[HollandCode(theme=theme, score=score, description="...")
+                           for theme, score in zip(THEMES, scores)],
+            top_themes=[],
+            summary="...",
+        ),
+        diagnoses=[DiagnosisEntry(disorder_name="Trouble", dsm_category="Catégorie", dsm_code=code)] if code else [],
+    )
+
+PROFILES = [
+    ("analyst", _profile("Analyst", [2, 9, 3, 2, 3, 8], "301.4 (F60.5)")),
+    ("helper", _profile("Helper", [2, 3, 6, 9, 5, 2], "300.02")),
+    ("scientist", _profile("Scientist", [3, 8, 4, 2, 2, 7], "300.02")),
+    ("artist", _profile("Artist", [1, 4, 9, 6, 3, 1])),
+]
+
+def test_riasec_vector_skips_profiles_without_scores():
+    assert riasec_vector(CharacterProfile(character_name="None", profile_date="2024-01-01")) is None
+    assert riasec_vector(PROFILES[0][1]).tolist() == [2, 9, 3, 2, 3, 8]
+
+def test_query_ranks_by_cosine_and_l2_and_filters_by_code():
+    index = RiasecIndex()
+    assert index.add_many(PROFILES) == 4
+    query = _profile("Query", [2, 9, 3, 2, 3, 8])
+
+    cosine = index.query(query, k=2)
+    assert [case["id"] for case in cosine] == ["analyst", "scientist"]
+    assert cosine[0]["similarity"] == pytest.approx(1.0)
+
+    l2 = index.query(query, k=4, metric="l2", exclude_id="analyst")
+    assert [case["id"] for case in l2] == ["scientist", "artist", "helper"]
+    assert l2[0]["distance"] == pytest.approx(np.sqrt(5), abs=1e-4)
+
+    assert [case["id"] for case in index.query(query, k=5, code="300.02")] == ["scientist", "helper"]
+    assert [case["id"] for case in index.query(query, code="F60.5")] == ["analyst"]
+    assert index.query(query, code="999.99") == []
+
+def test_index_persists_and_extends_incrementally(tmp_path):
+    index = RiasecIndex(str(tmp_path))
+    index.add_many(PROFILES[:2])
+    index.add(*PROFILES[2])
+    index.flush()
+
+    reopened = RiasecIndex(str(tmp_path), read_only=True)
+    assert len(reopened) == 3
+    assert isinstance(reopened._vectors, np.memmap)
+    assert reopened.query(PROFILES[2][1], k=1)[0]["id"] == "scientist"
+    with pytest.raises(ValueError):
+        reopened.add(*PROFILES[3])
+
+def test_index_recovers_from_an_interrupted_flush(tmp_path):
+    RiasecIndex(str(tmp_path)).add_many(PROFILES[:2])
+    # A crash after the vector was written but before its metadata line was complete.
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones(6, dtype=np.float32).tobytes())
+    with open(tmp_path / "metadata.jsonl", "a") as f:
+        f.write('{"id": "partial"')
+
+    index = RiasecIndex(str(tmp_path))
+    assert len(index) == 2
+    index.add_many(PROFILES[2:])
+    assert [case["id"] for case in RiasecIndex(str(tmp_path)).query(PROFILES[3][1], k=1)] == ["artist"]
+    assert len(RiasecIndex(str(tmp_path))) == 4
+
+def test_batch_process_adds_profiles_to_the_index(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("analyst\nhelper\n")
+    profiles = dict(PROFILES)
+
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: profiles[d]):
+        batch_process(str(input_file), str(tmp_path / "output.jsonl"), "gemini-2.5-pro",
+                      index_dir=str(tmp_path / "index"))
+
+    index = RiasecIndex(str(tmp_path / "index"))
+    assert len(index) == 2
+    assert index.query(profiles["helper"], k=1)[0]["id"] == "2"
+
+def test_resumed_batch_adds_the_profiles_a_killed_run_did_not_index(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("analyst\nhelper\n")
+    output_file = tmp_path / "output.jsonl"
+    profiles = dict(PROFILES)
+
+    # A run killed before any of its index rows reached the disk.
+    with patch('app.batch.generate_character_profile', side_effect=lambda d, m: profiles[d]), \
+            patch('app.similarity.RiasecIndex.flush'):
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", index_dir=str(tmp_path / "index"))
+    assert len(RiasecIndex(str(tmp_path / "index"))) == 0
+
+    with patch('app.batch.generate_character_profile') as mock_generate:
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", index_dir=str(tmp_path / "index"),
+                      resume=True)
+        batch_process(str(input_file), str(output_file), "gemini-2.5-pro", index_dir=str(tmp_path / "index"),
+                      resume=True)
+
+    mock_generate.assert_not_called()
+    index = RiasecIndex(str(tmp_path / "index"))
+    assert (len(index), index.count("1"), index.count("2")) == (2, 1, 1)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src")
+
+@pytest.mark.parametrize("module", ["app.services", "app.batch", "app.visualizations", "app.dashboard"])
+def test_app_modules_import_heavy_dependencies_lazily(module):
+    """
+    Tests that importing the app modules does not load google.genai, matplotlib or numpy.
+    """
+    code = (
+        f"import sys, {module}\n"
+        "heavy = [m for m in ('google.genai', 'matplotlib', 'numpy') if m in sys.modules]\n"
+        "print(','.join(heavy))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    output = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+
+    assert output.stdout.strip() == ""
@@ -0,0 +1,21 @@
+import pytest
+
+from app.usage import add_usage, estimate_cost, model_pricing, usage_report
+
+def test_model_pricing_matches_versioned_ids_by_longest_prefix():
+    assert model_pricing("gemini-2.5-flash-lite-preview-06-17") == model_pricing("gemini-2.5-flash-lite")
+    assert model_pricing("gemini-2.5-flash") != model_pricing("gemini-2.5-flash-lite")
+    assert model_pricing("unknown-model") is None
+
+def test_estimate_cost_bills_cached_and_thinking_tokens():
+    usage = {"prompt_tokens": 1_000_000, "cached_tokens": 400_000, "output_tokens": 100_000, "thinking_tokens": 100_000}
+    assert estimate_cost("gemini-2.5-pro", usage) == pytest.approx(0.6 * 1.25 + 0.4 * 0.125 + 0.2 * 10.0)
+    assert estimate_cost("unknown-model", usage) is None
+
+def test_usage_report_skips_cache_hits():
+    totals = {}
+    add_usage(totals, {"prompt_tokens": 100, "output_tokens": 50, "total_tokens": 150})
+    add_usage(totals, None)
+    report = usage_report({"gemini-2.5-flash": totals}, elapsed_s=2.0)["gemini-2.5-flash"]
+    assert report["requests"] == 1
+    assert report["tokens_per_s"] == 75.0
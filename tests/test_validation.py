@@ -0,0 +1,63 @@
+from app.models import CharacterProfile, DiagnosisEntry, HollandCode, HollandCodeAssessment
+from app.scoring import diagnosis_codes, theme_index
+from app.validation import dsm_code_is_well_formed, find_dsm_codes, validate_profile
+
+THEMES = ["Réaliste", "Investigatif", "Artistique", "Social", "Entreprenant", "Conventionnel"]
+
+def _profile(scores=(2, 9, 3, 2, 3, 8), top_themes=("Investigatif", "Conventionnel"),
+             code="301.4 (F60.5)", criteria=("A1", "A2")):
+    return CharacterProfile(
+        character_name="Analyst",
+        profile_date="2024-01-01",
+        overall_assessment_summary="A test summary.",
+        holland_code_assessment=HollandCodeAssessment(
+            riasec_scores=[HollandCode(theme=theme, score=score, description="...")
+                           for theme, score in zip(THEMES, scores)],
+            top_themes=list(top_themes),
+            summary="...",
+        ),
+        diagnoses=[DiagnosisEntry(disorder_name="Trouble", dsm_category="Catégorie",
+                                  dsm_code=code, criteria_met=list(criteria))],
+    )
+
+def test_a_complete_consistent_profile_passes():
+    assert validate_profile(_profile()) == []
+
+def test_dsm_code_is_well_formed():
+    for code in ("301.83 (F60.3)", "300.02", "F42.2 / 300.3", "f60.5", "F32", "311 (F32.A)"):
+        assert dsm_code_is_well_formed(code), code
+    for code in ("", "301.8x", "Borderline", "F60.3 borderline", "3018"):
+        assert not dsm_code_is_well_formed(code), code
+
+def test_scoring_extracts_the_codes_validation_accepts():
+    assert find_dsm_codes("301.83 (f60.3) borderline") == ["301.83", "F60.3"]
+    entry = DiagnosisEntry(disorder_name="Trouble", dsm_category="", dsm_code="307.51 (F50.810)")
+    assert dsm_code_is_well_formed(entry.dsm_code)
+    assert diagnosis_codes(entry) == {"307.51", "F50.810"}
+
+def test_incomplete_or_malformed_profiles_are_flagged():
+    assert validate_profile(None) == ["no parsable profile"]
+    assert validate_profile(CharacterProfile(character_name="Empty", profile_date="2024-01-01")) == [
+        "overall assessment summary missing", "Holland Code assessment missing"]
+    assert validate_profile(_profile(scores=(2, 9, 3, 2, 3))) == ["RIASEC scores missing for C"]
+    assert validate_profile(_profile(scores=(2, 9, 3, 2))) == ["RIASEC scores missing for E, C"]
+    assert validate_profile(_profile(scores=(2, 9, 3, 2, 3, 12))) == ["RIASEC score 12 of 'Conventionnel' out of range"]
+    assert validate_profile(_profile(code="F60.3 borderline")) == ["malformed DSM code 'F60.3 borderline'"]
+    assert validate_profile(_profile(code=None)) == ["DSM code missing for 'Trouble'"]
+    assert validate_profile(_profile(criteria=())) == ["no criteria listed for 'Trouble'"]
+
+def test_themes_are_recognized_by_their_full_name_or_letter():
+    for theme, index in [("Réaliste", 0), ("REALISTIC", 0), ("investigative", 1), ("A", 2),
+                         ("Sociale", 3), ("Entreprenant (E)", 4), ("C - Conventional", 5)]:
+        assert theme_index(theme) == index, theme
+    for theme in ["Rien", "Innovateur", "Souple", "", "Réaliste (I)"]:
+        assert theme_index(theme) is None, theme
+    profile = _profile()
+    profile.holland_code_assessment.riasec_scores[0].theme = "Rien"
+    assert validate_profile(profile) == ["unknown RIASEC theme 'Rien'", "RIASEC scores missing for R"]
+
+def test_inconsistent_scores_are_flagged_as_low_confidence():
+    assert validate_profile(_profile(scores=(5,) * 6, top_themes=("Social",))) == ["all RIASEC scores are equal"]
+    assert validate_profile(_profile(top_themes=("Social", "Investigatif"))) == ["top themes are not the highest scored"]
+    # Ties with the last top theme's score are accepted.
+    assert validate_profile(_profile(scores=(2, 9, 8, 2, 3, 8))) == []
@@ -1,3 +1,4 @@
+import os
 import pytest
 import matplotlib.pyplot as plt
 from app.models import HollandCode, HollandCodeAssessment
@@ -45,3 +46,48 @@ def test_get_riasec_figures_no_assessment():
 
     assert bar_chart is None
     assert radar_chart is None
+
+import json
+from app.models import CharacterProfile
+from app.visualizations import batch_render_charts, chart_paths, create_riasec_visualizations, score_vector_hash
+
+def _assessment(scores):
+    themes = ["Realistic", "Investigative", "Artistic", "Social", "Enterprising", "Conventional"]
+    return HollandCodeAssessment(
+        riasec_scores=[HollandCode(theme=t, score=s, description=t) for t, s in zip(themes, scores)],
+        top_themes=themes[:2],
+        summary="Summary.",
+    )
+
+def test_create_riasec_visualizations(tmp_path):
+    create_riasec_visualizations(_assessment([1, 2, 3, 4, 5, 6]), str(tmp_path))
+
+    assert (tmp_path / "riasec_bar_chart.png").stat().st_size > 0
+    assert (tmp_path / "riasec_radar_chart.png").stat().st_size > 0
+
+def test_batch_render_charts_deduplicates_score_vectors(tmp_path):
+    input_file = tmp_path / "profiles.jsonl"
+    output_dir = tmp_path / "charts"
+    same = _assessment([8, 7, 9, 4, 6, 5])
+    other = _assessment([1, 2, 3, 4, 5, 6])
+    lines = [
+        {"id": "a", "profile": CharacterProfile(character_name="A", profile_date="2024-01-01", holland_code_assessment=same).model_dump()},
+        {"id": "b", "profile": CharacterProfile(character_name="B", profile_date="2024-01-01", holland_code_assessment=same).model_dump()},
+        {"id": "c", "error": "RuntimeError: failed"},
+        CharacterProfile(character_name="D", profile_date="2024-01-01", character_id="d", holland_code_assessment=other).model_dump(),
+    ]
+    input_file.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+
+    stats = batch_render_charts(str(input_file), str(output_dir), workers=2)
+
+    assert stats["profiles"] == 3
+    assert (stats["rendered"], stats["skipped"], stats["shared"]) == (2, 0, 1)
+    for path in chart_paths(str(output_dir), score_vector_hash(same)) + chart_paths(str(output_dir), score_vector_hash(other)):
+        assert os.path.getsize(path) > 0
+    with open(output_dir / "charts.jsonl") as f:
+        manifest = [json.loads(line) for line in f]
+    assert [entry["id"] for entry in manifest] == ["a", "b", "d"]
+    assert manifest[0]["bar_chart"] == manifest[1]["bar_chart"]
+
+    again = batch_render_charts(str(input_file), str(output_dir), workers=2)
+    assert (again["rendered"], again["skipped"], again["shared"]) == (0, 2, 1)